@@ -0,0 +1,198 @@
+"""
+Batch generation: run many prompts through one compiled graph in parallel.
+
+Each item gets its own workspace (selected through ``use_project_root``) and
+its own CPU budget, while the compiled graph, the LLM client and an in-process
+LLM response cache are shared by every run. The cache is bounded and only
+installed while a batch is running. Results are reported as items finish, so
+callers can stream them to a JSONL file or an event log.
+"""
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from agent.sandbox import job_cpu_budget
+from agent.states import summarize_state
+from agent.tools import use_project_root
+from agent.usage import UsageTracker
+
+DEFAULT_RECURSION_LIMIT = 100
+# Responses kept by the LLM cache shared by running batches (least recently added go first)
+BATCH_LLM_CACHE_MAX_ENTRIES = int(os.getenv("BATCH_LLM_CACHE_MAX_ENTRIES", "1000"))
+
+_cache_lock = threading.Lock()
+_cache_users = 0
+_installed_cache = None
+
+
+@dataclass
+class BatchItem:
+    id: str
+    prompt: str
+    mode: str = "auto"
+    recursion_limit: Optional[int] = None
+    reuse_plans: bool = True
+    use_templates: bool = True
+    max_tokens: Optional[int] = None
+    max_seconds: Optional[float] = None
+    extra: dict = field(default_factory=dict)
+
+    def graph_input(self) -> dict:
+        return {
+            "user_prompt": self.prompt,
+            "mode": self.mode,
+            "reuse_plans": self.reuse_plans,
+            "use_templates": self.use_templates,
+        }
+
+
+def load_prompts(path) -> list[BatchItem]:
+    """
+    Reads a JSONL file of prompts.
+
+    Each non-blank line is either a JSON object with a "prompt" key (plus
+    optional id, mode, recursion_limit, reuse_plans, use_templates, max_tokens,
+    max_seconds; other keys
+    are carried through to the results) or a bare JSON string.
+    """
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{lineno}: invalid JSON ({e})") from None
+            if isinstance(record, str):
+                record = {"prompt": record}
+            if not isinstance(record, dict) or not record.get("prompt"):
+                raise ValueError(f"{path}:{lineno}: expected an object with a 'prompt'")
+            items.append(make_item(record, default_id=f"{len(items) + 1:04d}"))
+    return items
+
+
+def make_item(record: dict, default_id: str) -> BatchItem:
+    record = dict(record)
+    return BatchItem(
+        id=str(record.pop("id", None) or default_id),
+        prompt=record.pop("prompt"),
+        mode=record.pop("mode", "auto"),
+        recursion_limit=record.pop("recursion_limit", None),
+        reuse_plans=bool(record.pop("reuse_plans", True)),
+        use_templates=bool(record.pop("use_templates", True)),
+        max_tokens=record.pop("max_tokens", None),
+        max_seconds=record.pop("max_seconds", None),
+        extra=record,
+    )
+
+
+def workspace_name(item: BatchItem) -> str:
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "-", item.id).strip("-.") or "item"
+    return slug[:64]
+
+
+@contextmanager
+def batch_llm_cache(max_entries: int = BATCH_LLM_CACHE_MAX_ENTRIES):
+    """
+    Installs a bounded in-memory LLM cache while any batch is running.
+
+    LangChain's cache is process-wide, so overlapping batches share one cache
+    and it is removed when the last of them finishes. A cache configured
+    elsewhere is left alone.
+    """
+    from langchain_core.caches import InMemoryCache
+    from langchain_core.globals import get_llm_cache, set_llm_cache
+
+    global _cache_users, _installed_cache
+    with _cache_lock:
+        if _cache_users == 0 and get_llm_cache() is None:
+            _installed_cache = InMemoryCache(maxsize=max_entries)
+            set_llm_cache(_installed_cache)
+        _cache_users += 1
+    try:
+        yield
+    finally:
+        with _cache_lock:
+            _cache_users -= 1
+            if _cache_users == 0 and _installed_cache is not None:
+                if get_llm_cache() is _installed_cache:
+                    set_llm_cache(None)
+                _installed_cache = None
+
+
+def run_item(item: BatchItem, workspace: Path, graph=None) -> dict:
+    """Runs one batch item to completion in its workspace and returns its result record."""
+    if graph is None:
+        from agent.graph import agent as graph
+
+    started = time.time()
+    clock = time.perf_counter()
+    result = {"id": item.id, "prompt": item.prompt, "mode": item.mode, "workspace": str(workspace), **item.extra}
+    usage = UsageTracker(item.max_tokens, item.max_seconds)
+    try:
+        with use_project_root(workspace), job_cpu_budget(), usage.activate():
+            final = graph.invoke(item.graph_input(),
+                                 {"recursion_limit": item.recursion_limit or DEFAULT_RECURSION_LIMIT})
+        result.update(status="success", **summarize_state(final))
+    except Exception as e:
+        result.update(status="error", error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    result.update(started=started, seconds=round(time.perf_counter() - clock, 3), usage=usage.report())
+    return result
+
+
+def _run_admitted(item: BatchItem, workspace: Path, graph, admit) -> dict:
+    release = admit() if admit is not None else None
+    try:
+        return run_item(item, workspace, graph)
+    finally:
+        if release is not None:
+            release()
+
+
+def run_batch(items: Iterable[BatchItem], workspace_root, parallelism: int = 4,
+              on_result: Optional[Callable[[dict], None]] = None, graph=None,
+              admit: Optional[Callable[[], Callable[[], None]]] = None) -> list[dict]:
+    """
+    Runs items with up to ``parallelism`` concurrent generations.
+
+    Workspaces are created under ``workspace_root/<item id>``. ``on_result`` is
+    called from the calling thread with each result as soon as it finishes;
+    the full list is returned in completion order. ``admit`` is called (and may
+    block) on an item's thread before it starts and returns the callback that
+    frees the item's slot, so items can share a global concurrency limit.
+    """
+    if graph is None:
+        from agent.graph import agent as graph
+
+    items = list(items)
+    workspace_root = Path(workspace_root)
+    seen: dict[str, int] = {}
+    results = []
+    with batch_llm_cache(), ThreadPoolExecutor(max_workers=max(1, parallelism), thread_name_prefix="batch") as pool:
+        futures = []
+        for item in items:
+            name = workspace_name(item)
+            seen[name] = seen.get(name, 0) + 1
+            if seen[name] > 1:
+                name = f"{name}-{seen[name]}"
+            # Each run gets a copy of the caller's context, so per-run workspace and budget stay isolated
+            futures.append(pool.submit(contextvars.copy_context().run, _run_admitted, item, workspace_root / name,
+                                       graph, admit))
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+    return results
@@ -0,0 +1,342 @@
+"""
+Content-addressed store for generated files.
+
+``write_file`` stores every file's content once, keyed by its SHA-256, as a
+zlib-compressed object under ``STATE_DIR/blobs/objects``. Workspaces get the
+file through a reflink (copy-on-write clone) of an uncompressed checkout copy,
+so writing content that is already stored costs a hash and a clone instead of a
+full write. Read-only hardlinks to the checkout copy are opt-in
+(``BLOB_STORE_LINK=hardlink``): every workspace holding the file then shares
+one inode, so nothing may edit it in place. Whether the method works is probed
+once per filesystem; where it does not (reflinks on ext4, say), files are
+written directly and not stored, since a blob plus a full copy would cost more
+disk and I/O than the file alone.
+
+References (which workspace file holds which blob) are tracked in a SQLite
+file next to the objects. ``gc`` drops references whose file was deleted or
+changed behind the store's back, then deletes blobs no file references.
+Checkout copies nothing hardlinks to are only a cache and are removed as well;
+one whose content no longer matches its hash is re-created before it is linked.
+A blob is only deleted if it is still unreferenced and unused inside the
+transaction that deletes it, and ``put`` marks a blob used before relying on
+its object, so a concurrent write never loses the object it links to.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from agent.tools import STATE_DIR
+
+BLOB_STORE_ENABLED = os.getenv("BLOB_STORE", "true").lower() == "true"
+BLOB_STORE_DIR = Path(os.getenv("BLOB_STORE_DIR", STATE_DIR / "blobs"))
+# auto/reflink: copy-on-write clones; hardlink (opt-in): one shared read-only inode.
+# Where the method is unsupported, files are written directly without the store
+BLOB_STORE_LINK = os.getenv("BLOB_STORE_LINK", "auto")
+# Unreferenced blobs younger than this survive gc (a write may not have recorded its reference yet)
+BLOB_GC_GRACE_SECONDS = float(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+COMPRESS_LEVEL = 6
+FICLONE = 0x40049409
+
+
+def _reflink(src: Path, dst: Path):
+    import fcntl
+
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            dst.unlink(missing_ok=True)
+            raise
+
+
+class BlobStore:
+    """Compressed blobs keyed by content hash, materialized into workspaces by link"""
+
+    def __init__(self, root: Path, link: str = BLOB_STORE_LINK):
+        self.root = Path(root)
+        self.link = link
+        self.db_path = self.root / "refs.db"
+        self._local = threading.local()
+        # st_dev of a workspace filesystem -> "reflink", "hardlink" or None (unsupported)
+        self._methods: dict[int, Optional[str]] = {}
+        self._probe_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self.counters = {"writes": 0, "deduplicated": 0, "unchanged": 0, "direct": 0, "bytes_written": 0}
+
+    # ---------- bookkeeping ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # Connections must not cross a fork (supervisor workers)
+        if conn is None or self._local.pid != os.getpid():
+            self.root.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY, size INTEGER NOT NULL, stored_size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS refs (
+                    path TEXT PRIMARY KEY, hash TEXT NOT NULL,
+                    ino INTEGER NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS refs_hash ON refs (hash);
+            """)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _count(self, **increments):
+        with self._counters_lock:
+            for key, value in increments.items():
+                self.counters[key] += value
+
+    def object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest[2:]
+
+    def checkout_path(self, digest: str) -> Path:
+        return self.root / "checkout" / digest[:2] / digest[2:]
+
+    @staticmethod
+    def _atomic_write(path: Path, data: bytes, mode: Optional[int] = None):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+
+    # ---------- blobs ----------
+
+    def put(self, data: bytes) -> str:
+        """Stores data (if new) and returns its hash"""
+        digest = hashlib.sha256(data).hexdigest()
+        obj = self.object_path(digest)
+        conn = self._connect()
+        # Marked used first: gc leaves recently used blobs alone, so the object stays
+        used = conn.execute("UPDATE blobs SET last_used = ? WHERE hash = ?", (time.time(), digest)).rowcount
+        if used and obj.exists():
+            self._count(deduplicated=1)
+            return digest
+        compressed = zlib.compress(data, COMPRESS_LEVEL)
+        self._atomic_write(obj, compressed)
+        self._count(bytes_written=len(compressed))
+        conn.execute(
+            "INSERT INTO blobs (hash, size, stored_size, last_used) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (hash) DO UPDATE SET last_used = excluded.last_used",
+            (digest, len(data), len(compressed), time.time()),
+        )
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return zlib.decompress(self.object_path(digest).read_bytes())
+
+    def _checkout(self, digest: str, data: Optional[bytes]) -> Path:
+        checkout = self.checkout_path(digest)
+        try:
+            # Someone may have made a hardlinked workspace file writable and edited it
+            intact = hashlib.sha256(checkout.read_bytes()).hexdigest() == digest
+        except FileNotFoundError:
+            intact = False
+        if not intact:
+            data = self.get(digest) if data is None else data
+            # Read-only: hardlinked workspace files share this inode. Replacing it leaves
+            # files already linked to a corrupted copy alone, but new links get the blob
+            self._atomic_write(checkout, data, mode=0o444)
+            self._count(bytes_written=len(data))
+        return checkout
+
+    def link_method(self, directory: Path) -> Optional[str]:
+        """
+        How files are placed in directory: "reflink", "hardlink", or None when the
+        configured method does not work there. Probed once per filesystem.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        device = directory.stat().st_dev
+        with self._probe_lock:
+            if device not in self._methods:
+                self._methods[device] = self._probe(directory)
+                if self._methods[device] is None:
+                    print(f"Blob store: {self.link} links are not supported for {directory}; "
+                          f"writing files there directly")
+            return self._methods[device]
+
+    def _probe(self, directory: Path) -> Optional[str]:
+        method = "hardlink" if self.link == "hardlink" else "reflink" if self.link in ("auto", "reflink") else None
+        if method is None:
+            return None
+        src = self.root / f".probe.{uuid.uuid4().hex}"
+        dst = directory / f".blobprobe.{uuid.uuid4().hex}.tmp"
+        self._atomic_write(src, b"probe")
+        try:
+            self._link(method, src, dst)
+            return method
+        except (OSError, ImportError):
+            return None
+        finally:
+            src.unlink(missing_ok=True)
+            dst.unlink(missing_ok=True)
+
+    @staticmethod
+    def _link(method: str, src: Path, dst: Path):
+        if method == "reflink":
+            _reflink(src, dst)
+        else:
+            os.link(src, dst)
+
+    def materialize(self, digest: str, dest: Path, data: Optional[bytes] = None) -> str:
+        """Places blob digest at dest (replacing it atomically); returns the method used"""
+        link = self.link_method(dest.parent)
+        checkout = self._checkout(digest, data) if link is not None else None
+        tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.tmp")
+        method = None
+        if checkout is not None:
+            try:
+                self._link(link, checkout, tmp)
+                method = link
+            except (OSError, ImportError):
+                # The checkout went away (gc) or this file cannot be linked; copy it
+                pass
+        if method is None:
+            data = self.get(digest) if data is None else data
+            with open(tmp, "wb") as f:
+                f.write(data)
+            self._count(bytes_written=len(data))
+            method = "copy"
+        os.replace(tmp, dest)
+        return method
+
+    # ---------- workspace files ----------
+
+    def write(self, path: Path, content: str) -> str:
+        """Writes content to path through the store and records the reference; returns the hash"""
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        key = str(path)
+        conn = self._connect()
+        self._count(writes=1)
+        if self.link_method(path.parent) is None:
+            conn.execute("DELETE FROM refs WHERE path = ?", (key,))
+            # Replaced, not written through: the old file may be a hardlink from another mode
+            self._atomic_write(path, data)
+            self._count(direct=1, bytes_written=len(data))
+            return digest
+        row = conn.execute("SELECT hash, ino, size, mtime_ns FROM refs WHERE path = ?", (key,)).fetchone()
+        if row is not None and row[0] == digest and self._stat_matches(path, row[1:]):
+            self._count(unchanged=1)
+            return digest
+
+        self.put(data)
+        self.materialize(digest, path, data)
+        st = path.stat()
+        conn.execute(
+            "INSERT OR REPLACE INTO refs (path, hash, ino, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+            (key, digest, st.st_ino, st.st_size, st.st_mtime_ns),
+        )
+        return digest
+
+    @staticmethod
+    def _stat_matches(path: Path, recorded) -> bool:
+        try:
+            st = path.stat()
+        except OSError:
+            return False
+        return (st.st_ino, st.st_size, st.st_mtime_ns) == tuple(recorded)
+
+    def release(self, directory: Path) -> int:
+        """Drops the references of every file under directory (e.g. before deleting a workspace)"""
+        prefix = str(Path(directory)).rstrip(os.sep) + os.sep
+        cursor = self._connect().execute(
+            "DELETE FROM refs WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+        )
+        return cursor.rowcount
+
+    # ---------- maintenance ----------
+
+    def gc(self, grace_seconds: float = BLOB_GC_GRACE_SECONDS) -> dict:
+        """Drops stale references, then deletes unreferenced blobs and unlinked checkout copies"""
+        conn = self._connect()
+        stale = [path for path, ino, size, mtime_ns in conn.execute("SELECT path, ino, size, mtime_ns FROM refs")
+                 if not self._stat_matches(Path(path), (ino, size, mtime_ns))]
+        conn.executemany("DELETE FROM refs WHERE path = ?", [(p,) for p in stale])
+
+        cutoff = time.time() - grace_seconds
+        unused = "hash = ? AND last_used < ? AND hash NOT IN (SELECT hash FROM refs)"
+        candidates = conn.execute(
+            "SELECT hash FROM blobs WHERE last_used < ? AND hash NOT IN (SELECT hash FROM refs)", (cutoff,)
+        ).fetchall()
+        freed = deleted = 0
+        for (digest,) in candidates:
+            # A write may have used the blob since the SELECT: check again while holding the write lock
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute(f"DELETE FROM blobs WHERE {unused}", (digest, cutoff)).rowcount:
+                    deleted += 1
+                    for path in (self.object_path(digest), self.checkout_path(digest)):
+                        try:
+                            freed += path.stat().st_size
+                            path.unlink()
+                        except FileNotFoundError:
+                            pass
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        checkouts = 0
+        for checkout in self.root.glob("checkout/*/*"):
+            try:
+                st = checkout.stat()
+            except FileNotFoundError:
+                continue
+            # Nothing hardlinks to it any more; it is recreated from the object when needed
+            if st.st_nlink == 1 and st.st_mtime < cutoff and not checkout.name.endswith(".tmp"):
+                checkout.unlink(missing_ok=True)
+                freed += st.st_size
+                checkouts += 1
+        return {"stale_refs": len(stale), "blobs_deleted": deleted,
+                "checkouts_deleted": checkouts, "bytes_freed": freed}
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        blobs, unique_bytes, stored_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM blobs"
+        ).fetchone()
+        refs, logical_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM refs").fetchone()
+        with self._counters_lock:
+            counters = dict(self.counters)
+        return {
+            "blobs": blobs,
+            "references": refs,
+            "unique_bytes": unique_bytes,
+            "stored_bytes": stored_bytes,
+            "logical_bytes": logical_bytes,
+            "dedup_ratio": round(logical_bytes / unique_bytes, 3) if unique_bytes else 0.0,
+            **counters,
+        }
+
+
+blob_store = BlobStore(BLOB_STORE_DIR)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Inspect or garbage-collect the generated-file blob store")
+    parser.add_argument("command", choices=["stats", "gc"])
+    parser.add_argument("--grace", type=float, default=BLOB_GC_GRACE_SECONDS,
+                        help="Keep unreferenced blobs younger than this many seconds")
+    args = parser.parse_args()
+    result = blob_store.gc(args.grace) if args.command == "gc" else blob_store.stats()
+    print(json.dumps(result, indent=2))
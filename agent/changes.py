@@ -0,0 +1,56 @@
+"""
+Per-workspace file change notifications.
+
+``write_file`` publishes a change for every file it writes. Subscribers are
+plain callbacks, called on the writing thread. Notifications are process-local:
+the job event forwarding (server.jobs) turns them into job events that every
+worker can read, which is what the preview WebSocket follows.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+
+def _key(workspace) -> str:
+    return str(Path(workspace).resolve())
+
+
+class FileChangeHub:
+    """Fans file change events out to the subscribers of a workspace"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, list[Callable[[dict], None]]] = {}
+
+    def publish(self, workspace, path: str, kind: str = "modified"):
+        key = _key(workspace)
+        with self._lock:
+            subscribers = list(self._subscribers.get(key, ()))
+        event = {"path": path, "kind": kind, "time": time.time()}
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"File change subscriber failed: {e}")
+
+    @contextmanager
+    def subscribe(self, workspace, callback: Callable[[dict], None]):
+        """Calls callback(event) for every change in workspace during the block"""
+        key = _key(workspace)
+        with self._lock:
+            self._subscribers.setdefault(key, []).append(callback)
+        try:
+            yield
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(key, [])
+                if callback in subscribers:
+                    subscribers.remove(callback)
+                if not subscribers:
+                    self._subscribers.pop(key, None)
+
+
+file_changes = FileChangeHub()
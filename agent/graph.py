@@ -4,10 +4,18 @@ from langgraph.constants import END
 from langgraph.graph import StateGraph
 from langgraph.prebuilt import create_react_agent
 import os
+import re
+import time
 
+from agent.plan_cache import plan_index
+from agent.scheduler import CODER_SCHEDULER_ENABLED, schedule, step_timings
 from agent.prompts import *
 from agent.states import *
-from agent.tools import write_file, read_file, get_current_directory, list_files, init_project_root
+from agent.structured import check_blueprint, check_plan, invoke_structured, plan_paths, task_checker
+from agent.templates import template_registry
+from agent.usage import BudgetExceeded, budget_exceeded, usage_callback, usage_step
+from agent.validation import validator
+from agent.tools import write_file, read_file, get_current_directory, get_project_root, list_files, init_project_root
 
 _ = load_dotenv()
 
@@ -24,54 +32,210 @@ groq_api_key = os.getenv("GROQ_API_KEY")
 if not groq_api_key:
     raise ValueError("GROQ_API_KEY environment variable is required. Please set it in your .env file.")
 
-llm = ChatGroq(model="openai/gpt-oss-120b", api_key=groq_api_key)
+llm = ChatGroq(model="openai/gpt-oss-120b", api_key=groq_api_key, callbacks=[usage_callback])
+
+# Prompts at or below this many words with no multi-tier keywords use the fused fast mode
+FAST_MODE_MAX_WORDS = int(os.getenv("FAST_MODE_MAX_WORDS", "40"))
+COMPLEX_PROMPT_KEYWORDS = {
+    "api", "backend", "database", "sql", "sqlite", "postgres", "auth", "authentication",
+    "login", "server", "fastapi", "flask", "django", "express", "react", "microservice",
+    "docker", "deploy", "tests",
+}
+
+
+# Similarity above which a cached plan is reused as-is; above the warm threshold it seeds the prompts
+PLAN_REUSE_THRESHOLD = float(os.getenv("PLAN_REUSE_THRESHOLD", "0.85"))
+PLAN_WARM_START_THRESHOLD = float(os.getenv("PLAN_WARM_START_THRESHOLD", "0.4"))
+
+
+# Validation/repair rounds after the coder finishes; 0 disables validation
+MAX_REPAIR_ROUNDS = int(os.getenv("MAX_REPAIR_ROUNDS", "2"))
+
+
+def select_mode(state: dict) -> str:
+    """Picks fused ('fast') or two-stage ('full') planning for a request."""
+    mode = state.get("mode") or "auto"
+    if mode in ("fast", "full"):
+        return mode
+    words = re.findall(r"[a-z0-9+#]+", state["user_prompt"].lower())
+    if len(words) > FAST_MODE_MAX_WORDS or COMPLEX_PROMPT_KEYWORDS.intersection(words):
+        return "full"
+    return "fast"
+
+
+def template_agent(state: dict) -> dict:
+    """Seeds the workspace from a matching skeleton project, if any."""
+    if not state.get("use_templates", True):
+        return {"template": None, "template_files": ""}
+    template = template_registry.match(state["user_prompt"])
+    if template is None:
+        return {"template": None, "template_files": ""}
+
+    seeded = template_registry.seed(template)
+    print(f"Seeded workspace from template '{template.name}': {', '.join(seeded)}")
+    return {"template": template.name, "template_files": template.describe()}
+
+
+def plan_lookup_agent(state: dict) -> dict:
+    """Reuses or warm-starts from the plan of a similar past prompt."""
+    if not state.get("reuse_plans", True):
+        return {"plan_source": "fresh"}
+    match = plan_index.lookup(state["user_prompt"])
+    if match is None or match.similarity < PLAN_WARM_START_THRESHOLD:
+        return {"plan_source": "fresh"}
+
+    print(f"Plan index match ({match.similarity:.2f}): {match.prompt}")
+    if match.similarity >= PLAN_REUSE_THRESHOLD:
+        return {"plan": match.plan, "task_plan": match.task_plan, "plan_source": "cache"}
+    return {"warm_start": match.task_plan, "plan_source": "warm_start"}
+
+
+def route_after_lookup(state: dict) -> str:
+    """Skips planning entirely when the plan index supplied a TaskPlan."""
+    if state.get("task_plan") is not None:
+        return "coder"
+    return select_mode(state)
+
+
+def remember_plan(state: dict, plan: Plan, task_plan: TaskPlan):
+    """Adds a freshly generated plan to the plan index."""
+    if state.get("reuse_plans", True):
+        plan_index.add(state["user_prompt"], plan, task_plan)
+
+
+def stop_planning(node: str, reason: str, plan: Optional[Plan] = None) -> dict:
+    """Ends the run on an exhausted budget before any step was carried out."""
+    skipped = [f.path for f in plan.files] if plan is not None else []
+    print(f"Stopping in {node}: {reason}")
+    return {"status": "DONE", "budget_exceeded": reason, "skipped_steps": skipped}
+
+
+def route_after_planning(next_node: str):
+    """Edge to next_node, or to the end when planning stopped on the budget."""
+    return lambda s: "END" if s.get("budget_exceeded") else next_node
 
 
 def planner_agent(state: dict) -> dict:
     """Converts user prompt into a structured Plan."""
     user_prompt = state["user_prompt"]
-    resp = llm.with_structured_output(Plan).invoke(
-        planner_prompt(user_prompt)
-    )
-    if resp is None:
-        raise ValueError("Planner did not return a valid response.")
+    warm_start: TaskPlan = state.get("warm_start")
+    try:
+        resp = invoke_structured(
+            llm, Plan,
+            planner_prompt(
+                user_prompt,
+                warm_start.plan.model_dump_json() if warm_start else "",
+                state.get("template_files", "")
+            ),
+            check_plan, "planner"
+        )
+    except BudgetExceeded as e:
+        return stop_planning("planner", str(e))
     return {"plan": resp}
 
 
 def architect_agent(state: dict) -> dict:
     """Creates TaskPlan from Plan."""
     plan: Plan = state["plan"]
-    resp = llm.with_structured_output(TaskPlan).invoke(
-        architect_prompt(plan=plan.model_dump_json())
-    )
-    if resp is None:
-        raise ValueError("Planner did not return a valid response.")
+    warm_start: TaskPlan = state.get("warm_start")
+    try:
+        resp = invoke_structured(
+            llm, TaskPlan,
+            architect_prompt(
+                plan=plan.model_dump_json(),
+                warm_start=TaskPlan(implementation_steps=warm_start.implementation_steps).model_dump_json()
+                if warm_start else "",
+                existing_files=state.get("template_files", "")
+            ),
+            task_checker(plan_paths(plan)), "architect"
+        )
+    except BudgetExceeded as e:
+        return stop_planning("architect", str(e), plan)
 
     resp.plan = plan
     print(resp.model_dump_json())
+    remember_plan(state, plan, resp)
     return {"task_plan": resp}
 
 
+def fast_planner_agent(state: dict) -> dict:
+    """Creates Plan and TaskPlan in a single structured-output call."""
+    user_prompt = state["user_prompt"]
+    warm_start: TaskPlan = state.get("warm_start")
+    reference = ""
+    if warm_start:
+        reference = ProjectBlueprint(
+            plan=warm_start.plan, implementation_steps=warm_start.implementation_steps
+        ).model_dump_json()
+    try:
+        resp = invoke_structured(
+            llm, ProjectBlueprint,
+            fast_planner_prompt(user_prompt, reference, state.get("template_files", "")),
+            check_blueprint, "fast_planner"
+        )
+    except BudgetExceeded as e:
+        return stop_planning("fast_planner", str(e))
+
+    task_plan = TaskPlan(implementation_steps=resp.implementation_steps)
+    task_plan.plan = resp.plan
+    remember_plan(state, resp.plan, task_plan)
+    return {"plan": resp.plan, "task_plan": task_plan}
+
+
+def coder_context(state: dict) -> str:
+    """Plan and project index for the coder prompt prefix, rendered deterministically per job."""
+    task_plan: TaskPlan = state["task_plan"]
+    plan: Optional[Plan] = getattr(task_plan, "plan", None) or state.get("plan")
+    if plan is None:
+        paths = dict.fromkeys(step.filepath for step in task_plan.implementation_steps)
+        return project_context_prompt("(not available)", "\n".join(f"- {path}" for path in paths))
+    index = "\n".join(f"- {f.path}: {f.purpose}" for f in plan.files)
+    return project_context_prompt(plan.model_dump_json(exclude={"files"}), index)
+
+
+def stop_coder(coder_state: CoderState, reason: str) -> dict:
+    """Ends the run on an exhausted budget, reporting the steps that were not carried out."""
+    steps = coder_state.task_plan.implementation_steps
+    skipped = [step.filepath for step in steps[coder_state.current_step_idx:]]
+    print(f"Stopping: {reason}; skipping {len(skipped)} remaining steps")
+    return {"coder_state": coder_state, "status": "DONE", "budget_exceeded": reason, "skipped_steps": skipped}
+
+
+def schedule_steps(coder_state: CoderState) -> CoderState:
+    """Reorders the steps preview entry first, then along the critical path (see agent.scheduler)."""
+    steps = coder_state.task_plan.implementation_steps
+    root = get_project_root()
+    # Existing files (repair rounds, templates) tell how large the result will be
+    expected_bytes = {step.filepath: (root / step.filepath).stat().st_size
+                      for step in steps if (root / step.filepath).is_file()}
+    ordered = schedule(steps, expected_bytes)
+    if [s.filepath for s in ordered] != [s.filepath for s in steps]:
+        print(f"Scheduled {len(ordered)} steps: {', '.join(s.filepath for s in ordered)}")
+    task_plan = coder_state.task_plan.model_copy(update={"implementation_steps": ordered})
+    return coder_state.model_copy(update={"task_plan": task_plan, "scheduled": True})
+
+
 def coder_agent(state: dict) -> dict:
     """LangGraph tool-using coder agent."""
     coder_state: CoderState = state.get("coder_state")
     if coder_state is None:
         coder_state = CoderState(task_plan=state["task_plan"], current_step_idx=0)
+    if CODER_SCHEDULER_ENABLED and not coder_state.scheduled and coder_state.current_step_idx == 0:
+        coder_state = schedule_steps(coder_state)
 
     steps = coder_state.task_plan.implementation_steps
     if coder_state.current_step_idx >= len(steps):
         return {"coder_state": coder_state, "status": "DONE"}
+    reason = budget_exceeded()
+    if reason:
+        return stop_coder(coder_state, reason)
 
     current_task = steps[coder_state.current_step_idx]
     existing_content = read_file.run(current_task.filepath)
 
-    system_prompt = coder_system_prompt()
-    user_prompt = (
-        f"Task: {current_task.task_description}\n"
-        f"File: {current_task.filepath}\n"
-        f"Existing content:\n{existing_content}\n"
-        "Use write_file(path, content) to save your changes."
-    )
+    # Stable prefix (same for every step and repair round of this job) first, per-step details last
+    system_prompt = coder_system_prompt() + coder_context(state)
+    user_prompt = coder_task_prompt(current_task.task_description, current_task.filepath, existing_content)
 
     # Bind tools to LLM with proper tool definitions
     coder_tools = [read_file, write_file, list_files, get_current_directory]
@@ -80,9 +244,19 @@ def coder_agent(state: dict) -> dict:
     llm_with_tools = llm.bind_tools(coder_tools)
     react_agent = create_react_agent(llm_with_tools, coder_tools)
 
+    started = time.perf_counter()
     try:
-        react_agent.invoke({"messages": [{"role": "system", "content": system_prompt},
-                                         {"role": "user", "content": user_prompt}]})
+        with usage_step(f"{coder_state.current_step_idx + 1}:{current_task.filepath}"):
+            react_agent.invoke({"messages": [{"role": "system", "content": system_prompt},
+                                             {"role": "user", "content": user_prompt}]})
+        written = get_project_root() / current_task.filepath
+        if written.is_file():
+            # Feeds the scheduler's cost estimates for this file type
+            step_timings.record(current_task.filepath, time.perf_counter() - started,
+                                written.stat().st_size, len(current_task.task_description.split()))
+    except BudgetExceeded as e:
+        # The interrupted step is reported as skipped; whatever it wrote so far is kept
+        return stop_coder(coder_state, str(e))
     except Exception as e:
         # If tool call fails, log and continue
         print(f"Warning: Tool execution error: {e}")
@@ -91,21 +265,69 @@ def coder_agent(state: dict) -> dict:
     return {"coder_state": coder_state}
 
 
-graph = StateGraph(dict)
+def validate_agent(state: dict) -> dict:
+    """Validates generated files and queues targeted repair steps for failing ones."""
+    task_plan: TaskPlan = state["task_plan"]
+    plan: Optional[Plan] = getattr(task_plan, "plan", None)
+    paths = {step.filepath for step in task_plan.implementation_steps}
+    if plan is not None:
+        paths |= {f.path for f in plan.files}
+
+    checks = validator.validate(sorted(paths))
+    failures = {c.path: c.errors for c in checks if not c.ok}
+    skipped = sum(1 for c in checks if c.cached)
+    print(f"Validated {len(checks)} files ({skipped} unchanged), {len(failures)} failing")
+
+    repair_round = state.get("repair_round", 0)
+    if not failures or repair_round >= MAX_REPAIR_ROUNDS:
+        return {"validation": failures, "status": "DONE"}
+
+    repair_plan = TaskPlan(implementation_steps=[
+        ImplementationTask(filepath=path, task_description=repair_task_prompt(path, errors))
+        for path, errors in failures.items()
+    ])
+    repair_plan.plan = plan
+    return {
+        "validation": failures,
+        "repair_round": repair_round + 1,
+        "coder_state": CoderState(task_plan=repair_plan, current_step_idx=0),
+        "status": "REPAIR",
+    }
+
+
+graph = StateGraph(GraphState)
 
+graph.add_node("template", template_agent)
+graph.add_node("plan_lookup", plan_lookup_agent)
 graph.add_node("planner", planner_agent)
+graph.add_node("fast_planner", fast_planner_agent)
 graph.add_node("architect", architect_agent)
 graph.add_node("coder", coder_agent)
+graph.add_node("validate", validate_agent)
 
-graph.add_edge("planner", "architect")
-graph.add_edge("architect", "coder")
+graph.add_conditional_edges("planner", route_after_planning("architect"), {"architect": "architect", "END": END})
+graph.add_conditional_edges("architect", route_after_planning("coder"), {"coder": "coder", "END": END})
+graph.add_conditional_edges("fast_planner", route_after_planning("coder"), {"coder": "coder", "END": END})
 graph.add_conditional_edges(
     "coder",
-    lambda s: "END" if s.get("status") == "DONE" else "coder",
-    {"END": END, "coder": "coder"}
+    lambda s: ("validate" if MAX_REPAIR_ROUNDS > 0 and not s.get("budget_exceeded") else "END")
+    if s.get("status") == "DONE" else "coder",
+    {"validate": "validate", "END": END, "coder": "coder"}
+)
+graph.add_conditional_edges(
+    "validate",
+    lambda s: "coder" if s.get("status") == "REPAIR" else "END",
+    {"coder": "coder", "END": END}
+)
+
+graph.add_edge("template", "plan_lookup")
+graph.add_conditional_edges(
+    "plan_lookup",
+    route_after_lookup,
+    {"coder": "coder", "fast": "fast_planner", "full": "planner"}
 )
 
-graph.set_entry_point("planner")
+graph.set_entry_point("template")
 agent = graph.compile()
 if __name__ == "__main__":
     result = agent.invoke({"user_prompt": "Build a colourful modern todo app in html css and js"},
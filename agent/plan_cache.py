@@ -0,0 +1,217 @@
+"""
+Local similarity index over past prompts and their Plan/TaskPlan results.
+
+Prompts are reduced to normalized word sets and indexed with MinHash signatures
+and LSH banding, so candidate lookup stays cheap as the index grows. Candidates
+are then ranked by exact Jaccard similarity. Everything lives in one JSON file
+shared by all workers: saves merge with what is on disk under a file lock, so
+no worker drops another's entries or hit counts. No external service is involved.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from agent.states import Plan, TaskPlan
+from agent.tools import STATE_DIR
+
+NUM_PERM = 64
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+STOPWORDS = {
+    "a", "an", "and", "app", "application", "build", "create", "for", "in", "make", "me",
+    "of", "on", "please", "simple", "that", "the", "to", "using", "with", "write",
+}
+
+
+def tokenize(text: str) -> set[str]:
+    """Normalizes a prompt into a set of content words"""
+    words = re.findall(r"[a-z0-9+#]+", text.lower())
+    tokens = set()
+    for word in words:
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.add(word)
+    return tokens
+
+
+def _hash_token(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(tokens: set[str]) -> list[int]:
+    """Computes the MinHash signature of a token set"""
+    hashes = [_hash_token(t) for t in tokens] or [0]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def lsh_bands(signature: list[int]) -> list[str]:
+    """Splits a signature into band keys for the LSH buckets"""
+    return [
+        f"{band}:" + ",".join(str(v) for v in signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])
+        for band in range(LSH_BANDS)
+    ]
+
+
+def jaccard(a: set[str], b: set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class PlanMatch:
+    """A past prompt similar to the current one, with its cached results"""
+    prompt: str
+    similarity: float
+    plan: Plan
+    task_plan: TaskPlan
+
+
+class PlanIndex:
+    """MinHash/LSH index of past prompts persisted to a JSON file"""
+
+    def __init__(self, path: Path, max_entries: int = 500):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: list[dict] = []
+        self._buckets: dict[str, set[int]] = {}
+        # Changes not yet merged into the file: added entries and hits, by token key
+        self._added: dict[str, dict] = {}
+        self._hits: dict[str, int] = {}
+        self._entries = self._read()
+        self._rebuild_buckets()
+
+    @staticmethod
+    def _key(entry: dict) -> str:
+        return " ".join(entry["tokens"])
+
+    def _read(self) -> list[dict]:
+        if not self.path.exists():
+            return []
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable plan index {self.path}: {e}")
+            return []
+
+    def _rebuild_buckets(self):
+        self._buckets = {}
+        for idx, entry in enumerate(self._entries):
+            for key in lsh_bands(entry["signature"]):
+                self._buckets.setdefault(key, set()).add(idx)
+
+    @contextmanager
+    def _file_lock(self):
+        """Serializes read-merge-write cycles across worker processes"""
+        try:
+            import fcntl
+        except ImportError:  # Windows: single-process use only
+            yield
+            return
+        with open(self.path.with_name(f"{self.path.name}.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _evict(self, entries: list[dict]) -> list[dict]:
+        if len(entries) <= self.max_entries:
+            return entries
+        # Evict the least reused entries first, oldest first among ties
+        ranked = sorted(range(len(entries)), key=lambda i: (entries[i].get("hits", 0), i))
+        evict = set(ranked[:len(entries) - self.max_entries])
+        return [e for i, e in enumerate(entries) if i not in evict]
+
+    def _save(self):
+        """Merges pending adds and hits into the file and reloads the merged index; caller holds _lock"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._file_lock():
+            entries = [e for e in self._read() if self._key(e) not in self._added]
+            for entry in entries:
+                entry["hits"] = entry.get("hits", 0) + self._hits.get(self._key(entry), 0)
+            entries = self._evict(entries + list(self._added.values()))
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(entries), encoding="utf-8")
+            os.replace(tmp, self.path)
+        self._added, self._hits = {}, {}
+        self._entries = entries
+        self._rebuild_buckets()
+
+    def _persist(self):
+        try:
+            self._save()
+        except OSError as e:
+            print(f"Warning: Could not persist plan index: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, prompt: str) -> Optional[PlanMatch]:
+        """Returns the most similar past prompt, or None if no LSH candidate exists"""
+        tokens = tokenize(prompt)
+        signature = minhash(tokens)
+        with self._lock:
+            candidates = set()
+            for key in lsh_bands(signature):
+                candidates |= self._buckets.get(key, set())
+            best, best_score = None, 0.0
+            for idx in candidates:
+                entry = self._entries[idx]
+                score = jaccard(tokens, set(entry["tokens"]))
+                if score > best_score:
+                    best, best_score = entry, score
+            if best is None:
+                return None
+            best["hits"] = best.get("hits", 0) + 1
+            key = self._key(best)
+            if key in self._added:
+                self._added[key]["hits"] = best["hits"]
+            else:
+                self._hits[key] = self._hits.get(key, 0) + 1
+            # Eviction ranks by hits, so they are persisted like entries
+            self._persist()
+
+        task_plan = TaskPlan.model_validate(best["task_plan"])
+        plan = Plan.model_validate(best["plan"])
+        task_plan.plan = plan
+        return PlanMatch(prompt=best["prompt"], similarity=best_score, plan=plan, task_plan=task_plan)
+
+    def add(self, prompt: str, plan: Plan, task_plan: TaskPlan):
+        """Records a freshly generated plan, replacing any entry for the same prompt"""
+        tokens = tokenize(prompt)
+        entry = {
+            "prompt": prompt,
+            "tokens": sorted(tokens),
+            "signature": minhash(tokens),
+            "plan": plan.model_dump(),
+            "task_plan": TaskPlan(implementation_steps=task_plan.implementation_steps).model_dump(),
+            "hits": 0,
+        }
+        with self._lock:
+            key = self._key(entry)
+            self._hits.pop(key, None)
+            self._added[key] = entry
+            self._entries = self._evict([e for e in self._entries if self._key(e) != key] + [entry])
+            self._rebuild_buckets()
+            self._persist()
+
+plan_index = PlanIndex(
+    Path(os.getenv("PLAN_INDEX_PATH", STATE_DIR / "plan_index.json")),
+    max_entries=int(os.getenv("PLAN_INDEX_MAX_ENTRIES", "500")),
+)
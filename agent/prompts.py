@@ -1,14 +1,33 @@
-def planner_prompt(user_prompt: str) -> str:
+def warm_start_section(reference: str) -> str:
+    return f"""
+A very similar request was planned before. Use this reference as a starting point,
+keeping what fits the current request and changing whatever does not:
+{reference}
+"""
+
+
+def template_section(existing_files: str) -> str:
+    return f"""
+The workspace is already seeded from a template with these files:
+{existing_files}
+Build on these files. Keep every file that already satisfies the request as it is,
+and only plan additions and modifications (deltas) against the existing files.
+"""
+
+
+def planner_prompt(user_prompt: str, warm_start: str = "", existing_files: str = "") -> str:
     PLANNER_PROMPT = f"""
 You are the PLANNER agent. Convert the user prompt into a COMPLETE engineering project plan.
 
 User request:
 {user_prompt}
+{warm_start_section(warm_start) if warm_start else ""}
+{template_section(existing_files) if existing_files else ""}
     """
     return PLANNER_PROMPT
 
 
-def architect_prompt(plan: str) -> str:
+def architect_prompt(plan: str, warm_start: str = "", existing_files: str = "") -> str:
     ARCHITECT_PROMPT = f"""
 You are the ARCHITECT agent. Given this project plan, break it down into explicit engineering tasks.
 
@@ -24,6 +43,8 @@ RULES:
 
 Project Plan:
 {plan}
+{warm_start_section(warm_start) if warm_start else ""}
+{template_section(existing_files) if existing_files else ""}
     """
     return ARCHITECT_PROMPT
 
@@ -50,3 +71,63 @@ Always:
 - When a module is imported from another file, ensure it exists and is implemented as described.
     """
     return CODER_SYSTEM_PROMPT
+
+
+def project_context_prompt(plan: str, project_index: str) -> str:
+    # Identical for every coder step of a job, so it belongs in the cached prompt prefix
+    PROJECT_CONTEXT_PROMPT = f"""
+Project plan:
+{plan}
+
+Project index (every file of the project and its purpose):
+{project_index}
+    """
+    return PROJECT_CONTEXT_PROMPT
+
+
+def coder_task_prompt(task_description: str, filepath: str, existing_content: str) -> str:
+    # Per-step suffix; keep everything that varies between steps in here
+    CODER_TASK_PROMPT = f"""
+Task: {task_description}
+File: {filepath}
+Existing content:
+{existing_content}
+Use write_file(path, content) to save your changes.
+    """
+    return CODER_TASK_PROMPT
+
+
+def fast_planner_prompt(user_prompt: str, warm_start: str = "", existing_files: str = "") -> str:
+    FAST_PLANNER_PROMPT = f"""
+You are the PLANNER and ARCHITECT agent. Convert the user prompt into a COMPLETE engineering project plan
+AND break that plan down into explicit implementation steps, in a single response.
+
+RULES:
+- The plan must list every file the project needs, each with its purpose.
+- For each FILE in the plan, create one or more IMPLEMENTATION TASKS.
+- In each task description:
+    * Specify exactly what to implement.
+    * Name the variables, functions, classes, and components to be defined.
+    * Include integration details: imports, expected function signatures, data flow.
+- Order tasks so that dependencies are implemented first.
+- Only create tasks for files listed in the plan.
+
+User request:
+{user_prompt}
+{warm_start_section(warm_start) if warm_start else ""}
+{template_section(existing_files) if existing_files else ""}
+    """
+    return FAST_PLANNER_PROMPT
+
+
+
+def repair_task_prompt(filepath: str, errors: list[str]) -> str:
+    error_list = "\n".join(f"- {e}" for e in errors)
+    REPAIR_TASK_PROMPT = f"""
+Fix the validation errors reported for {filepath}. Read the file, correct ONLY what is
+needed to resolve these errors while keeping its existing behaviour, then write the full file back.
+
+Errors:
+{error_list}
+    """
+    return REPAIR_TASK_PROMPT
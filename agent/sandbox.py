@@ -0,0 +1,358 @@
+"""
+Sandboxed, pooled command execution.
+
+Commands run inside a warm pool of small worker processes started with the
+``spawn`` method, so forking a command never copies the (large) server process.
+Each worker isolates itself once at startup: it enters a fresh network namespace
+(no network) and, where a delegated cgroup v2 hierarchy is available, its own
+cgroup with memory and pid limits. Every command additionally gets rlimits for
+CPU time, address space, file size and core dumps.
+
+Output is streamed back to the caller chunk by chunk and capped; a command that
+exceeds the cap is killed. CPU time consumed by commands is charged against the
+active per-job budget (see ``job_cpu_budget``).
+"""
+
+import contextvars
+import ctypes
+import errno
+import math
+import multiprocessing
+import os
+import resource
+import selectors
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+CHUNK_SIZE = 8192
+# How long a command waits for a free worker before it fails
+SANDBOX_ACQUIRE_TIMEOUT = float(os.getenv("SANDBOX_ACQUIRE_TIMEOUT", "120"))
+
+
+@dataclass
+class SandboxLimits:
+    """Resource limits applied to every command"""
+    cpu_seconds: int = int(os.getenv("SANDBOX_CPU_SECONDS", "30"))
+    memory_mb: int = int(os.getenv("SANDBOX_MEMORY_MB", "2048"))
+    file_size_mb: int = int(os.getenv("SANDBOX_FILE_SIZE_MB", "64"))
+    max_output_bytes: int = int(os.getenv("SANDBOX_MAX_OUTPUT_BYTES", str(1024 * 1024)))
+    max_pids: int = int(os.getenv("SANDBOX_MAX_PIDS", "64"))
+    no_network: bool = os.getenv("SANDBOX_NO_NETWORK", "true").lower() == "true"
+
+
+class CpuBudget:
+    """Aggregate CPU-time budget shared by all commands of one job"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.used = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self.seconds - self.used)
+
+    def charge(self, seconds: float):
+        with self._lock:
+            self.used += seconds
+
+
+_cpu_budget: contextvars.ContextVar[Optional[CpuBudget]] = contextvars.ContextVar("cpu_budget", default=None)
+
+
+@contextmanager
+def job_cpu_budget(seconds: Optional[float] = None):
+    """Charges every sandboxed command run inside this block to one CPU budget"""
+    if seconds is None:
+        seconds = float(os.getenv("SANDBOX_JOB_CPU_SECONDS", "120"))
+    budget = CpuBudget(seconds)
+    token = _cpu_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _cpu_budget.reset(token)
+
+
+# ==================== Worker side ====================
+
+def _write_id_map(path: str, inside: int, outside: int):
+    with open(path, "w") as f:
+        f.write(f"{inside} {outside} 1")
+
+
+def _isolate_network() -> bool:
+    """Moves the calling process into a new, empty network namespace"""
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(CLONE_NEWNET) == 0:
+        return True
+    if ctypes.get_errno() != errno.EPERM:
+        return False
+    # Unprivileged: a user namespace grants the capability to create the net namespace
+    uid, gid = os.getuid(), os.getgid()
+    if libc.unshare(CLONE_NEWUSER | CLONE_NEWNET) != 0:
+        return False
+    try:
+        with open("/proc/self/setgroups", "w") as f:
+            f.write("deny")
+        _write_id_map("/proc/self/uid_map", uid, uid)
+        _write_id_map("/proc/self/gid_map", gid, gid)
+    except OSError:
+        pass
+    return True
+
+
+def _join_cgroup(limits: SandboxLimits) -> Optional[str]:
+    """Places the worker in its own cgroup v2 group under SANDBOX_CGROUP_ROOT, if delegated"""
+    root = Path(os.getenv("SANDBOX_CGROUP_ROOT", "/sys/fs/cgroup/devorchestrator"))
+    if not (root / "cgroup.procs").exists():
+        return None
+    group = root / f"worker-{os.getpid()}"
+    try:
+        group.mkdir(exist_ok=True)
+        (group / "memory.max").write_text(str(limits.memory_mb * 1024 * 1024))
+        (group / "pids.max").write_text(str(limits.max_pids))
+        (group / "cgroup.procs").write_text(str(os.getpid()))
+    except OSError:
+        return None
+    return str(group)
+
+
+def _command_rlimits(limits: SandboxLimits, cpu_seconds: int):
+    def apply():
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        memory = limits.memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        size = limits.file_size_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_FSIZE, (size, size))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    return apply
+
+
+def _children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _run_job(conn, limits: SandboxLimits, job: dict):
+    cpu_seconds = max(1, min(limits.cpu_seconds, math.ceil(job["cpu_seconds"])))
+    cpu_before = _children_cpu()
+    proc = subprocess.Popen(
+        job["cmd"], shell=True, cwd=job["cwd"],
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        preexec_fn=_command_rlimits(limits, cpu_seconds), start_new_session=True,
+    )
+    sel = selectors.DefaultSelector()
+    sel.register(proc.stdout, selectors.EVENT_READ, "stdout")
+    sel.register(proc.stderr, selectors.EVENT_READ, "stderr")
+    deadline = time.monotonic() + job["timeout"]
+    sent = 0
+    reason = None
+    while sel.get_map():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            reason = "timeout"
+            break
+        for key, _ in sel.select(timeout=min(remaining, 1.0)):
+            chunk = os.read(key.fileobj.fileno(), CHUNK_SIZE)
+            if not chunk:
+                sel.unregister(key.fileobj)
+                continue
+            allowed = limits.max_output_bytes - sent
+            if allowed > 0:
+                conn.send(("output", key.data, chunk[:allowed].decode("utf-8", errors="replace")))
+                sent += min(len(chunk), allowed)
+            if len(chunk) > allowed:
+                reason = "output_limit"
+                break
+        if reason:
+            break
+    sel.close()
+    proc.stdout.close()
+    proc.stderr.close()
+    if not reason:
+        # The command may close its output and keep running; the deadline still applies
+        try:
+            proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            reason = "timeout"
+    if reason:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    returncode = proc.wait()
+    conn.send(("exit", returncode, _children_cpu() - cpu_before, reason))
+
+
+def _worker_main(conn, limits_dict: dict):
+    limits = SandboxLimits(**limits_dict)
+    isolated = _isolate_network() if limits.no_network else False
+    cgroup = _join_cgroup(limits)
+    conn.send(("ready", {"pid": os.getpid(), "no_network": isolated, "cgroup": cgroup}))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        try:
+            _run_job(conn, limits, job)
+        except Exception as e:
+            conn.send(("exit", 126, 0.0, f"error: {e}"))
+
+
+# ==================== Pool side ====================
+
+class _Worker:
+    def __init__(self, ctx, limits: SandboxLimits):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, asdict(limits)), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.info = self._expect_ready()
+
+    def _expect_ready(self) -> dict:
+        if not self.conn.poll(30):
+            raise RuntimeError("Sandbox worker did not start")
+        message = self.conn.recv()
+        if message[0] != "ready":
+            raise RuntimeError(f"Sandbox worker sent {message[0]!r} instead of 'ready'")
+        return message[1]
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class SandboxPool:
+    """A warm pool of sandboxed worker processes that run shell commands"""
+
+    def __init__(self, size: int, limits: Optional[SandboxLimits] = None,
+                 acquire_timeout: float = SANDBOX_ACQUIRE_TIMEOUT):
+        self.size = max(1, size)
+        self.limits = limits or SandboxLimits()
+        self.acquire_timeout = acquire_timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: list[_Worker] = []
+        self._started = 0
+        # Notified whenever a worker is returned or a worker slot frees up
+        self._available = threading.Condition()
+
+    def warm(self):
+        """Starts all workers up front instead of on first use"""
+        with self._available:
+            missing = self.size - self._started
+        workers = [self._acquire() for _ in range(missing)]
+        for worker in workers:
+            self._release(worker)
+
+    def _acquire(self, timeout: Optional[float] = None) -> _Worker:
+        """Takes an idle worker or starts one; raises TimeoutError if none frees up in time"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._available:
+            while not self._idle and self._started >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No sandbox worker became free within {timeout:.0f}s")
+                self._available.wait(remaining)
+            worker = self._idle.pop() if self._idle else None
+            if worker is None:
+                self._started += 1
+        if worker is not None:
+            if worker.alive():
+                return worker
+            # Replaced below; the slot stays counted
+            worker.kill()
+        try:
+            return _Worker(self._ctx, self.limits)
+        except Exception:
+            with self._available:
+                self._started -= 1
+                self._available.notify()
+            raise
+
+    def _release(self, worker: _Worker):
+        with self._available:
+            self._idle.append(worker)
+            self._available.notify()
+
+    def _discard(self, worker: _Worker):
+        worker.kill()
+        with self._available:
+            self._started -= 1
+            self._available.notify()
+
+    def run(self, cmd: str, cwd: str, timeout: float = 30,
+            on_output: Optional[Callable[[str, str], None]] = None) -> Tuple[int, str, str]:
+        """Runs a shell command in a sandbox worker and returns (returncode, stdout, stderr)"""
+        budget = _cpu_budget.get()
+        cpu_seconds = self.limits.cpu_seconds
+        if budget is not None:
+            if budget.remaining <= 0:
+                return 137, "", f"CPU budget of {budget.seconds:.0f}s for this job is exhausted"
+            cpu_seconds = min(cpu_seconds, budget.remaining)
+
+        try:
+            worker = self._acquire()
+        except TimeoutError as e:
+            return 137, "", f"[sandbox] {e}"
+        out = {"stdout": [], "stderr": []}
+        try:
+            worker.conn.send({"cmd": cmd, "cwd": cwd, "timeout": timeout, "cpu_seconds": cpu_seconds})
+            deadline = time.monotonic() + timeout + 10
+            while True:
+                if not worker.conn.poll(max(0.0, deadline - time.monotonic())):
+                    raise TimeoutError("Sandbox worker stopped responding")
+                message = worker.conn.recv()
+                if message[0] == "output":
+                    _, stream, text = message
+                    out[stream].append(text)
+                    if on_output is not None:
+                        on_output(stream, text)
+                    continue
+                _, returncode, cpu_used, reason = message
+                break
+        except (EOFError, OSError, TimeoutError) as e:
+            self._discard(worker)
+            return 137, "".join(out["stdout"]), "".join(out["stderr"]) + f"\n[sandbox] {e}"
+
+        self._release(worker)
+        if budget is not None:
+            budget.charge(cpu_used)
+        stderr = "".join(out["stderr"])
+        if reason == "timeout":
+            stderr += f"\n[sandbox] Command timed out after {timeout}s"
+        elif reason == "output_limit":
+            stderr += f"\n[sandbox] Output exceeded {self.limits.max_output_bytes} bytes; command killed"
+        elif reason:
+            stderr += f"\n[sandbox] {reason}"
+        return returncode, "".join(out["stdout"]), stderr
+
+    def shutdown(self):
+        with self._available:
+            workers, self._idle = self._idle, []
+            self._started -= len(workers)
+            self._available.notify_all()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.kill()
+
+
+sandbox_pool = SandboxPool(int(os.getenv("SANDBOX_WORKERS", "2")))
@@ -0,0 +1,204 @@
+"""
+Ordering of the coder's implementation steps.
+
+The coder carries out one step at a time, so scheduling means choosing the
+order. Steps form a dependency graph: a step depends on the steps of every
+other planned file its description mentions, and steps on the same file keep
+their relative order. Each step gets a cost estimate from its file type's
+past step durations (``STATE_DIR/step_timings.json``), the length of its
+description and the expected size of its file.
+
+Among the steps whose dependencies are done, the next one is picked by:
+
+1. preview entry (``index.html``) first, so a usable preview appears early;
+   its links to scripts and stylesheets do not count as dependencies;
+2. then entry points and the files the preview entry mentions;
+3. then the longest remaining chain of dependent work (critical path);
+4. then the architect's order.
+
+A dependency cycle is broken by taking the best-ranked step that is left.
+"""
+
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Optional
+
+from agent.states import ImplementationTask
+from agent.tools import STATE_DIR
+
+CODER_SCHEDULER_ENABLED = os.getenv("CODER_SCHEDULER", "true").lower() == "true"
+STEP_TIMINGS_PATH = Path(os.getenv("STEP_TIMINGS_PATH", STATE_DIR / "step_timings.json"))
+# Used until a file type has a recorded step
+DEFAULT_STEP_SECONDS = 20.0
+DEFAULT_FILE_BYTES = 3000
+DEFAULT_DESCRIPTION_WORDS = 60
+# Weight of new samples in the per-filetype moving averages
+TIMING_ALPHA = 0.2
+
+PREVIEW_ENTRY_NAMES = {"index.html"}
+ENTRY_POINT_NAMES = {
+    "main.py", "app.py", "server.py", "manage.py", "package.json",
+    "main.js", "index.js", "app.js", "server.js", "main.ts", "index.ts",
+    "main.jsx", "index.jsx", "app.jsx", "main.tsx", "index.tsx", "app.tsx",
+}
+TIER_PREVIEW, TIER_ENTRY, TIER_OTHER = 0, 1, 2
+
+
+def is_preview_entry(path: str) -> bool:
+    return PurePosixPath(path).name.lower() in PREVIEW_ENTRY_NAMES
+
+
+def is_entry_point(path: str) -> bool:
+    return PurePosixPath(path).name.lower() in ENTRY_POINT_NAMES
+
+
+def _filetype(path: str) -> str:
+    return PurePosixPath(path).suffix.lower() or PurePosixPath(path).name.lower()
+
+
+class StepTimings:
+    """Moving averages of coder step duration, file size and description length per file type"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                self._stats = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring unreadable step timings {self.path}: {e}")
+
+    def get(self, filetype: str) -> Optional[dict]:
+        with self._lock:
+            stats = self._stats.get(filetype)
+            return dict(stats) if stats else None
+
+    def record(self, path: str, seconds: float, file_bytes: int, description_words: int):
+        sample = {"seconds": seconds, "bytes": file_bytes, "words": description_words}
+        with self._lock:
+            stats = self._stats.get(_filetype(path))
+            if stats is None:
+                stats = self._stats[_filetype(path)] = {**sample, "count": 0}
+            else:
+                for key, value in sample.items():
+                    stats[key] += TIMING_ALPHA * (value - stats[key])
+            stats["count"] += 1
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(self._stats, indent=1), encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"Warning: Could not save step timings: {e}")
+
+    def estimate(self, step: ImplementationTask, expected_bytes: Optional[int] = None) -> float:
+        """Expected seconds for a step, scaled from its file type's average step"""
+        stats = self.get(_filetype(step.filepath)) or {
+            "seconds": DEFAULT_STEP_SECONDS, "bytes": DEFAULT_FILE_BYTES, "words": DEFAULT_DESCRIPTION_WORDS,
+        }
+        words = len(step.task_description.split())
+        # Longer instructions and larger files take longer, within bounds
+        word_factor = min(3.0, max(0.5, words / max(stats["words"], 1)))
+        size_factor = 1.0
+        if expected_bytes:
+            size_factor = min(3.0, max(0.5, expected_bytes / max(stats["bytes"], 1)))
+        return stats["seconds"] * (0.4 + 0.3 * word_factor + 0.3 * size_factor)
+
+
+step_timings = StepTimings(STEP_TIMINGS_PATH)
+
+
+@dataclass
+class ScheduledStep:
+    index: int
+    step: ImplementationTask
+    cost: float
+    tier: int = TIER_OTHER
+    depends_on: set[int] = field(default_factory=set)
+    dependents: set[int] = field(default_factory=set)
+    critical_path: float = 0.0
+
+
+def _mentions(text: str, path: str) -> bool:
+    """Whether text refers to path by its full path or its file name"""
+    for name in {path, PurePosixPath(path).name}:
+        if re.search(rf"(?<![\w./-]){re.escape(name)}(?![\w-])", text):
+            return True
+    return False
+
+
+def build_graph(steps: list[ImplementationTask], expected_bytes: Optional[dict[str, int]] = None,
+                timings: StepTimings = step_timings) -> list[ScheduledStep]:
+    """Dependency graph of steps with cost estimates, tiers and critical path lengths"""
+    expected_bytes = expected_bytes or {}
+    nodes = [ScheduledStep(i, step, timings.estimate(step, expected_bytes.get(step.filepath)))
+             for i, step in enumerate(steps)]
+    first_step: dict[str, int] = {}
+    previous_step: dict[str, int] = {}
+    for node in nodes:
+        first_step.setdefault(node.step.filepath, node.index)
+
+    for node in nodes:
+        path = node.step.filepath
+        if path in previous_step:
+            node.depends_on.add(previous_step[path])
+        previous_step[path] = node.index
+        if is_preview_entry(path):
+            continue
+        for other, other_index in first_step.items():
+            if other != path and _mentions(node.step.task_description, other):
+                node.depends_on.add(other_index)
+    for node in nodes:
+        for dep in node.depends_on:
+            nodes[dep].dependents.add(node.index)
+
+    for node in nodes:
+        if is_preview_entry(node.step.filepath):
+            node.tier = TIER_PREVIEW
+            for other, other_index in first_step.items():
+                if other != node.step.filepath and _mentions(node.step.task_description, other):
+                    nodes[other_index].tier = min(nodes[other_index].tier, TIER_ENTRY)
+        elif is_entry_point(node.step.filepath):
+            node.tier = min(node.tier, TIER_ENTRY)
+
+    # Longest chain of work that waits on each step, itself included
+    def chain(index: int, visiting: set[int]) -> float:
+        node = nodes[index]
+        if node.critical_path:
+            return node.critical_path
+        visiting.add(index)
+        longest = max((chain(d, visiting) for d in node.dependents if d not in visiting), default=0.0)
+        visiting.discard(index)
+        node.critical_path = node.cost + longest
+        return node.critical_path
+
+    for node in nodes:
+        chain(node.index, set())
+    return nodes
+
+
+def schedule(steps: list[ImplementationTask], expected_bytes: Optional[dict[str, int]] = None,
+             timings: StepTimings = step_timings) -> list[ImplementationTask]:
+    """Steps in execution order (see the module docstring)"""
+    nodes = build_graph(steps, expected_bytes, timings)
+    done: set[int] = set()
+    order: list[ImplementationTask] = []
+
+    def rank(node: ScheduledStep):
+        return node.tier, -node.critical_path, node.index
+
+    while len(done) < len(nodes):
+        pending = [n for n in nodes if n.index not in done]
+        # Steps on the same file stay in order even when a cycle is broken
+        in_order = [n for n in pending
+                    if not any(d not in done and nodes[d].step.filepath == n.step.filepath for d in n.depends_on)]
+        ready = [n for n in in_order if n.depends_on <= done] or in_order or pending
+        best = min(ready, key=rank)
+        done.add(best.index)
+        order.append(best.step)
+    return order
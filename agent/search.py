@@ -0,0 +1,433 @@
+"""
+Full-text search over the files of all generated workspaces.
+
+``write_file`` indexes every file it writes into an SQLite FTS5 table with the
+trigram tokenizer (``STATE_DIR/search.db``), so any substring of three or more
+characters is an index lookup instead of a scan over every workspace.
+Literal queries match as a phrase ranked by bm25. Regex queries are narrowed
+to the files containing the literal runs the pattern requires, then checked
+line by line. A regex with no such run, or a query shorter than three
+characters, falls back to scanning the stored text. Regexes are length-capped
+and matched in a separate worker process that is killed once a search runs
+past its time limit, since a backtracking pattern cannot be interrupted.
+
+A workspace is named by its path relative to the working directory
+(``generated_project``, ``generated_projects/<job>/<item>``); the ``project``
+filter matches that name or anything below it. Files written outside
+``write_file`` are picked up by ``python -m agent.search reindex <dir>``.
+"""
+
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from agent.tools import STATE_DIR
+
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX", "true").lower() == "true"
+SEARCH_INDEX_PATH = Path(os.getenv("SEARCH_INDEX_PATH", STATE_DIR / "search.db"))
+# Larger files (bundles, minified vendor code) are not indexed
+SEARCH_MAX_FILE_BYTES = int(os.getenv("SEARCH_MAX_FILE_BYTES", str(512 * 1024)))
+SEARCH_MAX_PATTERN_LENGTH = int(os.getenv("SEARCH_MAX_PATTERN_LENGTH", "256"))
+# Regex searches running longer are killed (0 matches in the calling thread, without a limit)
+SEARCH_REGEX_TIMEOUT = float(os.getenv("SEARCH_REGEX_TIMEOUT", "2"))
+MAX_MATCHES_PER_FILE = 5
+MAX_LINE_CHARS = 300
+TRIGRAM = 3
+# Escapes matching one character of a class, or nothing (anchors)
+_CLASS_ESCAPES = set("wWdDsSbBAZ")
+
+
+def project_name(workspace) -> str:
+    """Name of a workspace in the index: its path relative to the working directory if below it"""
+    path = Path(workspace).resolve()
+    try:
+        return path.relative_to(Path.cwd().resolve()).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def required_literals(pattern: str) -> list[str]:
+    """
+    Literal runs every match of pattern must contain, for narrowing a regex
+    search through the trigram index. Conservative: alternations and group
+    contents contribute nothing, and a character made optional by a
+    quantifier ends the run before it. Escapes other than escaped punctuation
+    and character classes (\\x41, \\n, \\1, ...) are not decoded: the pattern
+    then yields no runs and the search scans every file.
+    """
+    if "|" in pattern:
+        return []
+    runs, current = [], []
+
+    def end_run():
+        if len(current) >= TRIGRAM:
+            runs.append("".join(current))
+        current.clear()
+
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            escaped = pattern[i + 1]
+            i += 2
+            if escaped in _CLASS_ESCAPES:
+                end_run()
+                continue
+            if escaped.isalnum() or escaped.isspace():
+                # Character codes, control characters and back references
+                return []
+            current.append(escaped)
+        elif c == "[":
+            # Skip the character class, honouring escapes and a leading ]
+            j = i + 1
+            if j < len(pattern) and pattern[j] == "^":
+                j += 1
+            if j < len(pattern) and pattern[j] == "]":
+                j += 1
+            while j < len(pattern) and pattern[j] != "]":
+                j += 2 if pattern[j] == "\\" else 1
+            i = j + 1
+            end_run()
+            continue
+        elif c == "(":
+            depth, j = 0, i
+            while j < len(pattern):
+                if pattern[j] == "\\":
+                    j += 2
+                    continue
+                depth += {"(": 1, ")": -1}.get(pattern[j], 0)
+                j += 1
+                if depth == 0:
+                    break
+            i = j
+            end_run()
+            continue
+        elif c in "*?{":
+            # The previous character is optional (or repeated a variable number of times)
+            if current:
+                current.pop()
+            end_run()
+            if c == "{":
+                close = pattern.find("}", i)
+                i = close + 1 if close != -1 else len(pattern)
+            else:
+                i += 1
+            if i < len(pattern) and pattern[i] in "?+":
+                i += 1
+            continue
+        elif c == "+":
+            # The previous character is required, but whatever follows may come after repeats of it
+            end_run()
+            i += 1
+            if i < len(pattern) and pattern[i] in "?+":
+                i += 1
+            continue
+        elif c in ".^$)":
+            end_run()
+            i += 1
+            continue
+        else:
+            current.append(c)
+            i += 1
+    end_run()
+    return runs
+
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+class SearchIndex:
+    """Trigram-indexed copy of workspace files"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # Connections must not cross a fork (supervisor workers)
+        if conn is None or self._local.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY, project TEXT NOT NULL, path TEXT NOT NULL,
+                    size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, indexed_at REAL NOT NULL,
+                    UNIQUE (project, path)
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(body, tokenize='trigram');
+            """)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # ---------- updates ----------
+
+    def update(self, workspace, path: str, content: str, mtime_ns: int = 0):
+        """Indexes (or re-indexes) one file of workspace; path is relative to the workspace"""
+        project = project_name(workspace)
+        size = len(content.encode("utf-8"))
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id FROM files WHERE project = ? AND path = ?", (project, path)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM docs WHERE rowid = ?", (row[0],))
+            if size > SEARCH_MAX_FILE_BYTES or "\0" in content:
+                if row is not None:
+                    conn.execute("DELETE FROM files WHERE id = ?", (row[0],))
+                return
+            conn.execute(
+                "INSERT INTO files (project, path, size, mtime_ns, indexed_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (project, path) DO UPDATE SET size = excluded.size, "
+                "mtime_ns = excluded.mtime_ns, indexed_at = excluded.indexed_at",
+                (project, path, size, mtime_ns, time.time()),
+            )
+            file_id = conn.execute("SELECT id FROM files WHERE project = ? AND path = ?", (project, path)).fetchone()[0]
+            conn.execute("INSERT INTO docs (rowid, body) VALUES (?, ?)", (file_id, content))
+
+    def remove(self, workspace, path: str):
+        project = project_name(workspace)
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id FROM files WHERE project = ? AND path = ?", (project, path)).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM docs WHERE rowid = ?", (row[0],))
+                conn.execute("DELETE FROM files WHERE id = ?", (row[0],))
+
+    def drop_project(self, workspace) -> int:
+        """Removes every file of workspace (and of the workspaces below it) from the index"""
+        project = project_name(workspace)
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            ids = [r[0] for r in conn.execute(
+                "SELECT id FROM files WHERE project = ? OR substr(project, 1, ?) = ?",
+                (project, len(project) + 1, project + "/"),
+            )]
+            conn.executemany("DELETE FROM docs WHERE rowid = ?", [(i,) for i in ids])
+            conn.executemany("DELETE FROM files WHERE id = ?", [(i,) for i in ids])
+        return len(ids)
+
+    def reindex(self, workspace) -> dict:
+        """Brings the index of workspace in line with the files on disk (changed, new and deleted files)"""
+        root = Path(workspace)
+        project = project_name(root)
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in self._connect().execute(
+            "SELECT path, size, mtime_ns FROM files WHERE project = ?", (project,))}
+        indexed = skipped = 0
+        seen = set()
+        for file in root.rglob("*"):
+            rel = file.relative_to(root)
+            if not file.is_file() or any(part.startswith(".") for part in rel.parts):
+                continue
+            path = rel.as_posix()
+            seen.add(path)
+            st = file.stat()
+            if known.get(path) == (st.st_size, st.st_mtime_ns):
+                continue
+            try:
+                content = file.read_text(encoding="utf-8")
+            except (UnicodeDecodeError, OSError):
+                skipped += 1
+                continue
+            self.update(root, path, content, st.st_mtime_ns)
+            indexed += 1
+        removed = set(known) - seen
+        for path in removed:
+            self.remove(root, path)
+        return {"project": project, "indexed": indexed, "removed": len(removed), "skipped": skipped}
+
+    # ---------- queries ----------
+
+    def search(self, query: str, project: Optional[str] = None, regex: bool = False,
+               case_sensitive: bool = False, limit: int = 20, context: int = 1) -> list[dict]:
+        """
+        Files matching query with their matching lines, best first. Raises
+        ValueError for an invalid or overlong regex, or one that runs past
+        SEARCH_REGEX_TIMEOUT.
+        """
+        if regex and len(query) > SEARCH_MAX_PATTERN_LENGTH:
+            raise ValueError(f"Regex is longer than {SEARCH_MAX_PATTERN_LENGTH} characters")
+        try:
+            re.compile(query if regex else re.escape(query))
+        except re.error as e:
+            raise ValueError(f"Invalid regex: {e}")
+        args = (query, project, regex, case_sensitive, limit, context)
+        if regex and SEARCH_REGEX_TIMEOUT > 0:
+            return regex_runner.run(self.path, args, SEARCH_REGEX_TIMEOUT)
+        return self._search(*args)
+
+    def _search(self, query: str, project: Optional[str], regex: bool, case_sensitive: bool,
+                limit: int, context: int) -> list[dict]:
+        matcher = re.compile(query if regex else re.escape(query), 0 if case_sensitive else re.IGNORECASE)
+        literals = required_literals(query) if regex else ([query] if len(query) >= TRIGRAM else [])
+
+        sql = "SELECT files.project, files.path, docs.body, {score} FROM docs JOIN files ON files.id = docs.rowid"
+        where, params = [], []
+        if literals:
+            sql = sql.format(score="bm25(docs)")
+            where.append("docs MATCH ?")
+            params.append(" AND ".join(_fts_phrase(lit) for lit in literals))
+        else:
+            sql = sql.format(score="0.0")
+            if not regex:
+                # Under three characters: no trigram to look up, scan instead
+                where.append("docs.body LIKE ? ESCAPE '\\'")
+                params.append("%" + re.sub(r"([%_\\])", r"\\\1", query) + "%")
+        if project:
+            project = project.rstrip("/")
+            where.append("(files.project = ? OR substr(files.project, 1, ?) = ?)")
+            params += [project, len(project) + 1, project + "/"]
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if literals:
+            sql += " ORDER BY bm25(docs)"
+
+        results = []
+        for project_, path, body, score in self._connect().execute(sql, params):
+            hits = self._matching_lines(body, matcher, context)
+            if not hits:
+                continue
+            results.append({"project": project_, "path": path, "score": round(-score, 6), **hits})
+            # Ranked candidates: the first ``limit`` confirmed matches are the best ones
+            if literals and len(results) >= limit:
+                break
+        if not literals:
+            results.sort(key=lambda r: r["match_count"], reverse=True)
+        return results[:limit]
+
+    @staticmethod
+    def _matching_lines(body: str, matcher: re.Pattern, context: int) -> Optional[dict]:
+        lines = body.split("\n")
+        count, matches = 0, []
+        for number, line in enumerate(lines):
+            found = len(matcher.findall(line))
+            if not found:
+                continue
+            count += found
+            if len(matches) < MAX_MATCHES_PER_FILE:
+                span = matcher.search(line).span()
+                matches.append({
+                    "line": number + 1,
+                    "text": line[:MAX_LINE_CHARS],
+                    "span": list(span),
+                    "before": [l[:MAX_LINE_CHARS] for l in lines[max(0, number - context):number]],
+                    "after": [l[:MAX_LINE_CHARS] for l in lines[number + 1:number + 1 + context]],
+                })
+        if not count:
+            # Matches spanning lines (a regex with \n) still count, without line snippets
+            whole = len(matcher.findall(body))
+            return {"match_count": whole, "matches": []} if whole else None
+        return {"match_count": count, "matches": matches}
+
+    def stats(self) -> dict:
+        files, projects, size = self._connect().execute(
+            "SELECT COUNT(*), COUNT(DISTINCT project), COALESCE(SUM(size), 0) FROM files"
+        ).fetchone()
+        return {
+            "files": files,
+            "projects": projects,
+            "indexed_bytes": size,
+            "index_bytes": sum(p.stat().st_size for p in self.path.parent.glob(self.path.name + "*")),
+        }
+
+
+def _regex_worker_main(conn):
+    conn.send("ready")
+    while True:
+        try:
+            path, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send(("ok", SearchIndex(path)._search(*args)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+class RegexRunner:
+    """
+    Runs regex searches in a spawned worker process, one at a time. A search
+    still running after its timeout is stopped by killing the worker, which is
+    replaced on the next search.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._process = None
+        self._conn = None
+
+    def _start(self):
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child = ctx.Pipe()
+        self._process = ctx.Process(target=_regex_worker_main, args=(child,), daemon=True, name="search-regex")
+        self._process.start()
+        child.close()
+        # Startup (imports) does not count against a search's time limit
+        if not self._conn.poll(60) or self._conn.recv() != "ready":
+            self._stop()
+            raise RuntimeError("Regex search worker did not start")
+
+    def _stop(self):
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        self._process = self._conn = None
+
+    def run(self, path: Path, args: tuple, timeout: float) -> list[dict]:
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                if self._process is not None:
+                    self._stop()
+                self._start()
+            self._conn.send((str(path), args))
+            if not self._conn.poll(timeout):
+                self._stop()
+                raise ValueError(f"Regex search took longer than {timeout:g}s; use a simpler pattern")
+            status, result = self._conn.recv()
+        if status == "error":
+            raise ValueError(result)
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            if self._process is not None:
+                self._stop()
+
+
+regex_runner = RegexRunner()
+search_index = SearchIndex(SEARCH_INDEX_PATH)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Maintain or query the generated-code search index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    reindex = sub.add_parser("reindex", help="Index the files of workspaces already on disk")
+    reindex.add_argument("workspaces", nargs="+", type=Path)
+    query = sub.add_parser("search")
+    query.add_argument("query")
+    query.add_argument("--project")
+    query.add_argument("--regex", action="store_true")
+    query.add_argument("--limit", type=int, default=20)
+    sub.add_parser("stats")
+    args = parser.parse_args()
+
+    if args.command == "reindex":
+        result = [search_index.reindex(w) for w in args.workspaces]
+    elif args.command == "search":
+        result = search_index.search(args.query, args.project, args.regex, limit=args.limit)
+    else:
+        result = search_index.stats()
+    print(json.dumps(result, indent=2))
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, TypedDict
 
 from pydantic import BaseModel, Field, ConfigDict
 
@@ -25,4 +25,48 @@ class TaskPlan(BaseModel):
 class CoderState(BaseModel):
     task_plan: TaskPlan = Field(description="The plan for the task to be implemented")
     current_step_idx: int = Field(0, description="The index of the current step in the implementation steps")
-    current_file_content: Optional[str] = Field(None, description="The content of the file currently being edited or created")
\ No newline at end of file
+    current_file_content: Optional[str] = Field(None, description="The content of the file currently being edited or created")
+    scheduled: bool = Field(False, description="Whether the steps were put in execution order by the scheduler")
+
+class ProjectBlueprint(BaseModel):
+    plan: Plan = Field(description="The project plan: name, description, techstack, features and files")
+    implementation_steps: list[ImplementationTask] = Field(description="An ordered list of implementation steps covering every file in the plan")
+
+
+class GraphState(TypedDict, total=False):
+    """Shared LangGraph state; every node update is merged into it key by key."""
+    user_prompt: str
+    mode: str
+    reuse_plans: bool
+    use_templates: bool
+    template: Optional[str]
+    template_files: str
+    plan_source: str
+    warm_start: Optional[TaskPlan]
+    plan: Plan
+    task_plan: TaskPlan
+    coder_state: CoderState
+    status: str
+    repair_round: int
+    validation: dict[str, list[str]]
+    budget_exceeded: Optional[str]
+    skipped_steps: list[str]
+
+
+def summarize_state(state: Optional[dict]) -> dict:
+    """JSON-safe summary of a final GraphState for job results and batch output."""
+    if not state:
+        return {}
+    plan = state.get("plan")
+    task_plan = state.get("task_plan")
+    files = sorted({step.filepath for step in task_plan.implementation_steps}) if task_plan else []
+    return {
+        "project_name": plan.name if plan else None,
+        "files": files,
+        "steps": len(task_plan.implementation_steps) if task_plan else 0,
+        "plan_source": state.get("plan_source"),
+        "template": state.get("template"),
+        "validation": state.get("validation") or {},
+        "budget_exceeded": state.get("budget_exceeded"),
+        "skipped_steps": state.get("skipped_steps") or [],
+    }
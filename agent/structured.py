@@ -0,0 +1,209 @@
+"""
+Streaming structured output with early validation and cancel-and-retry.
+
+Plans and task plans are requested as a forced tool call and streamed. While
+the arguments arrive they are parsed as partial JSON; every completed list
+element is checked against its pydantic schema and the project invariants
+(relative paths that stay inside the workspace, tasks only for planned files,
+no duplicates). On the first violation the stream is closed, so the provider
+stops generating, and the request is retried with the problems spelled out.
+Retries and the tokens spent on rejected attempts are recorded in the job's
+UsageTracker.
+"""
+
+import json
+import os
+import pathlib
+from typing import Callable, Optional, Type, TypeVar
+
+from langchain_core.utils.json import parse_partial_json
+from pydantic import BaseModel, ValidationError
+
+from agent.states import File, ImplementationTask, Plan, ProjectBlueprint, TaskPlan
+from agent.tools import safe_path_for_project
+from agent.usage import current_tracker
+
+STRUCTURED_MAX_RETRIES = int(os.getenv("STRUCTURED_MAX_RETRIES", "2"))
+# Partial output is re-checked whenever this many characters have arrived since the last check
+STRUCTURED_CHECK_INTERVAL = int(os.getenv("STRUCTURED_CHECK_INTERVAL", "200"))
+
+Model = TypeVar("Model", bound=BaseModel)
+# check(data, final) -> list of problems; data is the (partial) parsed arguments
+Check = Callable[[dict, bool], list[str]]
+
+
+class StructuredOutputError(ValueError):
+    """Raised when no valid structured output was produced within the retry limit"""
+
+
+def path_problems(path) -> list[str]:
+    if not isinstance(path, str) or not path.strip():
+        return ["empty file path"]
+    if pathlib.PurePosixPath(path).is_absolute() or pathlib.PureWindowsPath(path).is_absolute():
+        return [f"'{path}' is an absolute path; use a path relative to the project root"]
+    try:
+        safe_path_for_project(path)
+    except ValueError:
+        return [f"'{path}' points outside the project root"]
+    return []
+
+
+def normalize_path(path: str) -> str:
+    return pathlib.PurePosixPath(path.strip().replace("\\", "/")).as_posix().removeprefix("./")
+
+
+def complete_items(items, final: bool) -> list:
+    """Elements of a streamed list that can no longer change (all but the last until the end)"""
+    if not isinstance(items, list):
+        return []
+    return items if final else items[:-1]
+
+
+def schema_problems(model: Type[BaseModel], item, label: str) -> list[str]:
+    try:
+        model.model_validate(item)
+    except ValidationError as e:
+        return [f"{label}: " + "; ".join(f"{'.'.join(map(str, err['loc']))} {err['msg']}" for err in e.errors())]
+    return []
+
+
+def check_plan(data: dict, final: bool) -> list[str]:
+    problems = []
+    seen = set()
+    for i, item in enumerate(complete_items(data.get("files"), final)):
+        problems += schema_problems(File, item, f"files[{i}]")
+        path = item.get("path") if isinstance(item, dict) else None
+        problems += path_problems(path)
+        if isinstance(path, str):
+            if normalize_path(path) in seen:
+                problems.append(f"'{path}' is listed twice")
+            seen.add(normalize_path(path))
+    if final:
+        problems += schema_problems(Plan, data, "plan")
+        if not data.get("files"):
+            problems.append("the plan lists no files")
+    return problems
+
+
+def task_checker(planned_paths: Optional[set[str]], key: str = "implementation_steps") -> Check:
+    """Checks streamed implementation steps, optionally against the paths of a known plan"""
+
+    def check(data: dict, final: bool) -> list[str]:
+        problems = []
+        steps = data.get(key)
+        for i, item in enumerate(complete_items(steps, final)):
+            problems += schema_problems(ImplementationTask, item, f"{key}[{i}]")
+            path = item.get("filepath") if isinstance(item, dict) else None
+            problems += path_problems(path)
+            if planned_paths is not None and isinstance(path, str) and normalize_path(path) not in planned_paths:
+                problems.append(f"task for '{path}', which is not a file of the plan")
+        if final:
+            if not steps:
+                problems.append("there are no implementation steps")
+            elif planned_paths is not None:
+                covered = {normalize_path(s["filepath"]) for s in steps
+                           if isinstance(s, dict) and isinstance(s.get("filepath"), str)}
+                missing = [p for p in sorted(planned_paths - covered) if not safe_path_for_project(p).exists()]
+                if missing:
+                    problems.append(f"no task creates the planned files: {', '.join(missing)}")
+        return problems
+
+    return check
+
+
+def complete_keys(data: dict, final: bool) -> list[str]:
+    """Keys of a streamed object whose values can no longer change (all but the last until the end)"""
+    keys = list(data)
+    return keys if final else keys[:-1]
+
+
+def check_blueprint(data: dict, final: bool) -> list[str]:
+    plan = data.get("plan") if isinstance(data.get("plan"), dict) else {}
+    # Partial JSON keeps the key order, so the plan object is closed once another key follows it;
+    # the model may emit implementation_steps before plan
+    plan_done = final or "plan" in complete_keys(data, False)
+    problems = [f"plan: {p}" for p in check_plan(plan, plan_done)]
+    planned = None
+    if plan_done and isinstance(plan.get("files"), list):
+        planned = {normalize_path(f["path"]) for f in plan["files"]
+                   if isinstance(f, dict) and isinstance(f.get("path"), str)}
+    return problems + task_checker(planned)(data, final)
+
+
+def plan_paths(plan: Plan) -> set[str]:
+    return {normalize_path(f.path) for f in plan.files}
+
+
+def repair_prompt(prompt: str, problems: list[str]) -> str:
+    problem_list = "\n".join(f"- {p}" for p in problems[:10])
+    return f"""{prompt}
+
+Your previous answer was rejected because of these problems:
+{problem_list}
+Produce the complete answer again and make sure none of these problems remain.
+"""
+
+
+def _estimate_tokens(text: str) -> int:
+    # Aborted streams report no usage; ~4 characters per token is close enough for accounting
+    return max(1, len(text) // 4)
+
+
+def invoke_structured(llm, schema: Type[Model], prompt: str, check: Check, label: str,
+                      max_retries: Optional[int] = None) -> Model:
+    """
+    Streams a structured response for schema, validating it as it arrives.
+
+    Raises StructuredOutputError when every attempt was rejected.
+    """
+    max_retries = STRUCTURED_MAX_RETRIES if max_retries is None else max_retries
+    runnable = llm.bind_tools([schema], tool_choice=schema.__name__)
+    tracker = current_tracker()
+    current_prompt = prompt
+    problems: list[str] = []
+
+    for attempt in range(max_retries + 1):
+        args = ""
+        checked = 0
+        problems = []
+        stream = runnable.stream(current_prompt)
+        try:
+            for chunk in stream:
+                for tool_chunk in getattr(chunk, "tool_call_chunks", None) or []:
+                    if tool_chunk.get("index") in (0, None):
+                        args += tool_chunk.get("args") or ""
+                if len(args) - checked >= STRUCTURED_CHECK_INTERVAL:
+                    checked = len(args)
+                    partial = parse_partial_json(args)
+                    if isinstance(partial, dict):
+                        problems = check(partial, False)
+                    if problems:
+                        break
+        finally:
+            # Closing the generator aborts the HTTP stream when we broke out early
+            stream.close()
+
+        aborted = bool(problems)
+        if not aborted:
+            try:
+                data = json.loads(args) if args else None
+            except json.JSONDecodeError as e:
+                data, problems = None, [f"the arguments are not valid JSON ({e.msg})"]
+            if not problems and not isinstance(data, dict):
+                problems = [f"no {schema.__name__} object was returned"]
+            if not problems:
+                problems = check(data, True)
+            if not problems:
+                try:
+                    return schema.model_validate(data)
+                except ValidationError as e:
+                    problems = [str(e)]
+
+        prompt_tokens, completion_tokens = _estimate_tokens(current_prompt), _estimate_tokens(args)
+        print(f"{label}: rejected attempt {attempt + 1} ({'aborted early' if aborted else 'complete'}, "
+              f"~{prompt_tokens + completion_tokens} tokens): {problems[0]}")
+        if tracker is not None:
+            tracker.record_retry(label, prompt_tokens, completion_tokens, aborted)
+        current_prompt = repair_prompt(prompt, problems)
+
+    raise StructuredOutputError(f"{label} did not return a valid {schema.__name__}: {'; '.join(problems[:3])}")
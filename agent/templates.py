@@ -0,0 +1,160 @@
+"""
+Template registry for warm-starting generation from skeleton projects.
+
+Every ``pre_generated_project_<name>`` directory in the repository root (plus any
+directory listed in TEMPLATE_DIRS) is indexed with metadata and per-file summaries.
+An optional ``template.json`` inside a template can override its description,
+keywords and tech stack. When a prompt matches a template, its files seed the
+workspace so the architect only has to plan deltas against them.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from agent.plan_cache import tokenize
+from agent.tools import write_file
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+TEMPLATE_PREFIX = "pre_generated_project_"
+TEXT_SUFFIXES = {".html", ".css", ".js", ".json", ".md", ".py", ".txt"}
+
+# Prompt words that name a tech stack; a template only matches if it covers all of them
+STACK_WORDS = {
+    "html": "html", "css": "css", "js": "javascript", "javascript": "javascript",
+    "vanilla": "javascript", "python": "python", "react": "react", "vue": "vue",
+    "angular": "angular", "node": "node", "flask": "flask", "django": "django",
+    "fastapi": "fastapi", "typescript": "typescript", "ts": "typescript",
+}
+SUFFIX_STACK = {".html": "html", ".css": "css", ".js": "javascript", ".py": "python", ".ts": "typescript"}
+
+
+@dataclass
+class TemplateFile:
+    """A file in a template with a one-line summary for prompts"""
+    path: str
+    size: int
+    summary: str
+
+
+@dataclass
+class Template:
+    """An indexed skeleton project"""
+    name: str
+    root: Path
+    description: str
+    keywords: set[str]
+    stack: set[str]
+    files: list[TemplateFile] = field(default_factory=list)
+
+    def describe(self) -> str:
+        """Renders the template's file list for planner and architect prompts"""
+        lines = [f"Template '{self.name}': {self.description}"]
+        lines += [f"- {f.path} ({f.size} bytes): {f.summary}" for f in self.files]
+        return "\n".join(lines)
+
+
+def summarize_file(path: Path, content: str) -> str:
+    """Builds a short summary of a file from cheap syntactic cues"""
+    suffix = path.suffix.lower()
+    if suffix == ".html":
+        title = re.search(r"<title>(.*?)</title>", content, re.S | re.I)
+        assets = re.findall(r'(?:href|src)=["\'](?!https?:)([^"\']+)["\']', content)
+        ids = re.findall(r'id=["\']([^"\']+)["\']', content)
+        parts = [f"page '{title.group(1).strip()}'" if title else "HTML page"]
+        if assets:
+            parts.append("loads " + ", ".join(assets))
+        if ids:
+            parts.append("element ids " + ", ".join(ids[:8]))
+        return "; ".join(parts)
+    if suffix in (".js", ".ts"):
+        content = re.sub(r"/\*.*?\*/|//[^\n]*", "", content, flags=re.S)
+        names = re.findall(r"(?:function\s+(\w+)|class\s+(\w+)|(?:const|let)\s+(\w+)\s*=\s*(?:\(|async|function))", content)
+        symbols = [n for group in names for n in group if n]
+        return "defines " + ", ".join(symbols[:12]) if symbols else "script"
+    if suffix == ".css":
+        selectors = re.findall(r"^\s*([.#][\w-]+)", content, re.M)
+        return f"stylesheet with {len(selectors)} class/id rules"
+    if suffix == ".py":
+        symbols = re.findall(r"^(?:def|class)\s+(\w+)", content, re.M)
+        return "defines " + ", ".join(symbols[:12]) if symbols else "python module"
+    first_line = next((line.strip("# ").strip() for line in content.splitlines() if line.strip()), "")
+    return first_line[:120] or "file"
+
+
+def load_template(root: Path) -> Template:
+    """Indexes one template directory"""
+    name = root.name[len(TEMPLATE_PREFIX):] if root.name.startswith(TEMPLATE_PREFIX) else root.name
+    meta = {}
+    meta_file = root / "template.json"
+    if meta_file.exists():
+        meta = json.loads(meta_file.read_text(encoding="utf-8"))
+
+    files = []
+    stack = set()
+    for p in sorted(root.rglob("*")):
+        if not p.is_file() or p.name == "template.json" or p.suffix.lower() not in TEXT_SUFFIXES:
+            continue
+        content = p.read_text(encoding="utf-8", errors="replace")
+        files.append(TemplateFile(path=str(p.relative_to(root)), size=len(content), summary=summarize_file(p, content)))
+        if p.suffix.lower() in SUFFIX_STACK:
+            stack.add(SUFFIX_STACK[p.suffix.lower()])
+
+    return Template(
+        name=meta.get("name", name),
+        root=root,
+        description=meta.get("description", f"{name.replace('_', ' ')} skeleton"),
+        # Explicit keywords replace the directory-name tokens; normalized like prompts
+        keywords=tokenize(" ".join(meta["keywords"]) if "keywords" in meta else name.replace("_", " ")),
+        stack=set(meta.get("stack", [])) or stack,
+        files=files,
+    )
+
+
+class TemplateRegistry:
+    """Indexes skeleton projects and matches prompts against them"""
+
+    def __init__(self, roots: list[Path]):
+        self.templates: list[Template] = []
+        for root in roots:
+            try:
+                self.templates.append(load_template(root))
+            except (OSError, ValueError) as e:
+                print(f"Warning: Skipping template {root}: {e}")
+
+    def match(self, prompt: str) -> Optional[Template]:
+        """Returns the template whose keywords all appear in the prompt and whose stack covers it"""
+        tokens = tokenize(prompt)
+        wanted_stack = {STACK_WORDS[t] for t in tokens if t in STACK_WORDS}
+        best, best_score = None, 0.0
+        for template in self.templates:
+            if not template.keywords or not template.keywords <= tokens:
+                continue
+            if not wanted_stack <= template.stack:
+                continue
+            score = len(template.keywords) / (len(tokens) or 1)
+            if score > best_score:
+                best, best_score = template, score
+        return best
+
+    def seed(self, template: Template) -> list[str]:
+        """Writes the template's files into the active workspace"""
+        written = []
+        for f in template.files:
+            content = (template.root / f.path).read_text(encoding="utf-8", errors="replace")
+            write_file.invoke({"path": f.path, "content": content})
+            written.append(f.path)
+        return written
+
+
+def discover_template_roots() -> list[Path]:
+    roots = sorted(p for p in REPO_ROOT.glob(f"{TEMPLATE_PREFIX}*") if p.is_dir())
+    for extra in filter(None, os.getenv("TEMPLATE_DIRS", "").split(os.pathsep)):
+        roots += sorted(p for p in Path(extra).iterdir() if p.is_dir())
+    return roots
+
+
+template_registry = TemplateRegistry(discover_template_roots())
@@ -1,16 +1,44 @@
+import os
 import pathlib
-import subprocess
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Tuple
 
 from langchain_core.tools import tool
 
+from agent.changes import file_changes
+from agent.sandbox import sandbox_pool
+
 PROJECT_ROOT = pathlib.Path.cwd() / "generated_project"
+# Local caches and indexes kept across runs (plan index, etc.)
+STATE_DIR = pathlib.Path(os.getenv("DEVORCH_STATE_DIR", pathlib.Path.cwd() / ".devorchestrator"))
+
+# Workspace of the current run; concurrent runs (batch mode) each set their own
+_project_root: ContextVar[pathlib.Path] = ContextVar("project_root", default=PROJECT_ROOT)
+
+
+def get_project_root() -> pathlib.Path:
+    """Returns the workspace directory of the current run."""
+    return _project_root.get()
+
+
+@contextmanager
+def use_project_root(path):
+    """Points the file tools at another workspace for the duration of the block."""
+    root = pathlib.Path(path)
+    root.mkdir(parents=True, exist_ok=True)
+    token = _project_root.set(root)
+    try:
+        yield root
+    finally:
+        _project_root.reset(token)
 
 
 def safe_path_for_project(path: str) -> pathlib.Path:
     """Safely resolves a path within the project root."""
-    p = (PROJECT_ROOT / path).resolve()
-    project_root_resolved = PROJECT_ROOT.resolve()
+    project_root = get_project_root()
+    p = (project_root / path).resolve()
+    project_root_resolved = project_root.resolve()
     
     # Check if the resolved path is within the project root
     try:
@@ -25,9 +53,25 @@ def safe_path_for_project(path: str) -> pathlib.Path:
 def write_file(path: str, content: str) -> str:
     """Writes content to a file at the specified path within the project root."""
     p = safe_path_for_project(path)
-    p.parent.mkdir(parents=True, exist_ok=True)
-    with open(p, "w", encoding="utf-8") as f:
-        f.write(content)
+    kind = "modified" if p.exists() else "created"
+    # Imported here: the blob store and the search index keep their data under STATE_DIR, defined above
+    from agent.blobstore import BLOB_STORE_ENABLED, blob_store
+    from agent.search import SEARCH_INDEX_ENABLED, search_index
+    if BLOB_STORE_ENABLED:
+        blob_store.write(p, content)
+    else:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        with open(p, "w", encoding="utf-8") as f:
+            f.write(content)
+    root = get_project_root()
+    relpath = p.relative_to(root.resolve()).as_posix()
+    if SEARCH_INDEX_ENABLED:
+        try:
+            search_index.update(root, relpath, content, p.stat().st_mtime_ns)
+        except Exception as e:
+            # A stale search index is no reason to fail the write
+            print(f"Search index update failed for {relpath}: {e}")
+    file_changes.publish(root, relpath, kind)
     return f"WROTE:{p}"
 
 
@@ -44,7 +88,7 @@ def read_file(path: str) -> str:
 @tool
 def get_current_directory() -> str:
     """Returns the current working directory."""
-    return str(PROJECT_ROOT)
+    return str(get_project_root())
 
 
 @tool
@@ -53,15 +97,15 @@ def list_files(directory: str = ".") -> str:
     p = safe_path_for_project(directory)
     if not p.is_dir():
         return f"ERROR: {p} is not a directory"
-    files = [str(f.relative_to(PROJECT_ROOT)) for f in p.glob("**/*") if f.is_file()]
+    root = get_project_root().resolve()
+    files = [str(f.relative_to(root)) for f in p.glob("**/*") if f.is_file()]
     return "\n".join(files) if files else "No files found."
 
 @tool
 def run_cmd(cmd: str, cwd: str = None, timeout: int = 30) -> Tuple[int, str, str]:
     """Runs a shell command in the specified directory and returns the result."""
-    cwd_dir = safe_path_for_project(cwd) if cwd else PROJECT_ROOT
-    res = subprocess.run(cmd, shell=True, cwd=str(cwd_dir), capture_output=True, text=True, timeout=timeout)
-    return res.returncode, res.stdout, res.stderr
+    cwd_dir = safe_path_for_project(cwd) if cwd else get_project_root()
+    return sandbox_pool.run(cmd, cwd=str(cwd_dir), timeout=timeout)
 
 
 def init_project_root():
@@ -0,0 +1,245 @@
+"""
+Per-job LLM token, cost and time accounting with budgets.
+
+``usage_callback`` is attached to the shared LLM and reports every call to the
+``UsageTracker`` of the run it happens in (found through a context variable,
+so concurrent jobs and batch items are accounted separately). Calls are
+aggregated per graph node, per coder step and per job.
+
+A tracker can carry ``max_tokens`` and ``max_seconds`` budgets. Once one is
+used up, further LLM calls raise ``BudgetExceeded`` and the coder stops,
+keeping the files written so far and reporting the remaining steps as skipped.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# USD per million tokens; defaults are the Groq list prices of openai/gpt-oss-120b
+PRICE_INPUT_PER_MTOK = float(os.getenv("LLM_PRICE_INPUT_PER_MTOK", "0.15"))
+PRICE_CACHED_INPUT_PER_MTOK = float(os.getenv("LLM_PRICE_CACHED_INPUT_PER_MTOK", "0.075"))
+PRICE_OUTPUT_PER_MTOK = float(os.getenv("LLM_PRICE_OUTPUT_PER_MTOK", "0.75"))
+
+# Default per-job budgets; 0 means unlimited
+JOB_MAX_TOKENS = int(os.getenv("JOB_MAX_TOKENS", "0"))
+JOB_MAX_SECONDS = float(os.getenv("JOB_MAX_SECONDS", "0"))
+
+
+class BudgetExceeded(Exception):
+    """Raised when a job has used up its token or time budget"""
+
+
+@dataclass
+class TokenCounts:
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    llm_seconds: float = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost_usd(self) -> float:
+        uncached = self.prompt_tokens - self.cached_tokens
+        return (uncached * PRICE_INPUT_PER_MTOK + self.cached_tokens * PRICE_CACHED_INPUT_PER_MTOK
+                + self.completion_tokens * PRICE_OUTPUT_PER_MTOK) / 1_000_000
+
+    def add(self, prompt: int, completion: int, cached: int, seconds: float):
+        self.calls += 1
+        self.prompt_tokens += prompt
+        self.completion_tokens += completion
+        self.cached_tokens += cached
+        self.llm_seconds += seconds
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+            "total_tokens": self.total_tokens,
+            "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+            "cost_usd": round(self.cost_usd, 6),
+            "llm_seconds": round(self.llm_seconds, 3),
+        }
+
+
+class UsageTracker:
+    """Token usage and budgets of one job"""
+
+    def __init__(self, max_tokens: Optional[int] = None, max_seconds: Optional[float] = None):
+        self.max_tokens = JOB_MAX_TOKENS if max_tokens is None else max_tokens
+        self.max_seconds = JOB_MAX_SECONDS if max_seconds is None else max_seconds
+        self.started = time.monotonic()
+        self.totals = TokenCounts()
+        self.by_node: dict[str, TokenCounts] = {}
+        self.by_step: dict[str, TokenCounts] = {}
+        # Structured-output attempts rejected by validation, and the tokens they cost, per node
+        self.retries: dict[str, int] = {}
+        self.wasted_tokens: dict[str, int] = {}
+        self._pending: dict[UUID, tuple[str, Optional[str], float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def exceeded(self) -> Optional[str]:
+        """Describes the budget that is used up, or None"""
+        if self.max_tokens and self.totals.total_tokens >= self.max_tokens:
+            return f"token budget of {self.max_tokens} exhausted ({self.totals.total_tokens} used)"
+        if self.max_seconds and self.elapsed >= self.max_seconds:
+            return f"time budget of {self.max_seconds:g}s exhausted"
+        return None
+
+    def check(self):
+        reason = self.exceeded()
+        if reason:
+            raise BudgetExceeded(reason)
+
+    def start_call(self, run_id: UUID, node: str, step: Optional[str]):
+        with self._lock:
+            self._pending[run_id] = (node, step, time.monotonic())
+
+    def discard_call(self, run_id: UUID):
+        with self._lock:
+            self._pending.pop(run_id, None)
+
+    def record(self, run_id: UUID, prompt: int, completion: int, cached: int):
+        with self._lock:
+            node, step, started = self._pending.pop(run_id, ("unknown", None, time.monotonic()))
+            seconds = time.monotonic() - started
+            self.totals.add(prompt, completion, cached, seconds)
+            self.by_node.setdefault(node, TokenCounts()).add(prompt, completion, cached, seconds)
+            if step is not None:
+                self.by_step.setdefault(step, TokenCounts()).add(prompt, completion, cached, seconds)
+
+    def record_retry(self, node: str, prompt: int, completion: int, aborted: bool):
+        """Books a rejected attempt; aborted streams never report usage, so their estimate is added here"""
+        with self._lock:
+            self.retries[node] = self.retries.get(node, 0) + 1
+            self.wasted_tokens[node] = self.wasted_tokens.get(node, 0) + prompt + completion
+            if aborted:
+                self.totals.add(prompt, completion, 0, 0.0)
+                self.by_node.setdefault(node, TokenCounts()).add(prompt, completion, 0, 0.0)
+
+    def report(self) -> dict:
+        """JSON-safe totals, per-node and per-step breakdown"""
+        with self._lock:
+            return {
+                **self.totals.as_dict(),
+                "elapsed_seconds": round(self.elapsed, 3),
+                "max_tokens": self.max_tokens or None,
+                "max_seconds": self.max_seconds or None,
+                "budget_exceeded": self.exceeded(),
+                "by_node": {name: c.as_dict() for name, c in self.by_node.items()},
+                "by_step": {name: c.as_dict() for name, c in self.by_step.items()},
+                "retries": dict(self.retries),
+                "wasted_tokens": dict(self.wasted_tokens),
+            }
+
+    @contextmanager
+    def activate(self):
+        """Makes this the tracker of LLM calls made in the block (and threads copying its context)"""
+        # The time budget counts from here, not from when the job was queued
+        self.started = time.monotonic()
+        token = _tracker.set(self)
+        try:
+            yield self
+        finally:
+            _tracker.reset(token)
+
+
+_tracker: ContextVar[Optional[UsageTracker]] = ContextVar("usage_tracker", default=None)
+_step: ContextVar[Optional[str]] = ContextVar("usage_step", default=None)
+
+
+def current_tracker() -> Optional[UsageTracker]:
+    return _tracker.get()
+
+
+def budget_exceeded() -> Optional[str]:
+    """Reason the current job's budget is used up, or None (also without a tracker)"""
+    tracker = _tracker.get()
+    return tracker.exceeded() if tracker is not None else None
+
+
+@contextmanager
+def usage_step(label: str):
+    """Attributes LLM calls in the block to a step, e.g. one coder task"""
+    token = _step.set(label)
+    try:
+        yield
+    finally:
+        _step.reset(token)
+
+
+def _node_name(metadata: Optional[dict]) -> str:
+    metadata = metadata or {}
+    # Nested graphs (the coder's ReAct loop) report their own node; the namespace starts with ours
+    namespace = metadata.get("langgraph_checkpoint_ns") or ""
+    if namespace:
+        return namespace.split("|", 1)[0].split(":", 1)[0]
+    return metadata.get("langgraph_node") or "unknown"
+
+
+def _token_usage(response: LLMResult) -> tuple[int, int, int]:
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        details = usage.get("prompt_tokens_details") or {}
+        return (usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0,
+                details.get("cached_tokens") or 0)
+    prompt = completion = cached = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt += metadata.get("input_tokens", 0)
+            completion += metadata.get("output_tokens", 0)
+            cached += (metadata.get("input_token_details") or {}).get("cache_read", 0)
+    return prompt, completion, cached
+
+
+class UsageCallback(BaseCallbackHandler):
+    """Feeds every LLM call into the tracker of the current job and enforces its budget"""
+
+    # Let BudgetExceeded abort the call instead of being logged and ignored
+    raise_error = True
+
+    def _start(self, run_id: UUID, metadata: Optional[dict]):
+        tracker = _tracker.get()
+        if tracker is None:
+            return
+        tracker.check()
+        tracker.start_call(run_id, _node_name(metadata), _step.get())
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID,
+                            metadata: Optional[dict] = None, **kwargs: Any):
+        self._start(run_id, metadata)
+
+    def on_llm_start(self, serialized: dict, prompts: list, *, run_id: UUID,
+                     metadata: Optional[dict] = None, **kwargs: Any):
+        self._start(run_id, metadata)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        tracker = _tracker.get()
+        if tracker is not None:
+            tracker.record(run_id, *_token_usage(response))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        tracker = _tracker.get()
+        if tracker is not None:
+            tracker.discard_call(run_id)
+
+
+usage_callback = UsageCallback()
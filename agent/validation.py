@@ -0,0 +1,326 @@
+"""
+Post-generation validation of workspace files.
+
+Python, JSON and HTML files are checked with offline parsers in a bounded
+process pool. Python imports must name a workspace module, the standard library
+or a dependency declared in the workspace's requirements.txt/pyproject.toml; the
+server's own environment is never consulted. JavaScript files are syntax-checked
+with ``node --check`` through ``run_cmd`` when Node.js is installed. Results are
+cached by content hash, so files that did not change since the last validation
+are skipped.
+"""
+
+import ast
+import contextvars
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shlex
+import shutil
+import sys
+import threading
+import tomllib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Optional
+
+from agent.tools import get_project_root, run_cmd, safe_path_for_project
+
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Check results kept in memory, least recently used evicted first
+VALIDATION_CACHE_MAX_ENTRIES = int(os.getenv("VALIDATION_CACHE_MAX_ENTRIES", "5000"))
+CHECKER_VERSION = "2"
+# Distributions whose import name differs from the normalized distribution name
+IMPORT_NAMES = {
+    "beautifulsoup4": "bs4", "pillow": "PIL", "python_dotenv": "dotenv", "pyyaml": "yaml",
+    "scikit_learn": "sklearn", "opencv_python": "cv2", "pyjwt": "jwt", "python_jose": "jose",
+    "psycopg2_binary": "psycopg2", "python_multipart": "multipart", "pymupdf": "fitz",
+}
+
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+    "param", "source", "track", "wbr", "!doctype",
+}
+# Elements whose end tag may be omitted by the HTML spec
+OPTIONAL_END = {"p", "li", "dt", "dd", "option", "tr", "td", "th", "thead", "tbody", "tfoot", "colgroup"}
+
+
+@dataclass
+class FileCheck:
+    """Validation outcome for one file"""
+    path: str
+    checker: str
+    errors: list[str] = field(default_factory=list)
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+class _TagBalanceParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: list[tuple[str, int]] = []
+        self.errors: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_ELEMENTS:
+            self.stack.append((tag, self.getpos()[0]))
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                for open_tag, line in self.stack[i + 1:]:
+                    if open_tag not in OPTIONAL_END:
+                        self.errors.append(f"line {line}: <{open_tag}> is not closed before </{tag}>")
+                del self.stack[i:]
+                return
+        self.errors.append(f"line {self.getpos()[0]}: unexpected closing tag </{tag}>")
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+def _requirement_name(spec: str) -> Optional[str]:
+    match = re.match(r"\s*([A-Za-z0-9][A-Za-z0-9._-]*)", spec)
+    return match.group(1) if match else None
+
+
+def declared_dependencies(root: Path) -> Optional[list[str]]:
+    """
+    Import names of the dependencies a workspace declares, or None if it has neither
+    requirements.txt nor pyproject.toml.
+    """
+    names = set()
+    found = False
+    requirements = root / "requirements.txt"
+    if requirements.is_file():
+        found = True
+        for line in requirements.read_text(encoding="utf-8", errors="replace").splitlines():
+            line = line.split("#", 1)[0].strip()
+            if line and not line.startswith("-"):
+                names.add(_requirement_name(line))
+    pyproject = root / "pyproject.toml"
+    if pyproject.is_file():
+        found = True
+        try:
+            data = tomllib.loads(pyproject.read_text(encoding="utf-8", errors="replace"))
+        except tomllib.TOMLDecodeError:
+            data = {}
+        project = data.get("project", {})
+        specs = list(project.get("dependencies", []))
+        for extra in project.get("optional-dependencies", {}).values():
+            specs += extra
+        names.update(_requirement_name(spec) for spec in specs if isinstance(spec, str))
+        names.update(data.get("tool", {}).get("poetry", {}).get("dependencies", {}))
+    if not found:
+        return None
+    normalized = {_normalize(name) for name in names if name}
+    return sorted(normalized | {_normalize(IMPORT_NAMES[n]) for n in normalized if n in IMPORT_NAMES})
+
+
+def check_python(content: str, local_modules: list[str], dependencies: Optional[list[str]] = None) -> list[str]:
+    """
+    Checks Python syntax and absolute imports. Imports must resolve to a workspace module,
+    the standard library or, when the project declares its dependencies, one of those.
+    """
+    try:
+        tree = ast.parse(content)
+    except SyntaxError as e:
+        return [f"line {e.lineno}: SyntaxError: {e.msg}"]
+    if dependencies is None:
+        # Without a manifest there is nothing to check third-party imports against
+        return []
+
+    declared = set(dependencies)
+    errors = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [(alias.name, node.lineno) for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names = [(node.module, node.lineno)]
+        else:
+            continue
+        for name, lineno in names:
+            top = name.split(".")[0]
+            if top in local_modules or top in sys.stdlib_module_names or _normalize(top) in declared:
+                continue
+            errors.append(f"line {lineno}: ImportError: No module named '{top}' in the project "
+                          f"and it is not listed in requirements.txt or pyproject.toml")
+    return errors
+
+
+def check_json(content: str) -> list[str]:
+    try:
+        json.loads(content)
+    except json.JSONDecodeError as e:
+        return [f"line {e.lineno}: {e.msg}"]
+    return []
+
+
+def check_html(content: str) -> list[str]:
+    parser = _TagBalanceParser()
+    parser.feed(content)
+    parser.close()
+    errors = parser.errors
+    for tag, line in parser.stack:
+        if tag not in OPTIONAL_END and tag not in ("html", "body", "head"):
+            errors.append(f"line {line}: <{tag}> is never closed")
+    return errors
+
+
+def run_check(checker: str, content: str, context: dict) -> list[str]:
+    """Process-pool entry point dispatching to the checker for a file type"""
+    if checker == "python":
+        return check_python(content, context["local_modules"], context["dependencies"])
+    if checker == "json":
+        return check_json(content)
+    if checker == "html":
+        return check_html(content)
+    raise ValueError(f"Unknown checker: {checker}")
+
+
+def check_javascript(rel_path: str) -> list[str]:
+    """Syntax-checks a JavaScript file with node --check"""
+    code, _, stderr = run_cmd.invoke({"cmd": f"node --check {shlex.quote(rel_path)}", "timeout": 30})
+    if code == 0:
+        return []
+    lines = [line for line in stderr.splitlines() if line.strip()]
+    # node prints "file:line", the offending source, a caret and then the error itself
+    return ["\n".join(lines[:5])] if lines else [f"node --check exited with {code}"]
+
+
+def missing_assets(rel_path: str, content: str) -> list[str]:
+    """Reports local src/href references of an HTML file that do not exist in the workspace"""
+    base = Path(rel_path).parent
+    errors = []
+    for ref in re.findall(r'(?:src|href)=["\']([^"\'#?]+)', content):
+        if re.match(r"^(?:[a-z]+:|//|/|#)", ref, re.I):
+            continue
+        try:
+            if not safe_path_for_project(str(base / ref)).exists():
+                errors.append(f"references missing file '{ref}'")
+        except ValueError:
+            errors.append(f"references '{ref}' outside the project")
+    return errors
+
+
+CHECKERS = {".py": "python", ".json": "json", ".html": "html", ".htm": "html", ".js": "javascript", ".mjs": "javascript"}
+
+
+class Validator:
+    """Runs per-file checks in parallel and caches results by content hash"""
+
+    def __init__(self, max_workers: int = VALIDATION_WORKERS, max_entries: int = VALIDATION_CACHE_MAX_ENTRIES):
+        self.max_workers = max(1, max_workers)
+        self.max_entries = max(1, max_entries)
+        self._cache: OrderedDict[str, list[str]] = OrderedDict()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _cached(self, key: str) -> Optional[list[str]]:
+        with self._lock:
+            errors = self._cache.get(key)
+            if errors is not None:
+                self._cache.move_to_end(key)
+            return errors
+
+    def _remember(self, key: str, errors: list[str]):
+        with self._lock:
+            self._cache[key] = errors
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def validate(self, paths: list[str]) -> list[FileCheck]:
+        """Validates the given workspace-relative paths; unknown file types are ignored"""
+        root = get_project_root()
+        local_modules = sorted(
+            p.stem if p.is_file() else p.name
+            for p in root.glob("*") if p.suffix == ".py" or (p.is_dir() and (p / "__init__.py").exists())
+        )
+        python_context = {"local_modules": local_modules, "dependencies": declared_dependencies(root)}
+
+        results: list[FileCheck] = []
+        pending = []
+        for rel in sorted(set(paths)):
+            checker = CHECKERS.get(Path(rel).suffix.lower())
+            p = safe_path_for_project(rel)
+            if checker is None or not p.is_file():
+                continue
+            content = p.read_text(encoding="utf-8", errors="replace")
+            context = python_context if checker == "python" else {}
+            key = hashlib.sha256(
+                "\0".join([CHECKER_VERSION, checker, content, json.dumps(context, sort_keys=True)]).encode("utf-8")
+            ).hexdigest()
+            check = FileCheck(path=rel, checker=checker)
+            if checker == "html":
+                check.errors += missing_assets(rel, content)
+            results.append(check)
+            cached = self._cached(key)
+            if cached is not None:
+                check.errors += cached
+                check.cached = True
+            else:
+                pending.append((check, key, content, context))
+
+        in_process = [item for item in pending if item[0].checker != "javascript"]
+        javascript = [item for item in pending if item[0].checker == "javascript"]
+        if javascript and shutil.which("node") is None:
+            javascript = []
+
+        def finish(item, errors):
+            check, key, _, _ = item
+            self._remember(key, errors)
+            check.errors += errors
+
+        if len(in_process) > 1:
+            pool = self._get_pool()
+            futures = [(item, pool.submit(run_check, item[0].checker, item[2], item[3])) for item in in_process]
+            for item, future in futures:
+                finish(item, future.result())
+        else:
+            for item in in_process:
+                finish(item, run_check(item[0].checker, item[2], item[3]))
+
+        if javascript:
+            # Each thread gets its own context copy so the job's sandbox CPU budget applies
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [
+                    (item, executor.submit(contextvars.copy_context().run, check_javascript, item[0].path))
+                    for item in javascript
+                ]
+                for item, future in futures:
+                    finish(item, future.result())
+
+        return results
+
+
+validator = Validator()
@@ -3,22 +3,47 @@ FastAPI server for DevOrchestrator with WebSocket support for real-time updates.
 Provides REST API and Web UI for the multi-agent SDLC engine.
 """
 
+import hmac
 import json
 import logging
 import os
+import sys
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 import asyncio
 
+try:
+    import orjson  # noqa: F401 (ORJSONResponse needs it)
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:
+    DefaultJSONResponse = JSONResponse
+
+from server.admission import (
+    AdmissionController, AdmissionRejected, BodySizeLimitMiddleware, batch_admitter, client_address,
+)
+from server.compression import CompressionMiddleware, StaticAssets
+from server.jobs import JobManager
+from server.metrics import metrics
+from server.retention import RETENTION_ENABLED, RetentionManager
+from server.profiling import PROFILE_MAX_SECONDS, job_threads, load_profile, memory_tracker, profile_window
+from server.state import create_backend, tail_events
+from server.supervisor import worker_monitor
+
 # Lazy load agent to avoid import errors in serverless environments
 agent = None
+settings = None
+admission = None
+jobs = None
+retention = None
+# Single generations all write to the preview workspace, so admission runs them one at a time
+PREVIEW_WORKSPACE = "generated_project"
 
 def get_agent():
     """Lazy load the agent graph"""
@@ -28,6 +53,132 @@ def get_agent():
         agent = _agent
     return agent
 
+def get_settings():
+    """Lazy load application settings (requires GROQ_API_KEY)"""
+    global settings
+    if settings is None:
+        from config import settings as _settings
+        settings = _settings
+    return settings
+
+def get_admission() -> AdmissionController:
+    """Lazy create the admission controller from settings"""
+    global admission
+    if admission is None:
+        s = get_settings()
+        admission = AdmissionController(
+            rate_limit_requests=s.rate_limit_requests,
+            rate_limit_period=s.rate_limit_period,
+            max_concurrent=s.max_concurrent_generations,
+            max_queued=s.max_queued_generations,
+            max_queue_wait=s.max_queue_wait,
+        )
+    return admission
+
+def get_jobs() -> JobManager:
+    """Lazy create the job manager on the shared state backend"""
+    global jobs
+    if jobs is None:
+        jobs = JobManager(create_backend(get_settings().state_backend_url))
+    return jobs
+
+def get_retention() -> RetentionManager:
+    """Lazy create the workspace retention manager"""
+    global retention
+    if retention is None:
+        retention = RetentionManager(get_jobs().backend, get_settings().generated_projects_path,
+                                     generated_project_dir)
+    return retention
+
+def touch_workspace(name: str):
+    """Mark a workspace as recently viewed for the retention LRU"""
+    if retention is not None:
+        retention.touch(name)
+
+def retention_samples():
+    """Workspace disk usage as of the last retention sweep"""
+    return retention.metric_samples() if retention is not None else []
+
+metrics.add_collector(retention_samples)
+
+def admission_samples():
+    """Current admission gauges for /metrics"""
+    if admission is None:
+        return []
+    status = admission.status()
+    return [
+        ("devorch_generations_active", {}, status["active"]),
+        ("devorch_generations_queued", {}, status["queued"]),
+    ]
+
+metrics.describe("devorch_generations_active", "gauge", "Generations currently running on this worker")
+metrics.describe("devorch_generations_queued", "gauge", "Generations waiting for a slot on this worker")
+metrics.add_collector(admission_samples)
+
+def blob_store_samples():
+    """Blob store size and this worker's write counters, once the store is in use"""
+    if "agent.blobstore" not in sys.modules:
+        return []
+    stats = sys.modules["agent.blobstore"].blob_store.stats()
+    samples = [(f"devorch_blob_store_{key}", {}, stats[key])
+               for key in ("blobs", "references", "unique_bytes", "stored_bytes", "logical_bytes")]
+    samples += [("devorch_blob_store_writes_total", {"result": result}, stats[result])
+                for result in ("deduplicated", "unchanged", "direct")]
+    samples.append(("devorch_blob_store_writes_total", {"result": "all"}, stats["writes"]))
+    samples.append(("devorch_blob_store_bytes_written_total", {}, stats["bytes_written"]))
+    return samples
+
+metrics.describe("devorch_blob_store_blobs", "gauge", "Unique file contents in the blob store")
+metrics.describe("devorch_blob_store_references", "gauge", "Workspace files backed by the blob store")
+metrics.describe("devorch_blob_store_unique_bytes", "gauge", "Uncompressed size of all unique blobs")
+metrics.describe("devorch_blob_store_stored_bytes", "gauge", "Compressed size of all blobs on disk")
+metrics.describe("devorch_blob_store_logical_bytes", "gauge", "Total size of all workspace files backed by blobs")
+metrics.describe("devorch_blob_store_writes_total", "counter", "write_file calls by outcome")
+metrics.describe("devorch_blob_store_bytes_written_total", "counter", "Bytes the blob store wrote to disk")
+metrics.add_collector(blob_store_samples)
+
+def preload():
+    """Import the settings and agent graph up front (supervisor mode shares them with forked workers)"""
+    get_settings()
+    get_agent()
+    import agent.sandbox  # noqa: F401
+
+def reindex_preview_project():
+    from agent.search import SEARCH_INDEX_ENABLED, search_index
+    if not SEARCH_INDEX_ENABLED:
+        return
+    try:
+        search_index.reindex(generated_project_dir)
+    except Exception as e:
+        logger.warning(f"Could not index {generated_project_dir} for search: {e}")
+
+async def drain_generations(timeout: float):
+    """Wait for this worker's running and queued generations to finish, up to timeout seconds"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while admission is not None and asyncio.get_running_loop().time() < deadline:
+        status = admission.status()
+        if not status["active"] and not status["queued"]:
+            return
+        logger.info(f"Draining: waiting for {status['active']} running and {status['queued']} queued generations")
+        await asyncio.sleep(1)
+
+def require_admin(connection):
+    """Reject the request unless it carries the admin token (admin endpoints are off without one)"""
+    token = get_settings().admin_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    given = connection.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def get_client_id(connection) -> str:
+    """Identify the client of a request or WebSocket (X-Forwarded-For only from TRUSTED_PROXIES)"""
+    return client_address(
+        connection.client.host if connection.client else None,
+        connection.headers.get("x-forwarded-for"),
+        get_settings().trusted_proxy_networks,
+    )
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -40,12 +191,112 @@ class ProjectRequest(BaseModel):
     """Request model for project generation"""
     prompt: str
     recursion_limit: int = 100
+    mode: Literal["auto", "fast", "full"] = "auto"
+    reuse_plans: bool = True
+    use_templates: bool = True
+    max_tokens: Optional[int] = None
+    max_seconds: Optional[float] = None
+    # Sample the job's thread for the whole run (admin only); see /api/admin/jobs/{job_id}/profile
+    profile: bool = False
+
+    def graph_input(self) -> dict:
+        """Initial LangGraph state for this request"""
+        return {
+            "user_prompt": self.prompt,
+            "mode": self.mode,
+            "reuse_plans": self.reuse_plans,
+            "use_templates": self.use_templates,
+        }
+
+def stream_generation(request: ProjectRequest, usage, job_id: str):
+    """Stream the agent graph for one request as (mode, chunk) pairs (blocking)"""
+    from agent.sandbox import job_cpu_budget
+    from agent.tools import get_project_root
+    with job_cpu_budget(), usage.activate(), get_jobs().forward_file_changes(job_id, get_project_root()):
+        yield from get_agent().stream(
+            request.graph_input(),
+            {"recursion_limit": request.recursion_limit},
+            stream_mode=["updates", "values"]
+        )
+
+async def start_generation(request: ProjectRequest, release) -> tuple[str, asyncio.Future]:
+    """Create a job and run it in a worker thread, releasing its admission slot when it finishes"""
+    from agent.usage import UsageTracker
+    job_manager = get_jobs()
+    usage = UsageTracker(request.max_tokens, request.max_seconds)
+    try:
+        job_id = await asyncio.to_thread(job_manager.create, request.prompt, mode=request.mode,
+                                         max_tokens=usage.max_tokens or None,
+                                         max_seconds=usage.max_seconds or None)
+    except BaseException:
+        release()
+        raise
+    future = asyncio.ensure_future(asyncio.to_thread(
+        job_manager.run, job_id, PREVIEW_WORKSPACE, stream_generation(request, usage, job_id), usage, request.profile
+    ))
+
+    def finished(f: asyncio.Future):
+        release()
+        if not f.cancelled() and f.exception() is not None:
+            logger.error(f"Job {job_id} failed: {f.exception()}")
+
+    future.add_done_callback(finished)
+    return job_id, future
+
+class BatchRequest(BaseModel):
+    """Request model for batch generation"""
+    prompts: list[ProjectRequest]
+    parallelism: int = 2
+
+class BatchResponse(BaseModel):
+    """Response model for an accepted batch"""
+    status: str
+    job_id: str
+    count: int
+    parallelism: int
+    output: str
+
+async def start_batch(request: BatchRequest, release) -> tuple[str, int, Path, asyncio.Future]:
+    """
+    Create a batch job and run it in a worker thread. Its first item runs on the batch's
+    admission slot and every item running beside it takes a slot of its own.
+    """
+    from agent.batch import make_item
+    s = get_settings()
+    job_manager = get_jobs()
+    parallelism = max(1, min(request.parallelism, s.max_concurrent_generations))
+    try:
+        job_id = await asyncio.to_thread(job_manager.create, f"batch of {len(request.prompts)} prompts",
+                                         kind="batch", count=len(request.prompts), parallelism=parallelism)
+        batch_root = s.generated_projects_path / "batches"
+        batch_root.mkdir(parents=True, exist_ok=True)
+        output = batch_root / f"{job_id}.jsonl"
+        items = [make_item(p.model_dump(exclude={"profile"}), default_id=f"{i + 1:04d}")
+                 for i, p in enumerate(request.prompts)]
+    except BaseException:
+        release()
+        raise
+    admit = batch_admitter(get_admission(), release, asyncio.get_running_loop())
+    future = asyncio.ensure_future(asyncio.to_thread(
+        job_manager.run_batch, job_id, items, s.generated_projects_path / job_id, parallelism, output, admit
+    ))
+
+    def finished(f: asyncio.Future):
+        release()
+        if not f.cancelled() and f.exception() is not None:
+            logger.error(f"Batch {job_id} failed: {f.exception()}")
+
+    future.add_done_callback(finished)
+    return job_id, parallelism, output, future
 
 class ProjectResponse(BaseModel):
     """Response model for project generation"""
     status: str
+    job_id: Optional[str] = None
     project_name: Optional[str] = None
     files_generated: int = 0
+    skipped_steps: list[str] = []
+    usage: Optional[dict] = None
     message: str
 
 class HealthResponse(BaseModel):
@@ -58,16 +309,51 @@ class HealthResponse(BaseModel):
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     logger.info("Starting DevOrchestrator API Server")
+    from agent.sandbox import sandbox_pool
+    try:
+        await asyncio.to_thread(sandbox_pool.warm)
+    except Exception as e:
+        logger.warning(f"Could not warm command sandbox pool: {e}")
+    worker_monitor.start()
+    # Pick up preview files written before the search index existed (or by hand), off the startup path
+    reindex = asyncio.create_task(asyncio.to_thread(reindex_preview_project))
+    if RETENTION_ENABLED:
+        try:
+            get_retention().start()
+        except Exception as e:
+            logger.warning(f"Could not start workspace retention: {e}")
     yield
+    await reindex
     logger.info("Shutting down DevOrchestrator API Server")
+    # Jobs run detached from their requests; let them finish before the worker goes away
+    if admission is not None:
+        await drain_generations(get_settings().worker_drain_timeout)
+    worker_monitor.stop()
+    if retention is not None:
+        retention.stop()
+    sandbox_pool.shutdown()
+    if "agent.search" in sys.modules:
+        sys.modules["agent.search"].regex_runner.shutdown()
+    if "agent.validation" in sys.modules:
+        sys.modules["agent.validation"].validator.shutdown()
 
 app = FastAPI(
     title="DevOrchestrator API",
     description="Multi-agent autonomous SDLC engine",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=DefaultJSONResponse,
 )
 
+# Reject oversized request bodies before they reach any handler
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=lambda: get_settings().max_upload_size_mb * 1024 * 1024,
+)
+
+# gzip/brotli for JSON, HTML and streamed events; precompressed assets pass through
+app.add_middleware(CompressionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -81,6 +367,8 @@ app.add_middleware(
 frontend_path = Path(__file__).parent / "frontend"
 if frontend_path.exists():
     app.mount("/static", StaticFiles(directory=str(frontend_path / "static")), name="static")
+# Content-hashed, precompressed copies of frontend/static for pages to link to
+static_assets = StaticAssets(frontend_path / "static")
 
 # ==================== Routes ====================
 
@@ -89,16 +377,34 @@ async def serve_frontend():
     """Serve the main frontend"""
     frontend_file = frontend_path / "index.html"
     if frontend_file.exists():
-        return frontend_file.read_text()
+        # Asset URLs change with their content, so only the page itself needs revalidating
+        return HTMLResponse(static_assets.rewrite_html(frontend_file.read_text()),
+                            headers={"Cache-Control": "no-cache"})
     return "<h1>Welcome to DevOrchestrator API</h1>"
 
+@app.get("/assets/{path:path}")
+async def serve_asset(path: str, request: Request):
+    """A hashed frontend asset, precompressed, cacheable forever"""
+    return static_assets.response(path, request.headers.get("accept-encoding", ""),
+                                  request.headers.get("if-none-match", ""))
+
 @app.get("/api/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
     return HealthResponse(status="healthy")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Job, token and cost counters of this worker in Prometheus text format"""
+    return metrics.render()
+
+@app.get("/api/queue")
+async def queue_status():
+    """Current generation concurrency, queue length and estimated wait"""
+    return get_admission().status()
+
 @app.post("/api/generate", response_model=ProjectResponse)
-async def generate_project(request: ProjectRequest):
+async def generate_project(request: ProjectRequest, http_request: Request):
     """
     Generate a new project based on the user prompt.
     
@@ -108,24 +414,49 @@ async def generate_project(request: ProjectRequest):
     Returns:
         ProjectResponse with generation status and details
     """
+    if request.profile:
+        require_admin(http_request)
+    try:
+        release = await get_admission().acquire(get_client_id(http_request), exclusive=PREVIEW_WORKSPACE)
+    except AdmissionRejected as e:
+        logger.warning(f"Generation request rejected ({e.status_code}): {e.detail}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
     try:
         logger.info(f"Received project generation request: {request.prompt}")
         
-        # Invoke the agent with the user prompt
-        _agent = get_agent()
-        result = _agent.invoke(
-            {"user_prompt": request.prompt},
-            {"recursion_limit": request.recursion_limit}
+        # Invoke the agent with the user prompt; the slot is held until the thread finishes
+        job_id, generation = await start_generation(request, release)
+        result = await asyncio.wait_for(
+            asyncio.shield(generation),
+            timeout=get_settings().request_timeout
         )
         
         logger.info("Project generation completed successfully")
         
+        message = "Project generated successfully"
+        if result.get("budget_exceeded"):
+            message = f"Stopped early: {result['budget_exceeded']}"
         return ProjectResponse(
             status="success",
-            message="Project generated successfully",
-            files_generated=0  # You can count generated files here
+            job_id=job_id,
+            project_name=result.get("project_name"),
+            message=message,
+            files_generated=len(result.get("files", [])),
+            skipped_steps=result.get("skipped_steps", []),
+            usage=result.get("usage")
         )
         
+    except asyncio.TimeoutError:
+        logger.error("Project generation exceeded the request timeout")
+        raise HTTPException(
+            status_code=504,
+            detail=f"Project generation did not finish within {get_settings().request_timeout} seconds"
+        )
     except Exception as e:
         logger.error(f"Error generating project: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -133,47 +464,175 @@ async def generate_project(request: ProjectRequest):
             detail=f"Error generating project: {str(e)}"
         )
 
+@app.post("/api/batch", response_model=BatchResponse, status_code=202)
+async def generate_batch(request: BatchRequest, http_request: Request):
+    """
+    Generate one project per prompt in the background.
+
+    The batch is admitted like a single generation and runs up to ``parallelism``
+    prompts at a time (capped at MAX_CONCURRENT_GENERATIONS); every prompt running
+    takes an admission slot, so batches share the global concurrency limit. Follow it with
+    GET /api/jobs/{job_id} or {"job_id": ...} on /ws/generate; every finished
+    prompt produces a "result" event and a line in the batch's JSONL output.
+    """
+    if not request.prompts:
+        raise HTTPException(status_code=400, detail="No prompts given")
+    try:
+        release = await get_admission().acquire(get_client_id(http_request))
+    except AdmissionRejected as e:
+        logger.warning(f"Batch request rejected ({e.status_code}): {e.detail}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    job_id, parallelism, output, _ = await start_batch(request, release)
+    logger.info(f"Started batch {job_id} with {len(request.prompts)} prompts")
+    return BatchResponse(status="accepted", job_id=job_id, count=len(request.prompts),
+                         parallelism=parallelism, output=str(output))
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and result of a generation job, served by any worker"""
+    job = await asyncio.to_thread(get_jobs().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # A batch job's workspace is named after the job
+    touch_workspace(job_id)
+    return job
+
+@app.get("/api/jobs/{job_id}/events")
+async def get_job_events(job_id: str, offset: int = 0):
+    """Replay a job's events from offset (a compacted log starts with a snapshot event)"""
+    job_manager = get_jobs()
+    if await asyncio.to_thread(job_manager.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    events = await asyncio.to_thread(job_manager.backend.read_events, job_id, offset)
+    return {"job_id": job_id, "events": [{**event, "offset": event_offset} for event_offset, event in events]}
+
+async def forward_job_events(send, job_id: str, offset: int = 0):
+    """Forward a job's events from the shared backend to a WebSocket until it finishes"""
+    job_manager = get_jobs()
+    if await asyncio.to_thread(job_manager.get, job_id) is None:
+        await send({"type": "error", "job_id": job_id, "message": "Error: Job not found"})
+        return
+    async for event_offset, event in tail_events(job_manager.backend, job_id, offset):
+        await send({**event, "job_id": job_id, "offset": event_offset})
+
+def parse_offset(value) -> int:
+    """A client-supplied event offset; raises ValueError if it is not an integer"""
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid offset: {value!r}") from None
+
+def parse_subscriptions(value) -> list[tuple[str, int]]:
+    """Accepts ["id", ...] or [{"job_id": "id", "offset": 3}, ...] (or a single entry)"""
+    entries = value if isinstance(value, list) else [value]
+    subscriptions = []
+    for entry in entries:
+        if isinstance(entry, str):
+            subscriptions.append((entry, 0))
+        elif isinstance(entry, dict) and entry.get("job_id"):
+            subscriptions.append((str(entry["job_id"]), parse_offset(entry.get("offset"))))
+    return subscriptions
+
 @app.websocket("/ws/generate")
 async def websocket_generate(websocket: WebSocket):
     """
     WebSocket endpoint for real-time project generation updates.
     Streams generation progress to the client.
+
+    Messages from the client:
+      {"prompt": ...}                      start a job and follow it
+      {"job_id": ..., "offset": n}         follow a job, replaying its events from offset n
+      {"subscribe": [{"job_id": ..., "offset": n}, ...]}   follow several jobs at once
+      {"unsubscribe": [job_id, ...]}       stop following jobs
+
+    Every event carries its job_id and offset; resuming from the last offset
+    seen plus one replays exactly the missed events.
     """
     await websocket.accept()
+    client_id = get_client_id(websocket)
+    send_lock = asyncio.Lock()
+    subscriptions: dict[str, asyncio.Task] = {}
+
+    async def send(message: dict):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    def subscribe(job_id: str, offset: int = 0):
+        previous = subscriptions.pop(job_id, None)
+        if previous is not None:
+            previous.cancel()
+        task = asyncio.create_task(forward_job_events(send, job_id, offset))
+        task.add_done_callback(lambda t: subscriptions.pop(job_id, None) if subscriptions.get(job_id) is t else None)
+        subscriptions[job_id] = task
+
     try:
         while True:
-            # Receive project prompt from client
+            # Receive project prompt or subscription changes from client
             data = await websocket.receive_text()
-            request_data = json.loads(data)
-            prompt = request_data.get("prompt", "")
-            recursion_limit = request_data.get("recursion_limit", 100)
+            # Malformed messages are reported; the connection and its subscriptions stay open
+            request, added, removed = None, [], []
+            try:
+                request_data = json.loads(data)
+                if not isinstance(request_data, dict):
+                    raise ValueError("Expected a JSON object")
+                if "subscribe" in request_data or "unsubscribe" in request_data:
+                    added = parse_subscriptions(request_data.get("subscribe") or [])
+                    removed = parse_subscriptions(request_data.get("unsubscribe") or [])
+                elif request_data.get("job_id") and not request_data.get("prompt"):
+                    added = [(str(request_data["job_id"]), parse_offset(request_data.get("offset")))]
+                else:
+                    request = ProjectRequest(**{"prompt": "", **request_data})
+            except ValueError as e:  # includes JSON decode and pydantic validation errors
+                await send({"type": "error", "message": f"Error: Invalid message: {e}"})
+                continue
+            if request is None:
+                for job_id, offset in added:
+                    subscribe(job_id, offset)
+                for job_id, _ in removed:
+                    task = subscriptions.pop(job_id, None)
+                    if task is not None:
+                        task.cancel()
+                continue
+            if request.profile:
+                try:
+                    require_admin(websocket)
+                except HTTPException as e:
+                    await send({"type": "error", "message": f"Error: {e.detail}"})
+                    continue
             
-            logger.info(f"WebSocket project generation: {prompt}")
+            logger.info(f"WebSocket project generation: {request.prompt}")
             
-            try:
-                # Send progress update
-                await websocket.send_json({
+            async def notify_queued(position: int, eta: float):
+                await send({
                     "type": "progress",
-                    "message": "Starting project generation...",
-                    "step": "initialization"
+                    "message": f"Waiting for a free slot and workspace (position {position}, about {eta:.0f}s)...",
+                    "step": "queued"
                 })
-                
-                # Invoke the agent
-                _agent = get_agent()
-                result = _agent.invoke(
-                    {"user_prompt": prompt},
-                    {"recursion_limit": recursion_limit}
-                )
-                
-                # Send completion message
-                await websocket.send_json({
-                    "type": "complete",
-                    "status": "success",
-                    "message": "Project generated successfully"
+
+            try:
+                release = await get_admission().acquire(client_id, on_queued=notify_queued,
+                                                        exclusive=PREVIEW_WORKSPACE)
+            except AdmissionRejected as e:
+                await send({
+                    "type": "error",
+                    "message": f"Error: {e.detail}",
+                    "retry_after": e.retry_after
                 })
+                continue
+
+            try:
+                # Start the job, tell the client its id (for resuming) and relay its events
+                job_id, generation = await start_generation(request, release)
+                await send({"type": "job", "job_id": job_id, "message": "Job started"})
+                subscribe(job_id, 0)
                 
             except Exception as e:
-                await websocket.send_json({
+                await send({
                     "type": "error",
                     "message": f"Error: {str(e)}"
                 })
@@ -182,6 +641,160 @@ async def websocket_generate(websocket: WebSocket):
         logger.info("WebSocket client disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}", exc_info=True)
+    finally:
+        # Jobs keep running; only this connection's forwarding stops
+        for task in list(subscriptions.values()):
+            task.cancel()
+
+# ==================== Admin: profiling ====================
+
+profile_lock = asyncio.Lock()
+
+@app.get("/api/admin/profile")
+async def admin_profile(http_request: Request, seconds: float = 10, interval: float = 0.005,
+                        job_id: Optional[str] = None, format: Literal["collapsed", "json"] = "collapsed"):
+    """
+    Sample this worker's thread stacks for a time window and return collapsed
+    stacks (flamegraph.pl / speedscope input). With job_id only that job's
+    thread is sampled, until the window ends or the job finishes.
+    """
+    require_admin(http_request)
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {PROFILE_MAX_SECONDS:g}]")
+    if job_id and not job_threads(job_id):
+        raise HTTPException(status_code=409, detail="Job is not running on this worker")
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already being taken")
+    async with profile_lock:
+        sampler = await profile_window(seconds, interval, job_id)
+    if format == "json":
+        return {**sampler.summary(), "collapsed": sampler.collapsed()}
+    return PlainTextResponse(sampler.collapsed(), headers={"X-Profile-Samples": str(sampler.samples)})
+
+@app.get("/api/admin/memory")
+async def admin_memory(http_request: Request):
+    """This worker's RSS history, jobs handled and recycling limits"""
+    require_admin(http_request)
+    return worker_monitor.report()
+
+@app.get("/api/admin/blobs")
+async def admin_blob_stats(http_request: Request):
+    """Blob store size, deduplication ratio and write counters"""
+    require_admin(http_request)
+    from agent.blobstore import blob_store
+    return await asyncio.to_thread(blob_store.stats)
+
+@app.post("/api/admin/blobs/gc")
+async def admin_blob_gc(http_request: Request, grace_seconds: Optional[float] = None):
+    """Drop references to deleted or modified files and delete unreferenced blobs"""
+    require_admin(http_request)
+    from agent.blobstore import BLOB_GC_GRACE_SECONDS, blob_store
+    grace = BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    return await asyncio.to_thread(blob_store.gc, grace)
+
+@app.get("/api/admin/retention")
+async def admin_retention(http_request: Request):
+    """Retention policies and the report of this worker's last sweep"""
+    require_admin(http_request)
+    manager = get_retention()
+    return {
+        "enabled": RETENTION_ENABLED,
+        "interval_seconds": manager.interval,
+        "max_age_seconds": manager.max_age or None,
+        "max_project_bytes": manager.max_project_bytes or None,
+        "quota_bytes": manager.quota_bytes or None,
+        "last_sweep": manager.last_report,
+    }
+
+@app.post("/api/admin/retention/sweep")
+async def admin_retention_sweep(http_request: Request, dry_run: bool = True):
+    """Apply the retention policies now; by default only reports what would be removed"""
+    require_admin(http_request)
+    return await asyncio.to_thread(get_retention().sweep, dry_run, True)
+
+@app.get("/api/admin/jobs/{job_id}/profile", response_class=PlainTextResponse)
+async def admin_job_profile(job_id: str, http_request: Request):
+    """Collapsed stacks recorded for a job started with "profile": true"""
+    require_admin(http_request)
+    collapsed = await asyncio.to_thread(load_profile, job_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="No profile recorded for this job")
+    return collapsed
+
+@app.get("/api/admin/tracemalloc")
+async def admin_tracemalloc_status(http_request: Request):
+    """Whether tracemalloc runs, traced/peak bytes and the snapshots kept"""
+    require_admin(http_request)
+    return memory_tracker.status()
+
+@app.post("/api/admin/tracemalloc/start")
+async def admin_tracemalloc_start(http_request: Request, frames: int = 25):
+    """Start tracing allocations (slows the worker down while it runs)"""
+    require_admin(http_request)
+    memory_tracker.start(max(1, frames))
+    return memory_tracker.status()
+
+@app.post("/api/admin/tracemalloc/stop")
+async def admin_tracemalloc_stop(http_request: Request):
+    """Stop tracing and drop all snapshots"""
+    require_admin(http_request)
+    memory_tracker.stop()
+    return memory_tracker.status()
+
+@app.post("/api/admin/tracemalloc/snapshot")
+async def admin_tracemalloc_snapshot(http_request: Request, limit: int = 25,
+                                     key: Literal["lineno", "filename", "traceback"] = "lineno"):
+    """Take a snapshot and return its id and largest allocation sites"""
+    require_admin(http_request)
+    try:
+        snapshot_id = await asyncio.to_thread(memory_tracker.snapshot)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    top = await asyncio.to_thread(memory_tracker.top, snapshot_id, key, limit)
+    return {"snapshot_id": snapshot_id, "top": top, **memory_tracker.status()}
+
+@app.get("/api/admin/tracemalloc/diff")
+async def admin_tracemalloc_diff(http_request: Request, base: str, target: Optional[str] = None, limit: int = 25,
+                                 key: Literal["lineno", "filename", "traceback"] = "lineno"):
+    """Allocation growth from snapshot base to target (a new snapshot when target is omitted)"""
+    require_admin(http_request)
+    try:
+        if target is None:
+            target = await asyncio.to_thread(memory_tracker.snapshot)
+        diff = await asyncio.to_thread(memory_tracker.diff, base, target, key, limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot {e}")
+    return {"base": base, "target": target, "diff": diff}
+
+@app.websocket("/ws/preview")
+async def websocket_preview(websocket: WebSocket):
+    """
+    Push notifications for the previewed project: {"type": "changed", "path", "kind", "version"}
+    for every file the agents write, after an initial {"type": "hello", "version"}.
+    Changes are read from the jobs' "file" events in the state backend, so they arrive
+    whichever worker runs the generation.
+    """
+    from server.jobs import tail_file_changes, workspace_record
+    await websocket.accept()
+    backend = get_jobs().backend
+    record = await asyncio.to_thread(backend.get_job, workspace_record(PREVIEW_WORKSPACE))
+    version = (record or {}).get("version")
+
+    async def push():
+        async for change in tail_file_changes(backend, PREVIEW_WORKSPACE, version):
+            await websocket.send_json({"type": "changed", **change})
+
+    pusher = asyncio.create_task(push())
+    try:
+        await websocket.send_json({"type": "hello", "version": version})
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        pusher.cancel()
 
 @app.get("/api/examples")
 async def get_examples():
@@ -288,6 +901,7 @@ async def get_file_content(file_path: str):
 @app.get("/api/file-tree")
 async def get_file_tree():
     """Get file tree structure of generated_project"""
+    touch_workspace(generated_project_dir.name)
     from pathlib import Path
     
     generated_dir = Path(__file__).parent / "generated_project"
@@ -315,6 +929,29 @@ async def get_file_tree():
         "tree": build_tree(generated_dir)
     }
 
+@app.get("/api/search")
+async def search_code(q: str, project: Optional[str] = None, regex: bool = False, case_sensitive: bool = False,
+                      limit: int = 20, context: int = 1):
+    """Search the files of all generated workspaces (or those under project) with line snippets"""
+    if not q:
+        raise HTTPException(status_code=400, detail="q must not be empty")
+    from agent.search import search_index
+    started = asyncio.get_running_loop().time()
+    try:
+        results = await asyncio.to_thread(
+            search_index.search, q, project, regex, case_sensitive, min(max(limit, 1), 100), min(max(context, 0), 5)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "status": "success",
+        "query": q,
+        "regex": regex,
+        "count": len(results),
+        "took_ms": round((asyncio.get_running_loop().time() - started) * 1000, 2),
+        "results": results,
+    }
+
 @app.get("/api/project-preview")
 async def get_project_preview():
     """Get the generated project's index.html content"""
@@ -351,6 +988,7 @@ async def get_project_preview():
 @app.get("/project-viewer")
 async def project_viewer():
     """Serve the generated project viewer page with corrected asset paths"""
+    touch_workspace(generated_project_dir.name)
     from pathlib import Path
     
     generated_dir = Path(__file__).parent / "generated_project"
@@ -373,9 +1011,10 @@ async def project_viewer():
                 <h1>No Project Generated</h1>
                 <p>Please generate a project first, then use the View Project button.</p>
             </div>
+            <script src="%s"></script>
         </body>
         </html>
-        """, status_code=404)
+        """ % static_assets.url("livereload.js"), status_code=404)
     
     try:
         with open(index_file, 'r', encoding='utf-8') as f:
@@ -390,6 +1029,12 @@ async def project_viewer():
         # Replace src="script.js" with src="/project-assets/script.js"
         content = re.sub(r'src=["\'](?!(?:https?:|/))([^"\']+)["\']', r'src="/project-assets/\1"', content)
         
+        # Live reload: the client applies changes pushed over /ws/preview
+        livereload = f'<script src="{static_assets.url("livereload.js")}"></script>'
+        content, injected = re.subn(r'</body\s*>', livereload + '</body>', content, count=1, flags=re.IGNORECASE)
+        if not injected:
+            content += livereload
+        
         # Return HTML directly with proper asset paths
         return HTMLResponse(content)
     except Exception as e:
@@ -427,20 +1072,46 @@ app.mount("/project-assets", StaticFiles(directory=str(generated_project_dir)),
 async def http_exception_handler(request, exc):
     """Custom HTTP exception handler"""
     logger.error(f"HTTP Exception: {exc.detail}")
-    return {
-        "status": "error",
-        "message": exc.detail,
-        "status_code": exc.status_code
-    }
+    return DefaultJSONResponse(
+        status_code=exc.status_code,
+        content={
+            "status": "error",
+            "message": exc.detail,
+            "status_code": exc.status_code
+        },
+        headers=exc.headers
+    )
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
     import os
+    parser = argparse.ArgumentParser(description="DevOrchestrator API server")
+    parser.add_argument("--supervisor", action="store_true",
+                        help="Pre-fork WORKERS processes that share the preloaded app and are recycled "
+                             "after WORKER_MAX_JOBS jobs or WORKER_MAX_RSS_MB of RSS")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes in supervisor mode")
+    args = parser.parse_args()
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(
-        "app:app",  # Use import string for better compatibility
-        host="0.0.0.0",
-        port=port,
-        log_level="info",
-        reload=False  # Disable reload for background processes
-    )
+    if args.supervisor:
+        import app as application
+        from server.supervisor import Supervisor
+        s = application.get_settings()
+        Supervisor(
+            "app:app",
+            host=s.host,
+            port=port,
+            workers=args.workers or s.workers,
+            max_jobs=s.worker_max_jobs,
+            max_rss_mb=s.worker_max_rss_mb,
+            drain_timeout=s.worker_drain_timeout,
+            preload=application.preload,
+        ).run()
+    else:
+        uvicorn.run(
+            "app:app",  # Use import string for better compatibility
+            host="0.0.0.0",
+            port=port,
+            log_level="info",
+            reload=False  # Disable reload for background processes
+        )
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark bytes on the wire and JSON serialization time of the read endpoints.
+Runs the app in-process (no server, no LLM calls) against generated_project/.
+
+For every endpoint it reports the response size without compression, with
+gzip and with brotli (if installed), and for JSON endpoints how long the
+stdlib json and orjson take to serialize the same payload.
+
+Usage: python benchmark_api.py --runs 200
+"""
+
+import argparse
+import json
+import logging
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+
+from app import app, static_assets
+from server.compression import brotli
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ENCODINGS = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+
+
+def default_endpoints(client: TestClient) -> list[str]:
+    endpoints = ["/", "/api/examples", "/api/generated-files", "/api/file-tree", "/api/project-preview"]
+    files = client.get("/api/generated-files").json().get("files", [])
+    endpoints += [f"/api/file-content/{f['path']}" for f in files[:3] if isinstance(f, dict) and "path" in f]
+    endpoints += [static_assets.url(path) for path in static_assets.build()]
+    return endpoints
+
+
+def wire_bytes(client: TestClient, endpoint: str, encoding: str) -> tuple[int, str]:
+    """Body size as sent (httpx would decode it; iter_raw does not) and the content type"""
+    with client.stream("GET", endpoint, headers={"Accept-Encoding": encoding}) as response:
+        return sum(len(chunk) for chunk in response.iter_raw()), response.headers.get("content-type", "")
+
+
+def serialize_ms(payload, dumps, runs: int) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        dumps(payload)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure response sizes and JSON serialization time per endpoint")
+    parser.add_argument("--runs", "-n", type=int, default=200, help="Serializations per endpoint (default: 200)")
+    parser.add_argument("--endpoint", "-e", action="append", help="Endpoint to measure (repeatable)")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    with TestClient(app) as client:
+        endpoints = args.endpoint or default_endpoints(client)
+        header = f"{'endpoint':<44}" + "".join(f"{e:>10}" for e in ENCODINGS)
+        print(header + f"{'json (ms)':>11}{'orjson (ms)':>13}")
+        print("-" * (len(header) + 24))
+        for endpoint in endpoints:
+            sizes = []
+            for encoding in ENCODINGS:
+                size, content_type = wire_bytes(client, endpoint, encoding)
+                sizes.append(size)
+            line = f"{endpoint[:44]:<44}" + "".join(f"{size:>10}" for size in sizes)
+            if content_type.startswith("application/json"):
+                payload = client.get(endpoint).json()
+                line += f"{serialize_ms(payload, json.dumps, args.runs):>11.3f}"
+                if orjson is not None:
+                    line += f"{serialize_ms(payload, orjson.dumps, args.runs):>13.3f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Benchmark end-to-end latency of fast (fused planner/architect) vs full (two-stage) mode,
+including the time until index.html is first written (first preview).
+
+By default every run makes real LLM calls and requires GROQ_API_KEY. With --simulate the
+LLM is replaced by a replay of the pre_generated_project_* templates at a fixed time to
+first token, prompt processing rate and output rate, so the two pipelines can be compared
+without an API key; those numbers follow from the latency model, not from the provider.
+
+Every run plans from scratch (no plan reuse, no template seeding) in its own temporary
+workspace.
+
+Usage: python benchmark_modes.py --runs 3
+       python benchmark_modes.py --simulate --output bench_output.json
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("LANGCHAIN_VERBOSE", "false")
+os.environ.setdefault("LANGCHAIN_DEBUG", "false")
+
+DEFAULT_PROMPTS = [
+    "Build a calculator app that can perform addition, subtraction, multiplication, and division",
+    "Create a web-based todo application with add, edit, and delete functionality",
+]
+# Template replayed for a prompt in --simulate mode (first keyword match)
+SIMULATED_PROJECTS = {
+    "calculator": "pre_generated_project_calculator",
+    "todo": "pre_generated_project_todo_app",
+}
+
+
+def _chars_to_tokens(chars: int) -> float:
+    return chars / 4
+
+
+class SimulatedLLM:
+    """
+    Stands in for the chat model in --simulate mode.
+
+    A call takes ttft + prompt tokens / prefill_tps before the first chunk, then streams
+    its output at output_tps. Structured calls return a plan built from the template that
+    matches the prompt; coder steps write the template's file.
+    """
+
+    def __init__(self, project: Path, ttft: float, prefill_tps: float, output_tps: float):
+        self.ttft, self.prefill_tps, self.output_tps = ttft, prefill_tps, output_tps
+        self.files = {p.name: p.read_text(encoding="utf-8") for p in sorted(project.iterdir())
+                      if p.is_file() and p.suffix != ".md"}
+
+    def wait_first_token(self, prompt: str):
+        time.sleep(self.ttft + _chars_to_tokens(len(prompt)) / self.prefill_tps)
+
+    def stream_text(self, text: str, chunk_chars: int = 64):
+        for i in range(0, len(text), chunk_chars):
+            time.sleep(_chars_to_tokens(len(text[i:i + chunk_chars])) / self.output_tps)
+            yield text[i:i + chunk_chars]
+
+    def blueprint(self) -> dict:
+        others = ", ".join(self.files)
+        plan = {
+            "name": "simulated-app",
+            "description": "A browser app replayed from a pre-generated template",
+            "techstack": "html, css, javascript",
+            "features": ["main view", "user input handling", "state updates", "styling"],
+            "files": [{"path": path, "purpose": f"{Path(path).suffix[1:]} of the app"} for path in self.files],
+        }
+        # Roughly the length of the architect's step descriptions (about 60 words)
+        steps = [{"filepath": path, "task_description":
+                  f"Implement {path}. Define every element, function and rule it needs, keep names "
+                  f"consistent with {others}, wire up the event handlers and the data flow between "
+                  f"the view and the state, handle empty and invalid input, and follow the plan's "
+                  f"features exactly. Describe the exported functions, their parameters and return "
+                  f"values, and keep the file self-contained apart from the files listed above."}
+                 for path in self.files]
+        return {"plan": plan, "implementation_steps": steps}
+
+    def bind_tools(self, tools, **kwargs):
+        from pydantic import BaseModel
+        if len(tools) == 1 and isinstance(tools[0], type) and issubclass(tools[0], BaseModel):
+            return _SimulatedStructured(self, tools[0].__name__)
+        return self
+
+
+class _ToolCallChunk:
+    def __init__(self, args: str):
+        self.tool_call_chunks = [{"index": 0, "args": args}]
+
+
+class _SimulatedStructured:
+    def __init__(self, llm: SimulatedLLM, schema: str):
+        self.llm, self.schema = llm, schema
+
+    def stream(self, prompt, *args, **kwargs):
+        blueprint = self.llm.blueprint()
+        output = {"Plan": blueprint["plan"],
+                  "TaskPlan": {"implementation_steps": blueprint["implementation_steps"]},
+                  "ProjectBlueprint": blueprint}[self.schema]
+        self.llm.wait_first_token(str(prompt))
+        for text in self.llm.stream_text(json.dumps(output)):
+            yield _ToolCallChunk(text)
+
+
+class _SimulatedCoder:
+    """Replaces the react agent: one write_file call with the template's file"""
+
+    def __init__(self, llm: SimulatedLLM):
+        self.llm = llm
+
+    def invoke(self, inputs, *args, **kwargs):
+        from agent.tools import write_file
+        system, user = (m["content"] for m in inputs["messages"])
+        path = re.search(r"^File: (.+)$", user, re.M).group(1).strip()
+        content = self.llm.files.get(Path(path).name, "")
+        self.llm.wait_first_token(system + user)
+        for _ in self.llm.stream_text(content):
+            pass
+        write_file.invoke({"path": path, "content": content})
+        return {"messages": []}
+
+
+def simulate(graph_module, prompt: str, args) -> None:
+    """Points the graph's LLM and coder agent at a SimulatedLLM for prompt"""
+    name = next((d for key, d in SIMULATED_PROJECTS.items() if key in prompt.lower()),
+                next(iter(SIMULATED_PROJECTS.values())))
+    llm = SimulatedLLM(Path(__file__).parent / name, args.ttft, args.prefill_tps, args.output_tps)
+    graph_module.llm = llm
+    graph_module.create_react_agent = lambda *a, **k: _SimulatedCoder(llm)
+
+
+def time_run(prompt: str, mode: str, recursion_limit: int) -> dict:
+    """Run one generation and return planning, first preview and total latency in seconds"""
+    from agent.changes import file_changes
+    from agent.graph import agent
+    from agent.scheduler import is_preview_entry
+    from agent.tools import use_project_root
+
+    planned_at = previewed_at = None
+
+    def on_change(change: dict):
+        nonlocal previewed_at
+        if previewed_at is None and is_preview_entry(change["path"]):
+            previewed_at = time.perf_counter()
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp, use_project_root(tmp) as root:
+        with file_changes.subscribe(root, on_change):
+            start = time.perf_counter()
+            for update in agent.stream(
+                {"user_prompt": prompt, "mode": mode, "reuse_plans": False, "use_templates": False},
+                {"recursion_limit": recursion_limit},
+                stream_mode="updates",
+            ):
+                if planned_at is None and any(
+                    isinstance(value, dict) and "task_plan" in value for value in update.values()
+                ):
+                    planned_at = time.perf_counter()
+            end = time.perf_counter()
+    return {
+        "planning": (planned_at or end) - start,
+        "preview": (previewed_at or end) - start,
+        "total": end - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fast and full planning modes")
+    parser.add_argument("--runs", "-n", type=int, default=3, help="Runs per prompt and mode (default: 3)")
+    parser.add_argument("--recursion-limit", "-r", type=int, default=100)
+    parser.add_argument("--prompt", "-p", action="append", help="Prompt to benchmark (repeatable)")
+    parser.add_argument("--output", "-o", help="Also write the medians and every run as JSON to this file")
+    parser.add_argument("--simulate", action="store_true", help="Replay templates instead of calling the LLM")
+    parser.add_argument("--ttft", type=float, default=0.5, help="Simulated time to first token (s, default: 0.5)")
+    parser.add_argument("--prefill-tps", type=float, default=5000.0,
+                        help="Simulated prompt tokens per second (default: 5000)")
+    parser.add_argument("--output-tps", type=float, default=250.0,
+                        help="Simulated output tokens per second (default: 250)")
+    args = parser.parse_args()
+    if args.simulate:
+        os.environ.setdefault("GROQ_API_KEY", "simulated")
+
+    import agent.graph
+
+    prompts = args.prompt or DEFAULT_PROMPTS
+    results = []
+    print(f"{'mode':<6} {'prompt':<40} {'planning (s)':>14} {'preview (s)':>13} {'total (s)':>12}")
+    print("-" * 90)
+    for prompt in prompts:
+        if args.simulate:
+            simulate(agent.graph, prompt, args)
+        for mode in ("full", "fast"):
+            timings = [time_run(prompt, mode, args.recursion_limit) for _ in range(args.runs)]
+            medians = {key: statistics.median(t[key] for t in timings) for key in ("planning", "preview", "total")}
+            results.append({"prompt": prompt, "mode": mode, **medians, "runs": timings})
+            print(f"{mode:<6} {prompt[:40]:<40} {medians['planning']:>14.2f} "
+                  f"{medians['preview']:>13.2f} {medians['total']:>12.2f}")
+
+    if args.output:
+        model = ({"ttft": args.ttft, "prefill_tps": args.prefill_tps, "output_tps": args.output_tps}
+                 if args.simulate else None)
+        Path(args.output).write_text(json.dumps({"simulated": model, "results": results}, indent=2),
+                                     encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
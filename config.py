@@ -51,11 +51,31 @@ class Settings(BaseSettings):
     rate_limit_requests: int = int(os.getenv("RATE_LIMIT_REQUESTS", 100))
     rate_limit_period: int = int(os.getenv("RATE_LIMIT_PERIOD", 60))
     
+    # Admission control for project generation
+    max_concurrent_generations: int = int(os.getenv("MAX_CONCURRENT_GENERATIONS", 2))
+    max_queued_generations: int = int(os.getenv("MAX_QUEUED_GENERATIONS", 8))
+    max_queue_wait: int = int(os.getenv("MAX_QUEUE_WAIT_SECONDS", 120))
+    
+    # Shared job/event state across workers: sqlite:///path.db or redis://host:port/db
+    state_backend_url: str = os.getenv("STATE_BACKEND_URL", "sqlite:///.devorchestrator/state.db")
+    
+    # Supervisor mode (python app.py --supervisor): recycle a worker after this many jobs
+    # or this much RSS (0 disables), draining its running jobs for up to the timeout
+    worker_max_jobs: int = int(os.getenv("WORKER_MAX_JOBS", 0))
+    worker_max_rss_mb: int = int(os.getenv("WORKER_MAX_RSS_MB", 0))
+    worker_drain_timeout: int = int(os.getenv("WORKER_DRAIN_TIMEOUT_SECONDS", 300))
+    
+    # Reverse proxies whose X-Forwarded-For is trusted (comma-separated IPs/CIDRs);
+    # empty means clients are identified by their connection address only
+    trusted_proxies: str = os.getenv("TRUSTED_PROXIES", "")
+    
     # CORS
     cors_origins: str = os.getenv("CORS_ORIGINS", "*")
     
     # Security
     secret_key: str = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
+    # Token for the /api/admin endpoints (X-Admin-Token header); empty disables them
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
     
     class Config:
         env_file = ".env"
@@ -79,6 +99,12 @@ class Settings(BaseSettings):
             return ["*"]
         return [origin.strip() for origin in self.cors_origins.split(",")]
     
+    @property
+    def trusted_proxy_networks(self) -> list:
+        """Parse trusted proxy addresses and ranges from string"""
+        from server.admission import parse_networks
+        return parse_networks(self.trusted_proxies)
+    
     @property
     def generated_projects_path(self) -> Path:
         """Get generated projects path as Path object"""
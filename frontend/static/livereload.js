@@ -0,0 +1,60 @@
+// Live reload for /project-viewer: injected into the previewed page, listens on
+// /ws/preview and applies the files the agents write. Stylesheets are swapped in
+// place; any other change reloads the page.
+(function () {
+    const PREVIEW_WS = `${window.location.protocol === 'https:' ? 'wss:' : 'ws:'}//${window.location.host}/ws/preview`;
+    const ASSET_PREFIX = '/project-assets/';
+    let version = null;
+    let pending = new Set();
+    let timer = null;
+
+    function assetPath(url) {
+        const path = new URL(url, window.location.href).pathname;
+        return path.startsWith(ASSET_PREFIX) ? decodeURIComponent(path.slice(ASSET_PREFIX.length)) : null;
+    }
+
+    function swapStylesheet(path) {
+        let swapped = false;
+        document.querySelectorAll('link[rel="stylesheet"]').forEach(link => {
+            if (assetPath(link.href) === path) {
+                link.href = `${ASSET_PREFIX}${path}?v=${Date.now()}`;
+                swapped = true;
+            }
+        });
+        return swapped;
+    }
+
+    function applyChanges() {
+        const changed = Array.from(pending);
+        pending = new Set();
+        const needsReload = changed.some(path => !(path.endsWith('.css') && swapStylesheet(path)));
+        if (needsReload) {
+            window.location.reload();
+        }
+    }
+
+    function connect() {
+        const ws = new WebSocket(PREVIEW_WS);
+
+        ws.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            if (data.type === 'hello') {
+                // Reconnected after missing changes: start over from a fresh page
+                if (version !== null && data.version !== version) {
+                    window.location.reload();
+                }
+                version = data.version;
+            } else if (data.type === 'changed') {
+                version = data.version;
+                pending.add(data.path);
+                // Coder steps write several files in a row; apply them together
+                clearTimeout(timer);
+                timer = setTimeout(applyChanges, 200);
+            }
+        };
+
+        ws.onclose = () => setTimeout(connect, 2000);
+    }
+
+    connect();
+})();
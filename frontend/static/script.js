@@ -1,5 +1,5 @@
 // DOM Elements - Initialize safely
-let projectForm, promptTextarea, recursionLimitInput, outputPanel, outputContent;
+let projectForm, promptTextarea, recursionLimitInput, planningModeSelect, outputPanel, outputContent;
 let statusBadge, miniSpinner, examplesGrid, filesPanel, fileTree;
 let fileViewer, fileContent, currentFile, successActions, projectModal;
 let projectFrame, projectInfo;
@@ -14,6 +14,7 @@ document.addEventListener('DOMContentLoaded', () => {
     projectForm = document.getElementById('projectForm');
     promptTextarea = document.getElementById('prompt');
     recursionLimitInput = document.getElementById('recursionLimit');
+    planningModeSelect = document.getElementById('planningMode');
     outputPanel = document.getElementById('outputPanel');
     outputContent = document.getElementById('outputContent');
     statusBadge = document.getElementById('statusBadge');
@@ -32,6 +33,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // Setup listeners and load examples
     setupEventListeners();
     loadExamples();
+    resumeActiveJob();
 });
 
 function setupEventListeners() {
@@ -43,6 +45,7 @@ async function handleProjectSubmit(e) {
     
     const prompt = promptTextarea.value.trim();
     const recursionLimit = parseInt(recursionLimitInput.value) || 100;
+    const mode = planningModeSelect ? planningModeSelect.value : 'auto';
     
     if (!prompt) {
         showOutput('Please enter a project description', 'error');
@@ -50,70 +53,144 @@ async function handleProjectSubmit(e) {
     }
     
     try {
-        await generateProject(prompt, recursionLimit);
+        await generateProject(prompt, recursionLimit, mode);
     } catch (error) {
         showOutput(`Error: ${error.message}`, 'error');
     }
 }
 
-async function generateProject(prompt, recursionLimit) {
+// The running job survives page reloads: its id and last seen event offset live in sessionStorage
+const ACTIVE_JOB_KEY = 'devorchestrator.activeJob';
+
+function saveActiveJob(jobId, offset) {
+    sessionStorage.setItem(ACTIVE_JOB_KEY, JSON.stringify({ jobId, offset }));
+}
+
+function loadActiveJob() {
+    try {
+        return JSON.parse(sessionStorage.getItem(ACTIVE_JOB_KEY));
+    } catch (error) {
+        return null;
+    }
+}
+
+function clearActiveJob() {
+    sessionStorage.removeItem(ACTIVE_JOB_KEY);
+}
+
+function resumeActiveJob() {
+    const active = loadActiveJob();
+    if (!active || !active.jobId) {
+        return;
+    }
     showLoading(true);
     updateStatus('generating', 'Generating...');
     clearOutput();
+    showOutput('🔄 Reconnecting to the running generation...', 'info');
+    // The page was reloaded, so replay the whole log to rebuild the output
+    saveActiveJob(active.jobId, -1);
+    openJobSocket({ subscribe: [{ job_id: active.jobId, offset: 0 }] });
+}
+
+function openJobSocket(firstMessage) {
+    const ws = new WebSocket(WS_URL);
+    let finished = false;
+
+    ws.onopen = () => {
+        ws.send(JSON.stringify(firstMessage));
+    };
+
+    ws.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        const active = loadActiveJob();
+
+        if (data.job_id && data.offset !== undefined) {
+            const seen = active && active.jobId === data.job_id ? active.offset : -1;
+            if (data.type === 'snapshot') {
+                // messages[i] is the event that had offset i; show only the ones not seen yet
+                data.messages.slice(seen + 1).forEach(message => showOutput(`📍 ${message}`, 'info'));
+                saveActiveJob(data.job_id, data.offset);
+                return;
+            }
+            if (data.offset <= seen) {
+                return;
+            }
+            saveActiveJob(data.job_id, data.offset);
+        }
+
+        switch (data.type) {
+            case 'job':
+                saveActiveJob(data.job_id, -1);
+                break;
+            case 'progress':
+                showOutput(`📍 ${data.message}`, 'info');
+                break;
+            case 'result':
+                showOutput(`📦 ${data.message}`, 'info');
+                break;
+            case 'file':
+                fileChanged(data.path, data.kind);
+                break;
+            case 'complete':
+                finished = true;
+                clearActiveJob();
+                showOutput(`✅ ${data.message}`, 'success');
+                updateStatus('success', 'Success');
+                loadGeneratedFiles();  // Load files after generation
+                showSuccessActions();  // Show View Project button
+                
+                // Hide spinner and close WebSocket
+                showLoading(false);
+                ws.close();
+                
+                // Show success message
+                showOutput('🎉 Project is ready! View files below.', 'success');
+                break;
+            case 'error':
+                finished = true;
+                clearActiveJob();
+                showOutput(`❌ ${data.message}`, 'error');
+                updateStatus('error', 'Error');
+                showLoading(false);
+                ws.close();
+                break;
+        }
+    };
+
+    ws.onerror = (error) => {
+        showOutput(`Connection error: ${error}`, 'error');
+    };
+
+    ws.onclose = () => {
+        const active = loadActiveJob();
+        if (!finished && active && active.jobId) {
+            // Dropped mid-job: resume right after the last event we showed
+            showOutput('🔌 Connection lost, resuming...', 'info');
+            setTimeout(() => openJobSocket({
+                subscribe: [{ job_id: active.jobId, offset: active.offset + 1 }]
+            }), 1000);
+            return;
+        }
+        showLoading(false);
+    };
+
+    return ws;
+}
+
+async function generateProject(prompt, recursionLimit, mode = 'auto') {
+    showLoading(true);
+    updateStatus('generating', 'Generating...');
+    clearOutput();
+    clearActiveJob();
     
     try {
         // Use WebSocket for real-time updates
-        const ws = new WebSocket(WS_URL);
-        let completionTimeout;
-        
-        ws.onopen = () => {
-            showOutput('🚀 Starting project generation...', 'info');
-            ws.send(JSON.stringify({
-                prompt: prompt,
-                recursion_limit: recursionLimit
-            }));
-        };
-        
-        ws.onmessage = (event) => {
-            const data = JSON.parse(event.data);
-            
-            switch (data.type) {
-                case 'progress':
-                    showOutput(`📍 ${data.message}`, 'info');
-                    break;
-                case 'complete':
-                    showOutput(`✅ ${data.message}`, 'success');
-                    updateStatus('success', 'Success');
-                    loadGeneratedFiles();  // Load files after generation
-                    showSuccessActions();  // Show View Project button
-                    
-                    // Hide spinner and close WebSocket
-                    showLoading(false);
-                    ws.close();
-                    
-                    // Show success message
-                    showOutput('🎉 Project is ready! View files below.', 'success');
-                    break;
-                case 'error':
-                    showOutput(`❌ ${data.message}`, 'error');
-                    updateStatus('error', 'Error');
-                    showLoading(false);
-                    ws.close();
-                    break;
-            }
-        };
-        
-        ws.onerror = (error) => {
-            showOutput(`Connection error: ${error}`, 'error');
-            updateStatus('error', 'Error');
-            showLoading(false);
-            ws.close();
-        };
-        
-        ws.onclose = () => {
-            showLoading(false);
-        };
-        
+        showOutput('🚀 Starting project generation...', 'info');
+        openJobSocket({
+            prompt: prompt,
+            recursion_limit: recursionLimit,
+            mode: mode
+        });
     } catch (error) {
         showLoading(false);
         showOutput(`Error: ${error.message}`, 'error');
@@ -183,6 +260,20 @@ async function loadGeneratedFiles() {
     }
 }
 
+// Files written during generation arrive as 'file' events; refresh only what they touch
+let fileTreeTimer = null;
+
+function fileChanged(path, kind) {
+    filesPanel.classList.remove('hidden');
+    if (kind === 'created' || !fileTree.hasChildNodes()) {
+        clearTimeout(fileTreeTimer);
+        fileTreeTimer = setTimeout(loadFileTree, 300);
+    }
+    if (currentFile.textContent === path || !currentFile.textContent) {
+        viewFile(path);
+    }
+}
+
 async function loadFileTree() {
     try {
         const response = await fetch(`${API_BASE}/file-tree`);
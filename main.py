@@ -1,24 +1,85 @@
 import argparse
+import json
 import sys
+import time
 import traceback
 
 from agent.graph import agent
+from agent.sandbox import job_cpu_budget
+from agent.usage import UsageTracker
+
+
+def run_batch_file(args):
+    """Runs every prompt of a JSONL file and appends one result line per finished run"""
+    from agent.batch import load_prompts, run_batch
+
+    items = load_prompts(args.batch)
+    for item in items:
+        if item.mode == "auto":
+            item.mode = args.mode
+        item.recursion_limit = item.recursion_limit or args.recursion_limit
+        item.reuse_plans = item.reuse_plans and not args.no_plan_reuse
+        item.use_templates = item.use_templates and not args.no_templates
+        item.max_tokens = item.max_tokens if item.max_tokens is not None else args.max_tokens
+        item.max_seconds = item.max_seconds if item.max_seconds is not None else args.max_seconds
+    print(f"Running {len(items)} prompts with parallelism {args.parallel}")
+
+    started = time.perf_counter()
+    failed = 0
+    with open(args.output, "a", encoding="utf-8") as out:
+        def write_result(result: dict):
+            nonlocal failed
+            failed += result["status"] != "success"
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            print(f"[{result['status']}] {result['id']} in {result['seconds']:.1f}s -> {result['workspace']}")
+
+        run_batch(items, args.workspace_dir, parallelism=args.parallel, on_result=write_result, graph=agent)
+
+    print(f"Finished {len(items)} prompts ({failed} failed) in {time.perf_counter() - started:.1f}s; "
+          f"results in {args.output}")
+    return failed
 
 
 def main():
     parser = argparse.ArgumentParser(description="Run engineering project planner")
     parser.add_argument("--recursion-limit", "-r", type=int, default=100,
                         help="Recursion limit for processing (default: 100)")
+    parser.add_argument("--mode", "-m", choices=["auto", "fast", "full"], default="auto",
+                        help="Planning mode: fused planner/architect (fast), two-stage (full), "
+                             "or picked from the prompt (auto, default)")
+    parser.add_argument("--no-plan-reuse", action="store_true",
+                        help="Always plan from scratch instead of reusing plans of similar past prompts")
+    parser.add_argument("--no-templates", action="store_true",
+                        help="Do not seed the workspace from a matching pre_generated_project_* template")
+    parser.add_argument("--max-tokens", type=int, default=None,
+                        help="Stop a run cleanly once it has used this many LLM tokens (default: JOB_MAX_TOKENS)")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Stop a run cleanly after this many seconds (default: JOB_MAX_SECONDS)")
+    parser.add_argument("--batch", "-b", metavar="FILE",
+                        help="Run every prompt of a JSONL file instead of reading one prompt from stdin")
+    parser.add_argument("--parallel", "-p", type=int, default=4,
+                        help="Concurrent generations in batch mode (default: 4)")
+    parser.add_argument("--output", "-o", default="batch_results.jsonl",
+                        help="JSONL file that batch results are appended to (default: batch_results.jsonl)")
+    parser.add_argument("--workspace-dir", default="generated_projects",
+                        help="Directory holding one workspace per batch prompt (default: generated_projects)")
 
     args = parser.parse_args()
 
     try:
+        if args.batch:
+            sys.exit(1 if run_batch_file(args) else 0)
         user_prompt = input("Enter your project prompt: ")
-        result = agent.invoke(
-            {"user_prompt": user_prompt},
-            {"recursion_limit": args.recursion_limit}
-        )
+        usage = UsageTracker(args.max_tokens, args.max_seconds)
+        with job_cpu_budget(), usage.activate():
+            result = agent.invoke(
+                {"user_prompt": user_prompt, "mode": args.mode, "reuse_plans": not args.no_plan_reuse,
+                 "use_templates": not args.no_templates},
+                {"recursion_limit": args.recursion_limit}
+            )
         print("Final State:", result)
+        print("Usage:", json.dumps(usage.report(), indent=2))
     except KeyboardInterrupt:
         print("\nOperation cancelled by user.")
         sys.exit(0)
@@ -0,0 +1,313 @@
+"""
+Admission control and load shedding for project generation.
+
+Three layers protect the worker from bursts of /api/generate calls:
+a per-client token bucket (RATE_LIMIT_REQUESTS per RATE_LIMIT_PERIOD),
+a global limit on concurrently running generations, and a bounded FIFO
+wait queue. Requests that cannot be admitted are rejected with 429 or 503
+and a Retry-After estimate instead of piling onto an overloaded worker.
+
+A request may also name an exclusive resource (the workspace it writes
+to). It is only admitted once no admitted request holds that resource, so
+it waits in the queue rather than occupying a slot while the workspace is
+busy, and requests for other resources can overtake it.
+
+Clients are identified by their address; X-Forwarded-For is only honoured
+when the connection comes from a trusted proxy (see ``client_address``).
+"""
+
+import asyncio
+import ipaddress
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Iterable, Optional, Union
+
+from fastapi import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_networks(spec: str) -> list[Network]:
+    """Parses a comma-separated list of addresses and CIDR ranges"""
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in spec.split(",") if part.strip()]
+
+
+def _is_trusted(address: str, trusted: Iterable[Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted)
+
+
+def client_address(peer: Optional[str], forwarded_for: Optional[str], trusted: Iterable[Network]) -> str:
+    """
+    The client's address. X-Forwarded-For is only used when the peer is a trusted
+    proxy; it is read from the right, skipping further trusted proxies, so a client
+    cannot pick its identity by sending the header itself.
+    """
+    trusted = list(trusted)
+    address = peer or "unknown"
+    if not forwarded_for or not _is_trusted(address, trusted):
+        return address
+    for hop in reversed([hop.strip() for hop in forwarded_for.split(",") if hop.strip()]):
+        address = hop
+        if not _is_trusted(hop, trusted):
+            break
+    return address
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate tokens per second"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def time_until_token(self) -> float:
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else float("inf")
+
+
+class AdmissionController:
+    """Rate limits clients and bounds concurrent and queued generations"""
+
+    def __init__(self, rate_limit_requests: int, rate_limit_period: int, max_concurrent: int,
+                 max_queued: int, max_queue_wait: float, max_clients: int = 10000):
+        self.rate_limit_requests = rate_limit_requests
+        self.rate_limit_period = rate_limit_period
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.max_queue_wait = max_queue_wait
+        self.max_clients = max_clients
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._active = 0
+        # Queued requests with the exclusive resource each one needs (or None)
+        self._waiters: deque[tuple[asyncio.Future, Optional[str]]] = deque()
+        # Exclusive resources held by admitted requests
+        self._held: set[str] = set()
+        # Exponentially weighted average generation time, used for queue-time estimates
+        self._avg_duration = 60.0
+
+    def check_rate(self, client_id: str):
+        """Consumes one token from the client's bucket or raises a 429 rejection"""
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate_limit_requests, self.rate_limit_requests / self.rate_limit_period)
+            self._buckets[client_id] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(client_id)
+        if not bucket.consume():
+            raise AdmissionRejected(429, "Rate limit exceeded", bucket.time_until_token())
+
+    def estimate_wait(self, position: int) -> float:
+        """Estimated seconds until the request at queue position (1-based) starts"""
+        if position <= 0:
+            return 0.0
+        return math.ceil(position / self.max_concurrent) * self._avg_duration
+
+    def status(self) -> dict:
+        return {
+            "active": self._active,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "estimated_wait_seconds": round(self.estimate_wait(len(self._waiters) + 1)
+                                            if self._active >= self.max_concurrent else 0.0, 1),
+            "average_generation_seconds": round(self._avg_duration, 1),
+        }
+
+    async def acquire(self, client_id: str,
+                      on_queued: Optional[Callable[[int, float], Awaitable[None]]] = None,
+                      exclusive: Optional[str] = None) -> Callable[[], None]:
+        """
+        Admits a request and returns an idempotent release callback.
+
+        With ``exclusive`` the request also holds that resource until released and
+        is not admitted while another request holds it.
+
+        Raises AdmissionRejected with 429 when the client is over its rate limit
+        and 503 when the queue is full or the wait exceeds MAX_QUEUE_WAIT_SECONDS.
+        """
+        self.check_rate(client_id)
+        return await self._acquire(exclusive, on_queued, bounded=True)
+
+    async def acquire_extra(self) -> Callable[[], None]:
+        """
+        Admits one more concurrent generation for work that was already admitted
+        (the items a running batch runs side by side), so it shares the global
+        limit. Not rate limited, and it waits in the queue however long it is.
+        """
+        return await self._acquire(None, None, bounded=False)
+
+    async def _acquire(self, exclusive: Optional[str],
+                       on_queued: Optional[Callable[[int, float], Awaitable[None]]],
+                       bounded: bool) -> Callable[[], None]:
+        # Waiters that could run are admitted as soon as anything changes, so a free
+        # slot here means every waiter is blocked on its resource
+        if self._active < self.max_concurrent and exclusive not in self._held:
+            self._admit(exclusive)
+        else:
+            position = len(self._waiters) + 1
+            eta = self.estimate_wait(position)
+            if bounded and position > self.max_queued:
+                raise AdmissionRejected(503, "Server is at capacity, please retry later", eta)
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append((future, exclusive))
+            if on_queued is not None:
+                await on_queued(position, eta)
+            try:
+                await asyncio.wait_for(future, timeout=self.max_queue_wait if bounded else None)
+            except asyncio.TimeoutError:
+                self._remove_waiter(future)
+                raise AdmissionRejected(503, "Timed out waiting for a free generation slot",
+                                        self.estimate_wait(len(self._waiters) + 1))
+            except BaseException:
+                # Cancelled while queued; if the slot was already handed over, pass it on
+                if future.done() and not future.cancelled():
+                    self._release_slot(exclusive)
+                else:
+                    self._remove_waiter(future)
+                raise
+
+        started = time.monotonic()
+        released = False
+
+        def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - started)
+            self._release_slot(exclusive)
+
+        return release
+
+    def _admit(self, exclusive: Optional[str]):
+        self._active += 1
+        if exclusive is not None:
+            self._held.add(exclusive)
+
+    def _remove_waiter(self, future: asyncio.Future):
+        self._waiters = deque(w for w in self._waiters if w[0] is not future)
+
+    def _release_slot(self, exclusive: Optional[str]):
+        # Must run on the event loop thread. Freed capacity goes directly to the oldest
+        # live waiters whose resource is free, so the counts stay exact.
+        self._active -= 1
+        self._held.discard(exclusive)
+        for future, resource in list(self._waiters):
+            if self._active >= self.max_concurrent:
+                break
+            if future.done():
+                self._remove_waiter(future)
+            elif resource not in self._held:
+                self._remove_waiter(future)
+                self._admit(resource)
+                future.set_result(None)
+
+
+def batch_admitter(admission: AdmissionController, release_batch: Callable[[], None],
+                   loop: asyncio.AbstractEventLoop) -> Callable[[], Callable[[], None]]:
+    """
+    ``admit`` callback for agent.batch.run_batch, called from the batch's worker
+    threads. The first item to start takes over the slot the batch was admitted
+    with; every other item waits for a slot of its own, so a batch never runs
+    more generations than it holds slots and never holds a slot between items.
+    """
+    lock = threading.Lock()
+    batch_slot = [release_batch]
+
+    def admit() -> Callable[[], None]:
+        with lock:
+            release = batch_slot.pop() if batch_slot else None
+        if release is None:
+            release = asyncio.run_coroutine_threadsafe(admission.acquire_extra(), loop).result()
+        # Slots are released on the event loop thread
+        return lambda: loop.call_soon_threadsafe(release)
+
+    return admit
+
+
+class BodySizeLimitMiddleware:
+    """Rejects HTTP request bodies larger than max_bytes with 413"""
+
+    def __init__(self, app: ASGIApp, max_bytes: Callable[[], int]):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.max_bytes()
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing, so this reaches the handlers
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+            return message
+
+        async def tracking_send(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as e:
+            if e.status_code != 413 or response_started:
+                raise
+            await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send: Send, limit: int):
+        body = f'{{"status":"error","message":"Request body exceeds {limit} bytes","status_code":413}}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
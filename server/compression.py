@@ -0,0 +1,255 @@
+"""
+Response compression and precompressed, content-hashed static assets.
+
+``CompressionMiddleware`` negotiates brotli (when the optional ``brotli``
+package is installed) or gzip from Accept-Encoding. Complete bodies below
+``minimum_size`` are sent as they are. Streaming responses (several body
+messages) are compressed chunk by chunk and flushed after every chunk, so
+streamed output is never held back in the compressor. Responses that already
+carry a Content-Encoding, such as precompressed assets, pass through untouched.
+
+``StaticAssets`` serves ``frontend/static`` under content-hashed names
+(``/assets/script.<hash>.js``) with gzip/brotli variants compressed once at
+maximum level, an ETag and ``Cache-Control: immutable``. HTML pages link to the
+hashed names through ``rewrite_html``.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/javascript", "application/xml", "application/x-ndjson",
+    "application/manifest+json", "image/svg+xml",
+}
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return (media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+            or media_type.endswith("+json") or media_type.endswith("+xml"))
+
+
+def _accepted(accept_encoding: str) -> dict[str, float]:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def accepts(accept_encoding: str, encoding: str) -> bool:
+    """Whether the Accept-Encoding header allows encoding (explicitly or through *)"""
+    accepted = _accepted(accept_encoding)
+    return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported encoding the client accepts: br, then gzip, else None"""
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepts(accept_encoding, encoding):
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL if level is None else level, mtime=0)
+
+
+class _StreamCompressor:
+    """Incremental compressor that flushes after every chunk"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """Compresses compressible HTTP responses with brotli or gzip"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+        compressor: Optional[_StreamCompressor] = None
+
+        async def compressing_send(message: Message):
+            nonlocal start, passthrough, compressor
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                passthrough = (
+                    "content-encoding" in headers
+                    or "content-range" in headers
+                    or message["status"] in (204, 304)
+                    or not is_compressible(headers.get("content-type", ""))
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    # The whole body in one message: compress it in one go if it is worth it
+                    if len(body) >= self.minimum_size:
+                        body = compress(body, encoding)
+                        headers["Content-Encoding"] = encoding
+                        headers["Content-Length"] = str(len(body))
+                    passthrough = True
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                compressor = _StreamCompressor(encoding)
+                headers["Content-Encoding"] = encoding
+                del headers["Content-Length"]
+                await send(start)
+
+            data = compressor.chunk(body) if body else b""
+            if not more_body:
+                data += compressor.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+
+@dataclass
+class Asset:
+    path: str
+    hashed_path: str
+    content_type: str
+    etag: str
+    # encoding ("identity", "gzip", "br") -> bytes; only variants smaller than the original are kept
+    variants: dict[str, bytes] = field(default_factory=dict)
+
+
+class StaticAssets:
+    """Content-hashed, precompressed copies of a static directory, built once on first use"""
+
+    def __init__(self, directory: Path, url_prefix: str = "/assets", static_prefix: str = "/static"):
+        self.directory = Path(directory)
+        self.url_prefix = url_prefix
+        self.static_prefix = static_prefix
+        self._assets: Optional[dict[str, Asset]] = None
+        self._by_hashed: dict[str, Asset] = {}
+        self._lock = threading.Lock()
+
+    def build(self) -> dict[str, Asset]:
+        with self._lock:
+            if self._assets is not None:
+                return self._assets
+            assets = {}
+            for file in sorted(self.directory.rglob("*")):
+                if not file.is_file() or file.name.startswith("."):
+                    continue
+                data = file.read_bytes()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                path = file.relative_to(self.directory).as_posix()
+                stem, dot, suffix = path.rpartition(".")
+                hashed = f"{stem}.{digest}.{suffix}" if dot and "/" not in suffix else f"{path}.{digest}"
+                content_type = mimetypes.guess_type(file.name)[0] or "application/octet-stream"
+                if content_type.startswith("text/") or content_type == "application/javascript":
+                    content_type += "; charset=utf-8"
+                asset = Asset(path, hashed, content_type, f'"{digest}"', {"identity": data})
+                if is_compressible(content_type):
+                    for encoding, level in (("gzip", 9), ("br", 11)):
+                        if encoding == "br" and brotli is None:
+                            continue
+                        compressed = compress(data, encoding, level)
+                        if len(compressed) < len(data):
+                            asset.variants[encoding] = compressed
+                assets[path] = asset
+            self._by_hashed = {a.hashed_path: a for a in assets.values()}
+            self._assets = assets
+            return assets
+
+    def url(self, path: str) -> str:
+        asset = self.build().get(path)
+        return f"{self.url_prefix}/{asset.hashed_path}" if asset else f"{self.static_prefix}/{path}"
+
+    def rewrite_html(self, html: str) -> str:
+        """Points /static/<file> references at the hashed asset URLs"""
+        for path in self.build():
+            html = html.replace(f'"{self.static_prefix}/{path}"', f'"{self.url(path)}"')
+        return html
+
+    def response(self, hashed_path: str, accept_encoding: str, if_none_match: str = "") -> Response:
+        self.build()
+        asset = self._by_hashed.get(hashed_path)
+        if asset is None:
+            return Response(status_code=404)
+        headers = {"Cache-Control": ASSET_CACHE_CONTROL, "ETag": asset.etag, "Vary": "Accept-Encoding"}
+        if asset.etag in if_none_match:
+            return Response(status_code=304, headers=headers)
+        encoding = choose_encoding(accept_encoding)
+        if encoding == "br" and "br" not in asset.variants:
+            encoding = "gzip" if "gzip" in asset.variants and accepts(accept_encoding, "gzip") else None
+        body = asset.variants.get(encoding) if encoding else None
+        if body is None:
+            body = asset.variants["identity"]
+        else:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=asset.content_type, headers=headers)
@@ -0,0 +1,296 @@
+"""
+Generation jobs published through the shared state backend.
+
+A job's status lives in the backend's job record and its progress in the
+job's event log, so a client connected to any worker can follow any job.
+Jobs writing to the same workspace are serialized with a backend lock, and
+the workspace's record names the job writing it, so any worker can follow the
+files written to a workspace (see ``tail_file_changes``).
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+from agent.states import summarize_state
+from server.metrics import record_first_preview, record_usage
+from server.profiling import StackSampler, job_thread, job_threads, save_profile
+from server.state import StateBackend, tail_events
+
+LOCK_TTL = 60.0
+# Finished jobs' event logs are compacted into a snapshot after this many seconds (negative disables)
+EVENT_LOG_COMPACT_DELAY = float(os.getenv("EVENT_LOG_COMPACT_DELAY", "30"))
+
+
+def workspace_record(workspace: str) -> str:
+    """Backend record holding the workspace's current job and the version of its last file event"""
+    return f"workspace:{workspace}"
+
+
+def parse_version(version: Optional[str]) -> tuple[Optional[str], int]:
+    """(job_id, offset after the file event) for a "job_id:offset" workspace version"""
+    if not version:
+        return None, 0
+    job_id, _, offset = version.rpartition(":")
+    return job_id, int(offset) + 1
+
+
+async def tail_file_changes(backend: StateBackend, workspace: str, version: Optional[str] = None,
+                            poll_interval: float = 0.25) -> AsyncIterator[dict]:
+    """
+    Yields {"path", "kind", "version"} for every file written to workspace after
+    version, by whichever worker runs the job, following each new job that
+    takes the workspace over. Runs until cancelled.
+    """
+    job_id, offset = parse_version(version)
+    finished = None
+    while True:
+        current = ((await asyncio.to_thread(backend.get_job, workspace_record(workspace))) or {}).get("job")
+        if current is None or current == finished:
+            await asyncio.sleep(poll_interval)
+            continue
+        if current != job_id:
+            job_id, offset = current, 0
+        async for event_offset, event in tail_events(backend, job_id, offset, poll_interval):
+            offset = event_offset + 1
+            if event.get("type") == "file":
+                yield {"path": event["path"], "kind": event["kind"], "version": f"{job_id}:{event_offset}"}
+        finished = job_id
+
+
+def describe_update(node: str, update: dict) -> str:
+    """Human-readable progress message for one graph node update"""
+    update = update or {}
+    if update.get("budget_exceeded"):
+        return f"Stopped in {node}: {update['budget_exceeded']}"
+    if node == "template":
+        name = update.get("template")
+        return f"Seeded workspace from template '{name}'" if name else "No matching project template"
+    if node == "plan_lookup":
+        return {
+            "cache": "Reusing the plan of a similar earlier request",
+            "warm_start": "Planning from a similar earlier request",
+        }.get(update.get("plan_source"), "Planning from scratch")
+    if node in ("planner", "fast_planner"):
+        plan = update.get("plan")
+        if plan is None:
+            return "Project plan ready"
+        suffix = " (fast mode)" if node == "fast_planner" else ""
+        return f"Planned '{plan.name}' with {len(plan.files)} files{suffix}"
+    if node == "architect":
+        return f"Broke the plan into {len(update['task_plan'].implementation_steps)} implementation steps"
+    if node == "coder":
+        coder_state = update.get("coder_state")
+        if update.get("status") == "DONE" or coder_state is None:
+            return "All implementation steps complete"
+        steps = coder_state.task_plan.implementation_steps
+        step = steps[coder_state.current_step_idx - 1]
+        return f"Implemented step {coder_state.current_step_idx}/{len(steps)}: {step.filepath}"
+    if node == "validate":
+        failures = update.get("validation") or {}
+        if not failures:
+            return "Validation passed"
+        action = "repairing" if update.get("status") == "REPAIR" else "giving up on"
+        return f"Validation found problems in {len(failures)} files, {action} them"
+    return f"Finished {node}"
+
+
+class JobManager:
+    """Creates jobs and runs them while publishing status and events to the backend"""
+
+    def __init__(self, backend: StateBackend):
+        self.backend = backend
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def create(self, prompt: str, **fields) -> str:
+        job_id = uuid.uuid4().hex
+        self.backend.set_job(job_id, status="queued", prompt=prompt, created=time.time(),
+                             worker=self.worker_id, **fields)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.backend.get_job(job_id)
+
+    def emit(self, job_id: str, event_type: str, message: str, **fields) -> int:
+        return self.backend.append_event(job_id, {"type": event_type, "message": message, **fields})
+
+    def schedule_compaction(self, job_id: str):
+        """Compacts a finished job's event log once live subscribers have had time to catch up"""
+        if EVENT_LOG_COMPACT_DELAY < 0:
+            return
+
+        def compact():
+            try:
+                self.backend.compact_events(job_id)
+            except Exception as e:
+                print(f"Could not compact events of job {job_id}: {e}")
+
+        timer = threading.Timer(EVENT_LOG_COMPACT_DELAY, compact)
+        timer.daemon = True
+        timer.start()
+
+    @contextmanager
+    def forward_file_changes(self, job_id: str, workspace):
+        """
+        Publishes the files written to workspace during the block as the job's
+        "file" events, names the job and its latest file event in the
+        workspace's record, and records the job's time to first preview (the
+        first index.html write) in its record and the metrics.
+        """
+        from pathlib import Path
+
+        from agent.changes import file_changes
+        from agent.scheduler import is_preview_entry
+
+        record = workspace_record(Path(workspace).name)
+        self.backend.set_job(record, job=job_id)
+        started = (self.backend.get_job(job_id) or {}).get("started") or time.time()
+        previewed = False
+
+        def forward(change: dict):
+            nonlocal previewed
+            offset = self.emit(job_id, "file", f"Wrote {change['path']}", step="files",
+                               path=change["path"], kind=change["kind"])
+            self.backend.set_job(record, job=job_id, version=f"{job_id}:{offset}")
+            if not previewed and is_preview_entry(change["path"]):
+                previewed = True
+                seconds = change["time"] - started
+                self.backend.set_job(job_id, time_to_first_preview=round(seconds, 3))
+                record_first_preview(seconds)
+
+        with file_changes.subscribe(workspace, forward):
+            yield
+
+    @contextmanager
+    def workspace_lock(self, job_id: str, workspace: str):
+        """Holds the workspace lock for the job, refreshing it until released"""
+        name = f"workspace:{workspace}"
+        waiting_reported = False
+        while not self.backend.acquire_lock(name, job_id, LOCK_TTL):
+            if not waiting_reported:
+                self.emit(job_id, "progress", "Waiting for the workspace to become free...", step="queued")
+                waiting_reported = True
+            time.sleep(0.5)
+
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(LOCK_TTL / 3):
+                self.backend.acquire_lock(name, job_id, LOCK_TTL)
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+            self.backend.release_lock(name, job_id)
+
+    def run(self, job_id: str, workspace: str, updates: Iterator[tuple[str, dict]], usage=None,
+            profile: bool = False) -> dict:
+        """
+        Runs a job to completion (blocking) and returns its result summary.
+
+        ``updates`` is a LangGraph stream in ``["updates", "values"]`` mode; it is
+        only started once the workspace lock is held. ``usage`` is the job's
+        agent.usage.UsageTracker, whose running totals are attached to events.
+        With ``profile`` the job's thread is sampled for the whole run and the
+        collapsed stacks are saved (see server.profiling).
+        """
+        sampler = StackSampler(threads=lambda: job_threads(job_id)).start() if profile else None
+        try:
+            with job_thread(job_id):
+                return self._run(job_id, workspace, updates, usage)
+        finally:
+            if sampler is not None:
+                sampler.stop()
+                path = save_profile(job_id, sampler)
+                self.backend.set_job(job_id, profile={"path": str(path), **sampler.summary()})
+
+    def _run(self, job_id: str, workspace: str, updates: Iterator[tuple[str, dict]], usage) -> dict:
+        final = None
+        try:
+            with self.workspace_lock(job_id, workspace):
+                self.backend.set_job(job_id, status="running", started=time.time(), worker=self.worker_id)
+                self.emit(job_id, "progress", "Starting project generation...", step="initialization")
+                for mode, chunk in updates:
+                    if mode == "values":
+                        final = chunk
+                        continue
+                    tokens = {"tokens": usage.totals.total_tokens} if usage is not None else {}
+                    for node, update in chunk.items():
+                        self.emit(job_id, "progress", describe_update(node, update), step=node, **tokens)
+        except Exception as e:
+            report = usage.report() if usage is not None else None
+            record_usage(report, kind="generate", status="error")
+            # Terminal events go first: tailers stop once they see a terminal status
+            self.emit(job_id, "error", f"Error: {e}", usage=report)
+            self.backend.set_job(job_id, status="error", error=str(e), usage=report, finished=time.time())
+            self.schedule_compaction(job_id)
+            raise
+
+        summary = summarize_state(final)
+        if usage is not None:
+            summary["usage"] = usage.report()
+        record_usage(summary.get("usage"), kind="generate", status="success")
+        message = "Project generated successfully"
+        if summary.get("usage", {}).get("prompt_tokens"):
+            message += f" ({summary['usage']['cached_ratio']:.0%} of prompt tokens served from cache)"
+        if summary.get("budget_exceeded"):
+            message = f"Stopped early: {summary['budget_exceeded']} ({len(summary['skipped_steps'])} steps skipped)"
+        self.emit(job_id, "complete", message, status="success", result=summary)
+        self.backend.set_job(job_id, status="success", result=summary, finished=time.time())
+        self.schedule_compaction(job_id)
+        return summary
+
+    def run_batch(self, job_id: str, items: list, workspace_root, parallelism: int, output_path,
+                  admit=None) -> dict:
+        """
+        Runs a batch job (blocking): every item gets its own workspace under
+        workspace_root, a "result" event is emitted per finished item and the
+        results are appended to the JSONL file at output_path as they arrive.
+        ``admit`` is passed on to agent.batch.run_batch.
+        """
+        from agent.batch import run_batch
+
+        counts = {"success": 0, "error": 0}
+        totals = {"total_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0}
+        self.backend.set_job(job_id, status="running", started=time.time(), worker=self.worker_id)
+        self.emit(job_id, "progress", f"Running {len(items)} prompts with parallelism {parallelism}...",
+                  step="initialization")
+        try:
+            with open(output_path, "a", encoding="utf-8") as out:
+                def on_result(result: dict):
+                    counts[result["status"]] = counts.get(result["status"], 0) + 1
+                    record_usage(result.get("usage"), kind="batch", status=result["status"])
+                    for key in totals:
+                        totals[key] += (result.get("usage") or {}).get(key, 0)
+                    out.write(json.dumps(result, default=str) + "\n")
+                    out.flush()
+                    result = {k: v for k, v in result.items() if k != "traceback"}
+                    done = counts["success"] + counts["error"]
+                    self.emit(job_id, "result", f"Finished {result['id']} ({done}/{len(items)})",
+                              step="batch", result=result)
+                    self.backend.set_job(job_id, completed=done, failed=counts["error"])
+
+                run_batch(items, workspace_root, parallelism=parallelism, on_result=on_result, admit=admit)
+        except Exception as e:
+            self.emit(job_id, "error", f"Error: {e}")
+            self.backend.set_job(job_id, status="error", error=str(e), finished=time.time())
+            self.schedule_compaction(job_id)
+            raise
+
+        summary = {"count": len(items), "succeeded": counts["success"], "failed": counts["error"],
+                   "output": str(output_path), "usage": {**totals, "cost_usd": round(totals["cost_usd"], 6)}}
+        self.emit(job_id, "complete", f"Batch finished: {counts['success']}/{len(items)} succeeded",
+                  status="success", result=summary)
+        self.backend.set_job(job_id, status="success", result=summary, finished=time.time())
+        self.schedule_compaction(job_id)
+        return summary
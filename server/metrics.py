@@ -0,0 +1,128 @@
+"""
+Process-local metrics rendered in the Prometheus text exposition format.
+
+Counters are kept per worker process; scrape every worker (or sum them) when
+running several. Collectors registered with ``add_collector`` are called at
+scrape time for gauges that are cheaper to read than to track.
+"""
+
+import threading
+from typing import Callable, Iterable
+
+Sample = tuple[str, dict, float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Metrics:
+    """Thread-safe counter/gauge registry"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: dict[str, tuple[str, str]] = {}
+        self._values: dict[str, dict[tuple, float]] = {}
+        self._collectors: list[Callable[[], Iterable[Sample]]] = []
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._meta[name] = (kind, help_text)
+        self._values.setdefault(name, {})
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values.setdefault(name, {})[key] = value
+
+    def snapshot(self, name: str) -> dict[tuple, float]:
+        """Current values of one metric keyed by sorted label tuples"""
+        with self._lock:
+            return dict(self._values.get(name, {}))
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            values = {name: dict(series) for name, series in self._values.items()}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                values.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+        lines = []
+        for name, series in values.items():
+            kind, help_text = self._meta.get(name, ("untyped", ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("devorch_jobs_total", "counter", "Finished generation jobs by kind and status")
+metrics.describe("devorch_llm_calls_total", "counter", "LLM calls by graph node")
+metrics.describe("devorch_llm_tokens_total", "counter", "LLM tokens by graph node and kind (prompt, completion, cached)")
+metrics.describe("devorch_llm_cost_usd_total", "counter", "Estimated LLM cost in USD")
+metrics.describe("devorch_budget_stops_total", "counter", "Jobs stopped early by a token or time budget")
+metrics.describe("devorch_structured_retries_total", "counter", "Rejected planner/architect outputs by graph node")
+metrics.describe("devorch_wasted_tokens_total", "counter", "Estimated tokens spent on rejected outputs by graph node")
+
+
+def cached_ratio_samples():
+    """Share of prompt tokens served from the provider's prompt cache, per node, since start"""
+    tokens = metrics.snapshot("devorch_llm_tokens_total")
+    samples = []
+    for labels, prompt in tokens.items():
+        labels = dict(labels)
+        if labels.get("kind") != "prompt" or not prompt:
+            continue
+        cached = tokens.get(tuple(sorted({**labels, "kind": "cached"}.items())), 0)
+        samples.append(("devorch_llm_cached_ratio", {"node": labels["node"]}, cached / prompt))
+    return samples
+
+
+metrics.describe("devorch_llm_cached_ratio", "gauge", "Cached share of prompt tokens by graph node")
+metrics.add_collector(cached_ratio_samples)
+
+
+metrics.describe("devorch_first_preview_seconds_total", "counter", "Sum of the seconds from job start to the first index.html write")
+metrics.describe("devorch_first_previews_total", "counter", "Jobs that wrote a preview entry (index.html)")
+metrics.describe("devorch_first_preview_last_seconds", "gauge", "Time to first preview of the latest job")
+
+
+def record_first_preview(seconds: float):
+    """Counts one job's time to first preview; the average is the ratio of the two counters"""
+    metrics.inc("devorch_first_preview_seconds_total", seconds)
+    metrics.inc("devorch_first_previews_total")
+    metrics.set("devorch_first_preview_last_seconds", seconds)
+
+
+def record_usage(usage: dict, kind: str, status: str):
+    """Adds one finished job's usage report (see agent.usage.UsageTracker.report) to the counters"""
+    metrics.inc("devorch_jobs_total", kind=kind, status=status)
+    if not usage:
+        return
+    for node, counts in usage.get("by_node", {}).items():
+        metrics.inc("devorch_llm_calls_total", counts["calls"], node=node)
+        for token_kind in ("prompt", "completion", "cached"):
+            metrics.inc("devorch_llm_tokens_total", counts[f"{token_kind}_tokens"], node=node, kind=token_kind)
+    metrics.inc("devorch_llm_cost_usd_total", usage.get("cost_usd", 0))
+    for node, retries in usage.get("retries", {}).items():
+        metrics.inc("devorch_structured_retries_total", retries, node=node)
+        metrics.inc("devorch_wasted_tokens_total", usage["wasted_tokens"].get(node, 0), node=node)
+    if usage.get("budget_exceeded"):
+        metrics.inc("devorch_budget_stops_total")
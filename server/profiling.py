@@ -0,0 +1,228 @@
+"""
+On-demand profiling for live workers.
+
+``StackSampler`` is a pure-Python sampling profiler: a background thread reads
+every other thread's current frame (``sys._current_frames``) at a fixed
+interval and counts identical stacks. Its output is the "collapsed stacks"
+format understood by flamegraph.pl, speedscope and inferno. Sampling can be
+restricted to the threads currently running a given job (see ``job_thread``).
+
+``MemoryTracker`` wraps tracemalloc with named snapshots and diffs, to find
+what keeps growing in long-lived workers.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Optional
+
+from agent.tools import STATE_DIR
+
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", STATE_DIR / "profiles"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+PROFILE_MAX_DEPTH = 128
+
+# Threads currently working on each job; graph nodes run inline on the job's thread
+_job_threads: dict[str, set[int]] = {}
+_job_threads_lock = threading.Lock()
+
+
+@contextmanager
+def job_thread(job_id: str):
+    """Marks the calling thread as running job_id for the duration of the block"""
+    ident = threading.get_ident()
+    with _job_threads_lock:
+        _job_threads.setdefault(job_id, set()).add(ident)
+    try:
+        yield
+    finally:
+        with _job_threads_lock:
+            threads = _job_threads.get(job_id, set())
+            threads.discard(ident)
+            if not threads:
+                _job_threads.pop(job_id, None)
+
+
+def job_threads(job_id: str) -> set[int]:
+    with _job_threads_lock:
+        return set(_job_threads.get(job_id, ()))
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for prefix in sys.path:
+        if prefix and filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    # ';' separates frames in the collapsed format (the count follows the last space)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+
+
+class StackSampler:
+    """Samples the stacks of other threads every interval seconds"""
+
+    def __init__(self, interval: float = 0.005, threads: Optional[Callable[[], set[int]]] = None):
+        self.interval = max(0.001, interval)
+        self.threads = threads
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.started: Optional[float] = None
+        self.stopped: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StackSampler":
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped = time.monotonic()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        names: dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            wanted = self.threads() if self.threads is not None else None
+            frames = sys._current_frames()
+            if any(ident not in names for ident in frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own or (wanted is not None and ident not in wanted):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)).replace(";", ","))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, one "frame;frame;frame count" line per distinct stack"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+    def summary(self) -> dict:
+        leaf = Counter()
+        for stack, count in self.counts.items():
+            leaf[stack.rsplit(";", 1)[-1]] += count
+        total = sum(self.counts.values()) or 1
+        return {
+            "samples": self.samples,
+            "stacks": len(self.counts),
+            "seconds": round((self.stopped or time.monotonic()) - (self.started or time.monotonic()), 3),
+            "interval": self.interval,
+            "top_frames": [{"frame": f, "share": round(c / total, 4)} for f, c in leaf.most_common(20)],
+        }
+
+
+def save_profile(name: str, sampler: StackSampler) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / f"{name}.folded"
+    path.write_text(sampler.collapsed(), encoding="utf-8")
+    return path
+
+
+def load_profile(name: str) -> Optional[str]:
+    path = PROFILE_DIR / f"{name}.folded"
+    return path.read_text(encoding="utf-8") if path.exists() else None
+
+
+class MemoryTracker:
+    """tracemalloc snapshots kept by id for later diffing"""
+
+    def __init__(self, max_snapshots: int = 8):
+        self.max_snapshots = max_snapshots
+        self.snapshots: OrderedDict[str, tuple[float, tracemalloc.Snapshot]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 25):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop(self):
+        tracemalloc.stop()
+        with self._lock:
+            self.snapshots.clear()
+
+    def status(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory() if self.tracing else (0, 0)
+        return {
+            "tracing": self.tracing,
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "snapshots": list(self.snapshots),
+        }
+
+    def snapshot(self) -> str:
+        if not self.tracing:
+            raise RuntimeError("tracemalloc is not running; start it first")
+        snap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        with self._lock:
+            self._counter += 1
+            snapshot_id = f"s{self._counter}"
+            self.snapshots[snapshot_id] = (time.time(), snap)
+            while len(self.snapshots) > self.max_snapshots:
+                self.snapshots.popitem(last=False)
+        return snapshot_id
+
+    def _get(self, snapshot_id: str) -> tracemalloc.Snapshot:
+        with self._lock:
+            if snapshot_id not in self.snapshots:
+                raise KeyError(snapshot_id)
+            return self.snapshots[snapshot_id][1]
+
+    def top(self, snapshot_id: str, key: str = "lineno", limit: int = 25) -> list[dict]:
+        stats = self._get(snapshot_id).statistics(key)
+        return [{"where": _trace_location(s.traceback), "size_bytes": s.size, "count": s.count}
+                for s in stats[:limit]]
+
+    def diff(self, base_id: str, target_id: str, key: str = "lineno", limit: int = 25) -> list[dict]:
+        stats = self._get(target_id).compare_to(self._get(base_id), key)
+        return [{"where": _trace_location(s.traceback), "size_diff_bytes": s.size_diff, "size_bytes": s.size,
+                 "count_diff": s.count_diff, "count": s.count} for s in stats[:limit]]
+
+
+def _trace_location(traceback: tracemalloc.Traceback) -> list[str]:
+    return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+
+
+memory_tracker = MemoryTracker()
+
+
+async def profile_window(seconds: float, interval: float = 0.005, job_id: Optional[str] = None) -> StackSampler:
+    """
+    Samples for up to seconds (capped at PROFILE_MAX_SECONDS). With job_id only
+    the job's threads are sampled and sampling ends early when the job finishes.
+    """
+    threads = (lambda: job_threads(job_id)) if job_id else None
+    sampler = StackSampler(interval, threads).start()
+    deadline = time.monotonic() + min(seconds, PROFILE_MAX_SECONDS)
+    try:
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
+            if job_id and not job_threads(job_id):
+                break
+    finally:
+        await asyncio.to_thread(sampler.stop)
+    return sampler
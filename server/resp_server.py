@@ -0,0 +1,234 @@
+"""
+A small in-memory server speaking the Redis protocol (RESP2).
+
+It implements only the commands RedisBackend uses, so the multi-node state
+backend can be exercised locally without installing Redis:
+
+    python -m server.resp_server --port 6380
+    STATE_BACKEND_URL=redis://127.0.0.1:6380/0 python app.py
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+
+
+class _Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data: dict[bytes, object] = {}
+        self.expires: dict[bytes, float] = {}
+
+    def _expire(self, key: bytes):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+    def get(self, key: bytes):
+        self._expire(key)
+        return self.data.get(key)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        queued = None  # commands between MULTI and EXEC
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            command = args[0].upper() if args else b""
+            if command == b"MULTI":
+                queued, reply = [], _Simple("OK")
+            elif command == b"EXEC":
+                reply = _CommandError("EXEC without MULTI") if queued is None else self.server.execute_all(queued)
+                queued = None
+            elif command == b"DISCARD":
+                reply = _CommandError("DISCARD without MULTI") if queued is None else _Simple("OK")
+                queued = None
+            elif queued is not None:
+                queued.append(args)
+                reply = _Simple("QUEUED")
+            else:
+                try:
+                    reply = self.server.dispatch(args)
+                except _CommandError as e:
+                    reply = e
+            self.wfile.write(_encode(reply))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            header = self.rfile.readline()
+            length = int(header[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+
+class _CommandError(Exception):
+    pass
+
+
+class _Simple(str):
+    pass
+
+
+def _encode(value) -> bytes:
+    if isinstance(value, _CommandError):
+        return b"-ERR " + str(value).encode() + b"\r\n"
+    if isinstance(value, _Simple):
+        return b"+" + value.encode() + b"\r\n"
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+    raise TypeError(value)
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    """In-memory RESP server for local testing of RedisBackend"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=("127.0.0.1", 6380)):
+        super().__init__(address, _Handler)
+        self.store = _Store()
+
+    def _handler(self, args: list[bytes]):
+        command = args[0].upper().decode()
+        handler = getattr(self, f"cmd_{command.lower()}", None)
+        if handler is None:
+            raise _CommandError(f"unknown command '{command}'")
+        return handler
+
+    def dispatch(self, args: list[bytes]):
+        handler = self._handler(args)
+        with self.store.lock:
+            return handler(*args[1:])
+
+    def execute_all(self, commands: list[list[bytes]]) -> list:
+        """EXEC: runs queued commands without other clients' commands in between"""
+        replies = []
+        with self.store.lock:
+            for args in commands:
+                try:
+                    replies.append(self._handler(args)(*args[1:]))
+                except _CommandError as e:
+                    replies.append(e)
+        return replies
+
+    def cmd_ping(self, *args):
+        return _Simple("PONG")
+
+    def cmd_select(self, db):
+        return _Simple("OK")
+
+    def cmd_get(self, key):
+        value = self.store.get(key)
+        if value is not None and not isinstance(value, bytes):
+            raise _CommandError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def cmd_set(self, key, value, *options):
+        options = [o.upper() for o in options]
+        if b"NX" in options and self.store.get(key) is not None:
+            return None
+        self.store.data[key] = value
+        self.store.expires.pop(key, None)
+        if b"PX" in options:
+            self.store.expires[key] = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+        elif b"EX" in options:
+            self.store.expires[key] = time.monotonic() + int(options[options.index(b"EX") + 1])
+        return _Simple("OK")
+
+    def cmd_pexpire(self, key, ms):
+        if self.store.get(key) is None:
+            return 0
+        self.store.expires[key] = time.monotonic() + int(ms) / 1000
+        return 1
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self.store.get(key) is not None:
+                removed += 1
+            self.store.data.pop(key, None)
+            self.store.expires.pop(key, None)
+        return removed
+
+    def cmd_hset(self, key, *pairs):
+        h = self.store.get(key)
+        if h is None:
+            h = self.store.data[key] = {}
+        added = 0
+        for i in range(0, len(pairs), 2):
+            added += pairs[i] not in h
+            h[pairs[i]] = pairs[i + 1]
+        return added
+
+    def cmd_hgetall(self, key):
+        h = self.store.get(key) or {}
+        return [item for pair in h.items() for item in pair]
+
+    def cmd_rpush(self, key, *values):
+        items = self.store.get(key)
+        if items is None:
+            items = self.store.data[key] = []
+        items.extend(values)
+        return len(items)
+
+    def cmd_llen(self, key):
+        return len(self.store.get(key) or [])
+
+    def cmd_ltrim(self, key, start, stop):
+        items = self.store.get(key)
+        if items is None:
+            return _Simple("OK")
+        start, stop = int(start), int(stop)
+        start = max(len(items) + start, 0) if start < 0 else start
+        stop = len(items) + stop if stop < 0 else stop
+        items[:] = items[start:stop + 1]
+        return _Simple("OK")
+
+    def cmd_lset(self, key, index, value):
+        items = self.store.get(key)
+        if not items:
+            raise _CommandError("no such key")
+        index = int(index)
+        if not -len(items) <= index < len(items):
+            raise _CommandError("index out of range")
+        items[index] = value
+        return _Simple("OK")
+
+    def cmd_lrange(self, key, start, stop):
+        items = self.store.get(key) or []
+        start, stop = int(start), int(stop)
+        stop = len(items) - 1 if stop < 0 else stop
+        return items[start:stop + 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local RESP stand-in for the Redis state backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+    with RespServer((args.host, args.port)) as server:
+        print(f"RESP stand-in listening on {args.host}:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
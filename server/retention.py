@@ -0,0 +1,384 @@
+"""
+Retention and disk quota for generated workspaces.
+
+The workspaces under ``GENERATED_PROJECT_DIRECTORY`` (one directory per batch
+job) are swept on a low-priority background thread:
+
+- every workspace is compacted: caches and build leftovers
+  (``RETENTION_COMPACT_NAMES``, stale ``*.tmp`` files) are removed;
+- a workspace not viewed or written for ``RETENTION_MAX_AGE_DAYS`` is removed;
+- a workspace still larger than ``RETENTION_MAX_PROJECT_MB`` after compaction
+  is removed;
+- while all workspaces together exceed ``RETENTION_DISK_QUOTA_MB``, the least
+  recently viewed ones are removed.
+
+The preview workspace (``generated_project``) is never removed, and the live
+preview may load files from its caches (``node_modules`` scripts, for
+instance). So only its inactive caches are compacted: those nothing changed
+since the last job in the workspace started, i.e. leftovers of earlier
+projects. Workspaces of jobs that are still running, or whose workspace lock
+is held, are left alone; the sweep's own claim on a workspace is renewed for
+as long as it works on it. With several workers, the sweep runs on one of them per
+interval (a state backend lock held for the interval decides which). Removed
+workspaces are dropped from the search index and the blob store, and the blob
+store is garbage-collected after the sweep.
+"""
+
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+from agent.tools import STATE_DIR
+from server.jobs import workspace_record
+from server.metrics import metrics
+from server.state import TERMINAL_STATUSES, StateBackend
+
+RETENTION_ENABLED = os.getenv("RETENTION", "true").lower() == "true"
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "600"))
+# 0 disables the policy
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "14"))
+RETENTION_MAX_PROJECT_MB = float(os.getenv("RETENTION_MAX_PROJECT_MB", "0"))
+RETENTION_DISK_QUOTA_MB = float(os.getenv("RETENTION_DISK_QUOTA_MB", "0"))
+RETENTION_COMPACT_NAMES = [n.strip() for n in os.getenv(
+    "RETENTION_COMPACT_NAMES", "__pycache__,.pytest_cache,.mypy_cache,.cache,node_modules"
+).split(",") if n.strip()]
+RETENTION_DB_PATH = Path(os.getenv("RETENTION_DB_PATH", STATE_DIR / "retention.db"))
+# The sweep's workspace lock; refreshed every third of it while held
+CLAIM_TTL = 60.0
+# A view is recorded at most this often per workspace
+TOUCH_INTERVAL = 60.0
+# Left between two removals so the sweep never hogs the disk or the GIL
+SWEEP_PAUSE = 0.05
+
+
+@dataclass
+class Workspace:
+    name: str
+    path: Path
+    size: int
+    modified: float
+    viewed: float
+    removable: bool
+
+    @property
+    def last_used(self) -> float:
+        return max(self.modified, self.viewed)
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "size_bytes": self.size, "modified": round(self.modified, 1),
+                "viewed": round(self.viewed, 1) or None, "removable": self.removable}
+
+
+def scan(path: Path) -> tuple[int, float]:
+    """Apparent size in bytes and newest modification time of a directory tree"""
+    size, newest = 0, 0.0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            size += st.st_size
+            newest = max(newest, st.st_mtime)
+    return size, newest
+
+
+def lower_thread_priority():
+    """Makes the calling thread nice (Linux schedules threads individually)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+class RetentionManager:
+    """Sweeps generated workspaces against the age, size and quota policies"""
+
+    def __init__(self, backend: StateBackend, projects_dir: Path, preview_dir: Path,
+                 interval: float = RETENTION_INTERVAL_SECONDS, max_age_days: float = RETENTION_MAX_AGE_DAYS,
+                 max_project_mb: float = RETENTION_MAX_PROJECT_MB, quota_mb: float = RETENTION_DISK_QUOTA_MB,
+                 db_path: Path = RETENTION_DB_PATH):
+        self.backend = backend
+        self.projects_dir = Path(projects_dir)
+        self.preview_dir = Path(preview_dir)
+        self.interval = interval
+        self.max_age = max_age_days * 86400
+        self.max_project_bytes = int(max_project_mb * 2**20)
+        self.quota_bytes = int(quota_mb * 2**20)
+        self.db_path = Path(db_path)
+        self.owner = f"retention:{os.getpid()}"
+        self.last_report: Optional[dict] = None
+        self._local = threading.local()
+        self._touched: dict[str, float] = {}
+        self._sweep_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- views ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # Connections must not cross a fork (supervisor workers)
+        if conn is None or self._local.pid != os.getpid():
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS views (name TEXT PRIMARY KEY, viewed REAL NOT NULL)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def touch(self, name: str):
+        """Records that workspace name (a batch job id, or "generated_project") was viewed"""
+        now = time.time()
+        if now - self._touched.get(name, 0) < TOUCH_INTERVAL:
+            return
+        self._touched[name] = now
+        try:
+            self._connect().execute("INSERT OR REPLACE INTO views (name, viewed) VALUES (?, ?)", (name, now))
+        except sqlite3.Error as e:
+            print(f"Could not record view of {name}: {e}")
+
+    # ---------- sweep ----------
+
+    def workspaces(self) -> list[Workspace]:
+        views = dict(self._connect().execute("SELECT name, viewed FROM views"))
+        found = []
+        if self.preview_dir.is_dir():
+            size, modified = scan(self.preview_dir)
+            found.append(Workspace(self.preview_dir.name, self.preview_dir, size, modified,
+                                   views.get(self.preview_dir.name, 0.0), removable=False))
+        if self.projects_dir.is_dir():
+            for path in sorted(self.projects_dir.iterdir()):
+                # batches/ holds the batch result files, removed along with their workspace
+                if not path.is_dir() or path.name == "batches" or path.name.startswith("."):
+                    continue
+                size, modified = scan(path)
+                found.append(Workspace(path.name, path, size, modified or path.stat().st_mtime,
+                                       views.get(path.name, 0.0), removable=True))
+        return found
+
+    def last_job(self, workspace: Workspace) -> Optional[dict]:
+        """The job that last wrote to the workspace: the batch job it is named after, or the recorded one"""
+        job = self.backend.get_job(workspace.name)
+        if job is None:
+            job_id = (self.backend.get_job(workspace_record(workspace.name)) or {}).get("job")
+            job = self.backend.get_job(job_id) if job_id else None
+        return job
+
+    def claim(self, workspace: Workspace) -> bool:
+        """Takes the workspace lock unless a job holds it or is still running in the workspace"""
+        lock = f"workspace:{workspace.name}"
+        if not self.backend.acquire_lock(lock, self.owner, CLAIM_TTL):
+            return False
+        job = self.last_job(workspace)
+        if job is not None and job.get("status") not in TERMINAL_STATUSES:
+            self.backend.release_lock(lock, self.owner)
+            return False
+        return True
+
+    @contextmanager
+    def claimed(self, workspace: Workspace) -> Iterator[bool]:
+        """Whether claim succeeded; the lock is refreshed until the block ends, then released"""
+        if not self.claim(workspace):
+            yield False
+            return
+        lock = f"workspace:{workspace.name}"
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(CLAIM_TTL / 3):
+                self.backend.acquire_lock(lock, self.owner, CLAIM_TTL)
+
+        thread = threading.Thread(target=heartbeat, name="retention-claim", daemon=True)
+        thread.start()
+        try:
+            yield True
+        finally:
+            stop.set()
+            thread.join()
+            self.backend.release_lock(lock, self.owner)
+
+    def compact(self, path: Path, older_than: Optional[float] = None) -> int:
+        """
+        Removes caches and stale temporary files under path; returns the bytes
+        freed. With ``older_than``, only caches nothing in changed since then go.
+        """
+        freed = 0
+        cutoff = time.time() - 3600
+        if older_than is not None:
+            cutoff = min(cutoff, older_than)
+        for root, dirs, files in os.walk(path):
+            for name in [d for d in dirs if d in RETENTION_COMPACT_NAMES]:
+                dirs.remove(name)
+                size, newest = scan(Path(root) / name)
+                if older_than is not None and newest >= older_than:
+                    continue
+                freed += size
+                shutil.rmtree(Path(root) / name, ignore_errors=True)
+            for name in files:
+                file = Path(root) / name
+                if name.endswith(".tmp"):
+                    try:
+                        st = file.stat()
+                        if st.st_mtime < cutoff:
+                            file.unlink()
+                            freed += st.st_size
+                    except OSError:
+                        pass
+        return freed
+
+    def remove(self, workspace: Workspace):
+        from agent.blobstore import BLOB_STORE_ENABLED, blob_store
+        from agent.search import SEARCH_INDEX_ENABLED, search_index
+
+        shutil.rmtree(workspace.path, ignore_errors=True)
+        (self.projects_dir / "batches" / f"{workspace.name}.jsonl").unlink(missing_ok=True)
+        if BLOB_STORE_ENABLED:
+            blob_store.release(workspace.path.resolve())
+        if SEARCH_INDEX_ENABLED:
+            search_index.drop_project(workspace.path)
+        self._connect().execute("DELETE FROM views WHERE name = ?", (workspace.name,))
+
+    def sweep(self, dry_run: bool = False, force: bool = False) -> Optional[dict]:
+        """
+        Runs one pass of the policies. Returns the report, or None when another
+        worker swept within the interval (unless force).
+        """
+        if not force and not self.backend.acquire_lock("retention:sweep", self.owner, self.interval):
+            return None
+        with self._sweep_lock:
+            started = time.time()
+            removed, compacted_bytes = [], 0
+            remaining = []
+            for workspace in self.workspaces():
+                if self._stop.is_set():
+                    break
+                with self.claimed(workspace) as claimed:
+                    if not claimed:
+                        remaining.append(workspace)
+                        continue
+                    if not dry_run:
+                        # The live preview keeps the caches its current project may use
+                        older_than = None
+                        if not workspace.removable:
+                            older_than = (self.last_job(workspace) or {}).get("started", 0.0)
+                        freed = self.compact(workspace.path, older_than)
+                        compacted_bytes += freed
+                        workspace.size -= freed
+                    reason = None
+                    if workspace.removable and self.max_age and started - workspace.last_used > self.max_age:
+                        reason = "age"
+                    elif workspace.removable and self.max_project_bytes and workspace.size > self.max_project_bytes:
+                        reason = "size"
+                    if reason:
+                        self._remove(workspace, reason, dry_run, removed)
+                    else:
+                        remaining.append(workspace)
+
+            total = sum(w.size for w in remaining)
+            if self.quota_bytes and total > self.quota_bytes:
+                # Least recently viewed (or written) first
+                for workspace in sorted((w for w in remaining if w.removable), key=lambda w: w.last_used):
+                    if total <= self.quota_bytes or self._stop.is_set():
+                        break
+                    with self.claimed(workspace) as claimed:
+                        if not claimed:
+                            continue
+                        self._remove(workspace, "quota", dry_run, removed)
+                    remaining.remove(workspace)
+                    total -= workspace.size
+
+            blob_gc = None
+            if removed and not dry_run:
+                from agent.blobstore import BLOB_STORE_ENABLED, blob_store
+                if BLOB_STORE_ENABLED:
+                    blob_gc = blob_store.gc()
+
+            report = {
+                "time": round(started, 1),
+                "seconds": round(time.time() - started, 3),
+                "dry_run": dry_run,
+                "removed": removed,
+                "compacted_bytes": compacted_bytes,
+                "freed_bytes": compacted_bytes + sum(r["size_bytes"] for r in removed),
+                "total_bytes": total,
+                "quota_bytes": self.quota_bytes or None,
+                "blob_gc": blob_gc,
+                "workspaces": [w.to_dict() for w in sorted(remaining, key=lambda w: w.last_used, reverse=True)],
+            }
+            if not dry_run:
+                self.last_report = report
+                metrics.inc("devorch_retention_freed_bytes_total", report["freed_bytes"])
+                for entry in removed:
+                    metrics.inc("devorch_retention_removed_total", reason=entry["reason"])
+            return report
+
+    def _remove(self, workspace: Workspace, reason: str, dry_run: bool, removed: list):
+        print(f"Retention: {'would remove' if dry_run else 'removing'} {workspace.name} "
+              f"({reason}, {workspace.size / 2**20:.1f} MiB)")
+        if not dry_run:
+            self.remove(workspace)
+            time.sleep(SWEEP_PAUSE)
+        removed.append({**workspace.to_dict(), "reason": reason})
+
+    # ---------- background thread ----------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            lower_thread_priority()
+            while not self._stop.wait(self.interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"Retention sweep failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def metric_samples(self):
+        report = self.last_report
+        if report is None:
+            return []
+        samples = [
+            ("devorch_workspace_disk_bytes", {"scope": "all"}, report["total_bytes"]),
+            ("devorch_workspaces", {}, len(report["workspaces"])),
+            ("devorch_retention_last_sweep_timestamp", {}, report["time"]),
+        ]
+        preview = [w for w in report["workspaces"] if not w["removable"]]
+        if preview:
+            samples.append(("devorch_workspace_disk_bytes", {"scope": "preview"}, preview[0]["size_bytes"]))
+        if self.quota_bytes:
+            samples.append(("devorch_workspace_disk_quota_bytes", {}, self.quota_bytes))
+        return samples
+
+
+metrics.describe("devorch_workspace_disk_bytes", "gauge", "Apparent size of the generated workspaces at the last sweep")
+metrics.describe("devorch_workspaces", "gauge", "Generated workspaces on disk at the last sweep")
+metrics.describe("devorch_workspace_disk_quota_bytes", "gauge", "RETENTION_DISK_QUOTA_MB in bytes")
+metrics.describe("devorch_retention_last_sweep_timestamp", "gauge", "Unix time of this worker's last retention sweep")
+metrics.describe("devorch_retention_removed_total", "counter", "Workspaces removed by retention, by policy")
+metrics.describe("devorch_retention_freed_bytes_total", "counter", "Bytes freed by retention (removal and compaction)")
@@ -0,0 +1,439 @@
+"""
+Pluggable shared state for jobs, progress events and workspace locks.
+
+Every uvicorn/gunicorn worker (and every node, with the Redis backend) sees the
+same job records and offset-indexed event logs, so any worker can serve the
+progress of any job. Two implementations are provided:
+
+* ``SQLiteBackend`` - a single SQLite file in WAL mode, for one node.
+* ``RedisBackend`` - plain RESP commands over a socket, for several nodes.
+  ``server.resp_server`` is a small local stand-in that speaks the same protocol.
+
+Event logs of finished jobs are compacted into a snapshot event (see
+``compact_events``) without changing the offsets clients resume from.
+
+Select one with STATE_BACKEND_URL (``sqlite:///path/to/state.db`` or
+``redis://host:port/db``).
+"""
+
+import asyncio
+import json
+import select
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from urllib.parse import urlparse
+
+TERMINAL_STATUSES = {"success", "error", "cancelled"}
+# Redis commands that leave the same state when applied twice; only these are
+# resent after a connection failure, since a lost reply does not tell whether
+# the server executed the command (a repeated RPUSH would duplicate an event)
+REDIS_RETRYABLE = {"GET", "SET", "DEL", "PEXPIRE", "HSET", "HGETALL", "LRANGE", "LTRIM", "LSET"}
+
+
+def snapshot_event(events: list[tuple[int, dict]]) -> dict:
+    """
+    Condenses (offset, event) pairs 0..n-1 into one "snapshot" event stored at offset n-1.
+
+    ``messages[i]`` is the message of the event that had offset i, so a client
+    resuming from offset k only needs ``messages[k:]``.
+    """
+    return {
+        "type": "snapshot",
+        "message": f"{len(events)} earlier events compacted",
+        "messages": [event.get("message", "") for _, event in events],
+        "steps": [event.get("step") for _, event in events],
+    }
+
+
+class StateBackend(ABC):
+    """Shared job status, event stream and lock storage"""
+
+    @abstractmethod
+    def set_job(self, job_id: str, **fields):
+        """Merges fields into the job record, creating it if needed"""
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """Returns the job record or None"""
+
+    @abstractmethod
+    def append_event(self, job_id: str, event: dict) -> int:
+        """Appends an event to the job's log and returns its offset"""
+
+    @abstractmethod
+    def read_events(self, job_id: str, offset: int = 0) -> list[tuple[int, dict]]:
+        """Returns (offset, event) pairs at or after offset"""
+
+    @abstractmethod
+    def compact_events(self, job_id: str) -> int:
+        """
+        Replaces all but the last event with a snapshot event, keeping offsets stable.
+        Returns the number of events removed.
+        """
+
+    @abstractmethod
+    def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """Takes or refreshes a lock; returns False if another owner holds it"""
+
+    @abstractmethod
+    def release_lock(self, name: str, owner: str):
+        """Releases the lock if owner still holds it"""
+
+    def close(self):
+        pass
+
+
+async def tail_events(backend: StateBackend, job_id: str, offset: int = 0,
+                      poll_interval: float = 0.25) -> AsyncIterator[tuple[int, dict]]:
+    """Yields a job's events from offset on until the job reaches a terminal status"""
+    while True:
+        events = await asyncio.to_thread(backend.read_events, job_id, offset)
+        for event_offset, event in events:
+            offset = event_offset + 1
+            yield event_offset, event
+        if not events:
+            job = await asyncio.to_thread(backend.get_job, job_id)
+            if job is None or job.get("status") in TERMINAL_STATUSES:
+                # One more read closes the gap between the last poll and the status change
+                for event_offset, event in await asyncio.to_thread(backend.read_events, job_id, offset):
+                    yield event_offset, event
+                return
+            await asyncio.sleep(poll_interval)
+
+
+# ==================== SQLite ====================
+
+class SQLiteBackend(StateBackend):
+    """Single-node backend on a WAL-mode SQLite file shared by all worker processes"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS events (
+                    job_id TEXT NOT NULL, offset INTEGER NOT NULL, data TEXT NOT NULL,
+                    PRIMARY KEY (job_id, offset)
+                );
+                CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def _commit(self, conn: sqlite3.Connection, ok: bool):
+        conn.execute("COMMIT" if ok else "ROLLBACK")
+
+    def set_job(self, job_id: str, **fields):
+        conn = self._transaction()
+        ok = False
+        try:
+            row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            data = json.loads(row[0]) if row else {"job_id": job_id}
+            data.update(fields)
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, data, updated) VALUES (?, ?, ?)",
+                (job_id, json.dumps(data), time.time()),
+            )
+            ok = True
+        finally:
+            self._commit(conn, ok)
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def append_event(self, job_id: str, event: dict) -> int:
+        conn = self._transaction()
+        ok = False
+        try:
+            (offset,) = conn.execute(
+                "SELECT COALESCE(MAX(offset) + 1, 0) FROM events WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO events (job_id, offset, data) VALUES (?, ?, ?)",
+                (job_id, offset, json.dumps(event)),
+            )
+            ok = True
+        finally:
+            self._commit(conn, ok)
+        return offset
+
+    def read_events(self, job_id: str, offset: int = 0) -> list[tuple[int, dict]]:
+        rows = self._connect().execute(
+            "SELECT offset, data FROM events WHERE job_id = ? AND offset >= ? ORDER BY offset",
+            (job_id, offset),
+        ).fetchall()
+        return [(o, json.loads(d)) for o, d in rows]
+
+    def compact_events(self, job_id: str) -> int:
+        conn = self._transaction()
+        ok = False
+        removed = 0
+        try:
+            rows = conn.execute(
+                "SELECT offset, data FROM events WHERE job_id = ? ORDER BY offset", (job_id,)
+            ).fetchall()
+            events = [(o, json.loads(d)) for o, d in rows]
+            if len(events) > 2 and events[0][1].get("type") != "snapshot":
+                # events[:-1] become one snapshot at the offset of the second-to-last event
+                last_kept = events[-2][0]
+                conn.execute("DELETE FROM events WHERE job_id = ? AND offset <= ?", (job_id, last_kept))
+                conn.execute(
+                    "INSERT INTO events (job_id, offset, data) VALUES (?, ?, ?)",
+                    (job_id, last_kept, json.dumps(snapshot_event(events[:-1]))),
+                )
+                removed = len(events) - 2
+            ok = True
+        finally:
+            self._commit(conn, ok)
+        return removed
+
+    def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        conn = self._transaction()
+        acquired = False
+        try:
+            row = conn.execute("SELECT owner, expires FROM locks WHERE name = ?", (name,)).fetchone()
+            if row is None or row[0] == owner or row[1] < now:
+                conn.execute(
+                    "INSERT OR REPLACE INTO locks (name, owner, expires) VALUES (?, ?, ?)",
+                    (name, owner, now + ttl),
+                )
+                acquired = True
+        finally:
+            self._commit(conn, True)
+        return acquired
+
+    def release_lock(self, name: str, owner: str):
+        self._connect().execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# ==================== Redis protocol ====================
+
+class RespError(Exception):
+    """Error reply from a RESP server"""
+
+
+class RespConnection:
+    """Minimal blocking RESP2 client: just enough for the state backend"""
+
+    def __init__(self, host: str, port: int, db: int = 0, timeout: float = 10):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile("rb")
+        if db:
+            self.execute("SELECT", db)
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def execute(self, *args):
+        self.sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def transaction(self, *commands) -> list:
+        """Runs commands atomically with MULTI/EXEC, sent in one round trip; returns their replies"""
+        self.sock.sendall(b"".join(self._encode(args) for args in (("MULTI",), *commands, ("EXEC",))))
+        # Read every reply first so an error never leaves unread replies on the socket
+        replies = []
+        for _ in range(len(commands) + 2):
+            try:
+                replies.append(self._read_reply())
+            except RespError as e:
+                replies.append(e)
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        if replies[-1] is None:
+            raise RespError("Transaction aborted")
+        return replies[-1]
+
+    def stale(self) -> bool:
+        """Whether the server closed this connection while it sat idle"""
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            return bool(readable) and not self.sock.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+    def _read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("RESP server closed the connection")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)[:-2]
+            return data.decode("utf-8")
+        if kind == b"*":
+            length = int(rest)
+            if length < 0:
+                return None
+            items, error = [], None
+            for _ in range(length):
+                try:
+                    items.append(self._read_reply())
+                except RespError as e:
+                    error = error or e
+            if error is not None:
+                raise error
+            return items
+        raise RespError(f"Unexpected reply: {line!r}")
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+class RedisBackend(StateBackend):
+    """Multi-node backend using Redis (or any RESP server supporting the same commands)"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0, prefix: str = "devorch"):
+        self.host, self.port, self.db, self.prefix = host, port, db, prefix
+        self._local = threading.local()
+
+    def _conn(self) -> RespConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = RespConnection(self.host, self.port, self.db)
+            self._local.conn = conn
+        return conn
+
+    def _send(self, commands: list[tuple], transaction: bool = False):
+        def run(conn: RespConnection):
+            return conn.transaction(*commands) if transaction else conn.execute(*commands[0])
+
+        conn = self._conn()
+        if conn.stale():
+            # Dropped while idle (server restart, idle timeout): reconnect before sending anything
+            conn.close()
+            self._local.conn = None
+            conn = self._conn()
+        try:
+            return run(conn)
+        except (ConnectionError, OSError):
+            self._local.conn = None
+            # Failed mid-command: resend only if applying it twice is harmless
+            if any(str(command[0]).upper() not in REDIS_RETRYABLE for command in commands):
+                raise
+            return run(self._conn())
+
+    def _execute(self, *args):
+        return self._send([args])
+
+    def _transaction(self, *commands: tuple) -> list:
+        """Runs commands atomically (MULTI/EXEC) in one round trip"""
+        return self._send(list(commands), transaction=True)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def set_job(self, job_id: str, **fields):
+        args = [self._key("job", job_id), "job_id", json.dumps(job_id)]
+        for name, value in fields.items():
+            args += [name, json.dumps(value)]
+        self._execute("HSET", *args)
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        flat = self._execute("HGETALL", self._key("job", job_id))
+        if not flat:
+            return None
+        return {flat[i]: json.loads(flat[i + 1]) for i in range(0, len(flat), 2)}
+
+    def _events_base(self, job_id: str) -> int:
+        # Offset of the first list element; nonzero once the log has been compacted
+        return int(self._execute("GET", self._key("events_base", job_id)) or 0)
+
+    def append_event(self, job_id: str, event: dict) -> int:
+        length = self._execute("RPUSH", self._key("events", job_id), json.dumps(event))
+        return self._events_base(job_id) + length - 1
+
+    def read_events(self, job_id: str, offset: int = 0) -> list[tuple[int, dict]]:
+        base = self._events_base(job_id)
+        start = max(offset - base, 0)
+        items = self._execute("LRANGE", self._key("events", job_id), start, -1) or []
+        return [(base + start + i, json.loads(item)) for i, item in enumerate(items)]
+
+    def compact_events(self, job_id: str) -> int:
+        # Only called for finished jobs, which receive no further appends
+        events = self.read_events(job_id, 0)
+        if len(events) <= 2 or events[0][1].get("type") == "snapshot":
+            return 0
+        key = self._key("events", job_id)
+        # One transaction: a reader never sees the trimmed list with the old base offset
+        self._transaction(
+            ("LTRIM", key, -2, -1),
+            ("LSET", key, 0, json.dumps(snapshot_event(events[:-1]))),
+            ("SET", self._key("events_base", job_id), events[-2][0]),
+        )
+        return len(events) - 2
+
+    def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        key = self._key("lock", name)
+        ttl_ms = int(ttl * 1000)
+        if self._execute("SET", key, owner, "NX", "PX", ttl_ms) == "OK":
+            return True
+        if self._execute("GET", key) == owner:
+            self._execute("PEXPIRE", key, ttl_ms)
+            return True
+        return False
+
+    def release_lock(self, name: str, owner: str):
+        key = self._key("lock", name)
+        if self._execute("GET", key) == owner:
+            self._execute("DEL", key)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_backend(url: str) -> StateBackend:
+    """Builds a backend from a sqlite:/// or redis:// URL"""
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        # sqlite:///relative/path.db or sqlite:////absolute/path.db
+        return SQLiteBackend(url[len("sqlite:///"):])
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip("/") or 0)
+        return RedisBackend(parsed.hostname or "127.0.0.1", parsed.port or 6379, db)
+    raise ValueError(f"Unsupported state backend URL: {url}")
@@ -0,0 +1,301 @@
+"""
+Pre-fork supervisor and worker memory monitoring.
+
+In supervisor mode (``python app.py --supervisor``) the master process imports
+the application and the agent graph once, freezes the garbage collector so
+the preloaded objects stay shared copy-on-write, binds the listening socket
+and forks uvicorn workers that all accept on it.
+
+Every worker runs a ``WorkerMonitor`` that samples its RSS and counts finished
+jobs. Once a worker passes ``max_jobs`` or ``max_rss_mb`` it tells the master,
+which forks a replacement right away, and then drains: it stops accepting
+connections, lets open requests finish, waits for its running generations
+and exits. Clients following a job over WebSocket resume on another worker
+from their last event offset.
+
+The monitor also runs without a supervisor and reports RSS in /metrics.
+"""
+
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from server.metrics import metrics
+
+WORKER_MONITOR_INTERVAL = float(os.getenv("WORKER_MONITOR_INTERVAL", "10"))
+# RSS samples kept per worker (one per WORKER_MONITOR_INTERVAL)
+WORKER_RSS_HISTORY = int(os.getenv("WORKER_RSS_HISTORY", "360"))
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def jobs_handled() -> int:
+    """Jobs (and batch items) this process has finished, from the job counters"""
+    return int(sum(metrics.snapshot("devorch_jobs_total").values()))
+
+
+class WorkerMonitor:
+    """Samples RSS over time and asks for a recycle once a worker is past its limits"""
+
+    def __init__(self, interval: float = WORKER_MONITOR_INTERVAL, history: int = WORKER_RSS_HISTORY):
+        self.interval = interval
+        self.history: deque[tuple[float, int]] = deque(maxlen=history)
+        self.peak = 0
+        self.started = time.time()
+        self.max_jobs = 0
+        self.max_rss_bytes = 0
+        self.on_recycle: Optional[Callable[[str], None]] = None
+        self.recycling: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def configure(self, max_jobs: int = 0, max_rss_mb: int = 0, on_recycle: Optional[Callable[[str], None]] = None):
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.on_recycle = on_recycle
+
+    def recycle_reason(self, rss: int) -> Optional[str]:
+        if self.max_jobs and jobs_handled() >= self.max_jobs:
+            return f"handled {jobs_handled()} jobs (limit {self.max_jobs})"
+        if self.max_rss_bytes and rss >= self.max_rss_bytes:
+            return f"RSS {rss / 2**20:.0f} MiB over the limit of {self.max_rss_bytes / 2**20:.0f} MiB"
+        return None
+
+    def sample(self) -> int:
+        rss = rss_bytes()
+        self.history.append((time.time(), rss))
+        self.peak = max(self.peak, rss)
+        reason = self.recycle_reason(rss)
+        if reason and self.recycling is None and self.on_recycle is not None:
+            self.recycling = reason
+            print(f"Worker {os.getpid()} recycling: {reason}")
+            self.on_recycle(reason)
+        return rss
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.started = time.time()
+        self._stop.clear()
+        self.sample()
+
+        def loop():
+            while not self._stop.wait(self.interval):
+                self.sample()
+
+        self._thread = threading.Thread(target=loop, name="worker-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def report(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "jobs_handled": jobs_handled(),
+            "rss_bytes": rss_bytes(),
+            "peak_rss_bytes": self.peak,
+            "max_jobs": self.max_jobs or None,
+            "max_rss_bytes": self.max_rss_bytes or None,
+            "recycling": self.recycling,
+            "history": [{"time": round(t, 1), "rss_bytes": rss} for t, rss in self.history],
+        }
+
+    def metric_samples(self):
+        return [
+            ("devorch_process_rss_bytes", {}, rss_bytes()),
+            ("devorch_process_rss_peak_bytes", {}, self.peak),
+            ("devorch_worker_uptime_seconds", {}, time.time() - self.started),
+            ("devorch_worker_jobs_handled", {}, jobs_handled()),
+            ("devorch_worker_recycling", {}, 1 if self.recycling else 0),
+        ]
+
+
+worker_monitor = WorkerMonitor()
+metrics.describe("devorch_process_rss_bytes", "gauge", "Resident set size of this worker")
+metrics.describe("devorch_process_rss_peak_bytes", "gauge", "Highest RSS sampled in this worker")
+metrics.describe("devorch_worker_uptime_seconds", "gauge", "Seconds since this worker started")
+metrics.describe("devorch_worker_jobs_handled", "gauge", "Jobs finished by this worker")
+metrics.describe("devorch_worker_recycling", "gauge", "1 while this worker drains before a recycle")
+metrics.add_collector(worker_monitor.metric_samples)
+
+
+class Supervisor:
+    """Pre-fork master: preloads the app, forks workers on a shared socket and replaces recycled ones"""
+
+    def __init__(self, app: str, host: str, port: int, workers: int, max_jobs: int = 0, max_rss_mb: int = 0,
+                 drain_timeout: float = 300, preload: Optional[Callable[[], None]] = None, log_level: str = "info"):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.drain_timeout = drain_timeout
+        self.preload = preload
+        self.log_level = log_level
+        self.children: dict[int, float] = {}
+        self.draining: set[int] = set()
+        self.stopping = False
+        self.reload = False
+        self._fast_failures = 0
+
+    def bind(self) -> socket.socket:
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def run(self):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("Supervisor mode needs os.fork (not available on this platform)")
+        if self.preload is not None:
+            try:
+                self.preload()
+            except Exception as e:
+                print(f"Supervisor: preloading failed, workers will import lazily: {e}")
+        # Keep preloaded objects out of future collections so their pages stay shared after fork
+        gc.collect()
+        gc.freeze()
+
+        self.sock = self.bind()
+        self.notify_r, self.notify_w = os.pipe()
+        os.set_blocking(self.notify_r, False)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        print(f"Supervisor {os.getpid()} listening on {self.host}:{self.port} with {self.workers} workers")
+
+        for _ in range(self.workers):
+            self.spawn()
+        try:
+            self.loop()
+        finally:
+            self.sock.close()
+
+    def _on_stop(self, signum, frame):
+        self.stopping = True
+
+    def _on_reload(self, signum, frame):
+        self.reload = True
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.run_worker()
+            except BaseException as e:
+                print(f"Worker {os.getpid()} crashed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = time.monotonic()
+
+    def run_worker(self):
+        import uvicorn
+
+        os.close(self.notify_r)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(signum, signal.SIG_DFL)
+        gc.enable()
+        config = uvicorn.Config(self.app, log_level=self.log_level, lifespan="on",
+                                timeout_graceful_shutdown=self.drain_timeout)
+        server = uvicorn.Server(config)
+
+        def recycle(reason: str):
+            os.write(self.notify_w, f"{os.getpid()}\n".encode())
+            server.should_exit = True
+
+        worker_monitor.configure(self.max_jobs, self.max_rss_mb, recycle)
+        server.run(sockets=[self.sock])
+
+    def read_notifications(self) -> list[int]:
+        try:
+            data = os.read(self.notify_r, 4096)
+        except BlockingIOError:
+            return []
+        return [int(line) for line in data.split() if line.strip().isdigit()]
+
+    def live_workers(self) -> int:
+        return len([pid for pid in self.children if pid not in self.draining])
+
+    def loop(self):
+        stop_deadline = None
+        while self.children or not self.stopping:
+            for pid in self.read_notifications():
+                if pid in self.children and pid not in self.draining:
+                    self.draining.add(pid)
+
+            if self.reload:
+                self.reload = False
+                print("Supervisor: recycling all workers")
+                for pid in list(self.children):
+                    if pid not in self.draining:
+                        self.draining.add(pid)
+                        os.kill(pid, signal.SIGTERM)
+
+            if self.stopping and stop_deadline is None:
+                print("Supervisor: stopping, draining workers")
+                stop_deadline = time.monotonic() + self.drain_timeout + 10
+                for pid in self.children:
+                    os.kill(pid, signal.SIGTERM)
+            if stop_deadline is not None and time.monotonic() > stop_deadline:
+                for pid in self.children:
+                    os.kill(pid, signal.SIGKILL)
+                stop_deadline = time.monotonic() + 5
+
+            self.reap()
+            if not self.stopping:
+                while self.live_workers() < self.workers:
+                    self.spawn()
+            time.sleep(0.2)
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            started = self.children.pop(pid, time.monotonic())
+            if pid in self.draining:
+                self.draining.discard(pid)
+                print(f"Supervisor: worker {pid} recycled")
+                continue
+            if self.stopping:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            print(f"Supervisor: worker {pid} exited unexpectedly ({code})")
+            # Back off when workers die right after starting instead of fork-looping
+            self._fast_failures = self._fast_failures + 1 if time.monotonic() - started < 5 else 0
+            if self._fast_failures:
+                time.sleep(min(30, 2 ** self._fast_failures))
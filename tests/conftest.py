@@ -0,0 +1,87 @@
+"""
+Shared fixtures. No test calls the LLM provider: agent.graph is importable with
+a dummy GROQ_API_KEY and its model is replaced by FakeLLM where needed. Local
+state (plan index, blob store, search index) goes to a temporary directory.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+os.environ.setdefault("DEVORCH_STATE_DIR", tempfile.mkdtemp(prefix="devorch-tests-"))
+os.environ.setdefault("LANGCHAIN_VERBOSE", "false")
+os.environ.setdefault("LANGCHAIN_DEBUG", "false")
+
+from agent.tools import use_project_root  # noqa: E402
+from agent.usage import current_tracker  # noqa: E402
+
+
+class _ToolCallChunk:
+    def __init__(self, args: str):
+        self.tool_call_chunks = [{"index": 0, "args": args}]
+
+
+class _FakeStructured:
+    def __init__(self, llm: "FakeLLM", schema: str):
+        self.llm, self.schema = llm, schema
+
+    def stream(self, prompt, *args, **kwargs):
+        # Like agent.usage.usage_callback, refuse to start a call once the job's budget is used up
+        tracker = current_tracker()
+        if tracker is not None:
+            tracker.check()
+        self.llm.calls.append((self.schema, prompt))
+        queue = self.llm.responses[self.schema]
+        output = queue.pop(0) if len(queue) > 1 else queue[0]
+        text = output if isinstance(output, str) else json.dumps(output)
+        for i in range(0, len(text), self.llm.chunk_chars):
+            yield _ToolCallChunk(text[i:i + self.llm.chunk_chars])
+
+
+class FakeLLM:
+    """
+    Streams canned tool-call arguments for forced structured output.
+
+    responses maps a schema name to the outputs of successive calls (dicts or raw
+    JSON strings); the last one repeats. calls records (schema name, prompt).
+    """
+
+    def __init__(self, responses: dict, chunk_chars: int = 40):
+        self.responses = {name: out if isinstance(out, list) else [out] for name, out in responses.items()}
+        self.chunk_chars = chunk_chars
+        self.calls: list[tuple[str, str]] = []
+
+    def bind_tools(self, tools, **kwargs):
+        return _FakeStructured(self, tools[0].__name__)
+
+
+PLAN = {
+    "name": "calculator",
+    "description": "A browser calculator",
+    "techstack": "html, css, javascript",
+    "features": ["arithmetic"],
+    "files": [{"path": "index.html", "purpose": "markup"}, {"path": "script.js", "purpose": "logic"}],
+}
+STEPS = [
+    {"filepath": "script.js", "task_description": "Implement add, subtract, multiply and divide"},
+    {"filepath": "index.html", "task_description": "Markup with buttons that load script.js"},
+]
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    """An empty workspace that the file tools write into"""
+    with use_project_root(tmp_path / "workspace") as root:
+        yield root
+
+
+@pytest.fixture
+def blueprint():
+    return {"plan": json.loads(json.dumps(PLAN)), "implementation_steps": json.loads(json.dumps(STEPS))}
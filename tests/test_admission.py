@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agent.batch import BatchItem, run_batch
+from server.admission import (
+    AdmissionController, AdmissionRejected, batch_admitter, client_address, parse_networks,
+)
+
+
+def controller(**overrides) -> AdmissionController:
+    options = dict(rate_limit_requests=100, rate_limit_period=60, max_concurrent=2,
+                   max_queued=4, max_queue_wait=5)
+    return AdmissionController(**{**options, **overrides})
+
+
+def test_forwarded_for_is_ignored_from_untrusted_peers():
+    trusted = parse_networks("10.0.0.1, 172.16.0.0/12")
+    assert client_address("203.0.113.7", "1.2.3.4", trusted) == "203.0.113.7"
+    assert client_address("10.0.0.1", "1.2.3.4", trusted) == "1.2.3.4"
+    # A spoofed left-most hop is skipped: the right-most untrusted hop is the client
+    assert client_address("10.0.0.1", "6.6.6.6, 1.2.3.4, 172.17.0.2", trusted) == "1.2.3.4"
+    assert client_address("10.0.0.1", "172.17.0.2", trusted) == "172.17.0.2"
+    assert client_address(None, "1.2.3.4", []) == "unknown"
+
+
+def test_rate_limit_rejects_with_retry_after():
+    admission = controller(rate_limit_requests=1, rate_limit_period=60)
+    admission.check_rate("a")
+    with pytest.raises(AdmissionRejected) as e:
+        admission.check_rate("a")
+    assert e.value.status_code == 429 and e.value.retry_after >= 1
+    admission.check_rate("b")
+
+
+def test_queue_full_and_slot_handover():
+    async def scenario():
+        admission = controller(max_concurrent=1, max_queued=1)
+        release = await admission.acquire("a")
+        queued = asyncio.ensure_future(admission.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as e:
+            await admission.acquire("c")
+        assert e.value.status_code == 503
+        release()
+        release()  # idempotent
+        (await queued)()
+        assert admission.status()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_busy_workspace_waits_without_taking_a_slot():
+    async def scenario():
+        admission = controller(max_concurrent=2)
+        first = await admission.acquire("a", exclusive="generated_project")
+        second = asyncio.ensure_future(admission.acquire("b", exclusive="generated_project"))
+        await asyncio.sleep(0)
+        assert not second.done()
+        assert (admission.status()["active"], admission.status()["queued"]) == (1, 1)
+
+        # The free slot goes to a request for another workspace
+        batch = await asyncio.wait_for(admission.acquire("c"), 1)
+        assert admission.status()["active"] == 2
+
+        first()
+        release_second = await asyncio.wait_for(second, 1)
+        assert admission.status()["active"] == 2
+        batch()
+        release_second()
+        assert admission.status()["active"] == 0 and admission.status()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_wait_times_out():
+    async def scenario():
+        admission = controller(max_concurrent=1, max_queue_wait=0.05)
+        await admission.acquire("a", exclusive="w")
+        with pytest.raises(AdmissionRejected) as e:
+            await admission.acquire("b", exclusive="w")
+        assert e.value.status_code == 503
+        assert admission.status()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+class CountingGraph:
+    """Tracks how many batch items run at the same time"""
+
+    def __init__(self):
+        self.running = self.peak = 0
+        self.lock = threading.Lock()
+
+    def invoke(self, state, config):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return {}
+
+
+def test_batch_items_share_the_concurrency_limit(tmp_path):
+    items = [BatchItem(id=str(i), prompt=f"p{i}") for i in range(4)]
+
+    async def run(admission, release_batch):
+        graph = CountingGraph()
+        admit = batch_admitter(admission, release_batch, asyncio.get_running_loop())
+        results = await asyncio.to_thread(run_batch, items, tmp_path / "out", 3, None, graph, admit)
+        await asyncio.sleep(0.01)  # slot releases are scheduled on the loop
+        assert len(results) == 4
+        return graph.peak
+
+    async def scenario():
+        admission = controller(max_concurrent=2)
+        single = await admission.acquire("a")
+        # One slot is taken by a single generation: parallelism 3 runs one item at a time
+        assert await run(admission, await admission.acquire("b")) == 1
+        assert admission.status()["active"] == 1
+        single()
+        assert await run(admission, await admission.acquire("b")) == 2
+        assert admission.status()["active"] == 0 and admission.status()["queued"] == 0
+
+    asyncio.run(scenario())
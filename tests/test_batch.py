@@ -0,0 +1,74 @@
+import json
+import threading
+
+import pytest
+from langchain_core.caches import InMemoryCache
+from langchain_core.globals import get_llm_cache, set_llm_cache
+
+from agent.batch import batch_llm_cache, load_prompts, run_batch
+from agent.tools import get_project_root
+
+
+class FakeGraph:
+    """Records the workspace each run sees and whether the LLM cache is installed"""
+
+    def __init__(self):
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def invoke(self, state, config):
+        if state["user_prompt"] == "fail":
+            raise RuntimeError("boom")
+        with self.lock:
+            self.seen[state["user_prompt"]] = (get_project_root(), get_llm_cache())
+        return {}
+
+
+def test_load_prompts(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text('"a calculator"\n\n{"prompt": "a todo app", "id": "todo", "mode": "fast", "team": "x"}\n',
+                    encoding="utf-8")
+    first, second = load_prompts(path)
+    assert (first.id, first.prompt, first.mode) == ("0001", "a calculator", "auto")
+    assert (second.id, second.mode, second.extra) == ("todo", "fast", {"team": "x"})
+
+    path.write_text('{"id": "x"}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="prompts.jsonl:1"):
+        load_prompts(path)
+
+
+def test_run_batch_isolates_workspaces_and_scopes_the_cache(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text("\n".join(json.dumps({"prompt": p, "id": "same"}) for p in ("one", "two", "fail")),
+                    encoding="utf-8")
+    graph = FakeGraph()
+    reported = []
+
+    results = run_batch(load_prompts(path), tmp_path / "out", parallelism=3, on_result=reported.append, graph=graph)
+
+    assert sorted(r["status"] for r in results) == ["error", "success", "success"]
+    assert reported == results
+    workspaces = {graph.seen["one"][0], graph.seen["two"][0]}
+    assert len(workspaces) == 2 and all(w.parent == tmp_path / "out" for w in workspaces)
+    cache = graph.seen["one"][1]
+    assert isinstance(cache, InMemoryCache) and cache._maxsize == 1000
+    # The cache only exists while the batch runs
+    assert get_llm_cache() is None
+
+
+def test_batch_cache_is_shared_by_overlapping_batches_and_keeps_foreign_caches():
+    with batch_llm_cache(max_entries=5):
+        cache = get_llm_cache()
+        with batch_llm_cache():
+            assert get_llm_cache() is cache
+        assert get_llm_cache() is cache
+    assert get_llm_cache() is None
+
+    configured = InMemoryCache()
+    set_llm_cache(configured)
+    try:
+        with batch_llm_cache():
+            assert get_llm_cache() is configured
+        assert get_llm_cache() is configured
+    finally:
+        set_llm_cache(None)
@@ -0,0 +1,107 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+import agent.blobstore as blobstore
+from agent.blobstore import BlobStore
+
+CONTENT = "body { margin: 0; }\n"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Stands in for a reflink-capable filesystem (btrfs, xfs): a clone is an independent copy
+    monkeypatch.setattr(blobstore, "_reflink", shutil.copyfile)
+    return BlobStore(tmp_path / "blobs")
+
+
+def test_workspaces_never_share_a_file(store, tmp_path):
+    first, second = tmp_path / "one" / "style.css", tmp_path / "two" / "style.css"
+    digest = store.write(first, CONTENT)
+    assert store.write(second, CONTENT) == digest
+    assert store.materialize(digest, tmp_path / "three.css") == "reflink"
+
+    # In-place edits (npm, formatters, a user's editor) stay in their own workspace
+    with open(first, "a", encoding="utf-8") as f:
+        f.write("p { color: red; }\n")
+    assert second.read_text(encoding="utf-8") == CONTENT
+    assert first.stat().st_ino != second.stat().st_ino
+    assert store.get(digest).decode() == CONTENT
+    assert store.counters["deduplicated"] == 1
+    assert store.checkout_path(digest).stat().st_mode & 0o777 == 0o444
+
+
+def test_store_is_bypassed_where_links_do_not_work(tmp_path, monkeypatch):
+    def unsupported(src, dst):
+        raise OSError("FICLONE not supported")
+
+    monkeypatch.setattr(blobstore, "_reflink", unsupported)
+    store = BlobStore(tmp_path / "blobs")
+    for workspace in ("one", "two"):
+        store.write(tmp_path / workspace / "style.css", CONTENT)
+
+    # A blob plus a full copy would cost more than the file: nothing is stored
+    assert (tmp_path / "two" / "style.css").read_text(encoding="utf-8") == CONTENT
+    assert store.counters["direct"] == 2
+    assert store.stats()["blobs"] == 0 and not (tmp_path / "blobs" / "checkout").exists()
+    assert list((tmp_path / "one").iterdir()) == [tmp_path / "one" / "style.css"]
+
+
+def test_hardlinks_are_opt_in_and_skip_a_corrupted_checkout(tmp_path):
+    store = BlobStore(tmp_path / "blobs", link="hardlink")
+    first = tmp_path / "one" / "style.css"
+    digest = store.write(first, CONTENT)
+    assert first.stat().st_ino == store.checkout_path(digest).stat().st_ino
+
+    # Someone makes the shared inode writable and edits it through a workspace
+    os.chmod(first, 0o644)
+    first.write_text("corrupted", encoding="utf-8")
+    second = tmp_path / "two" / "style.css"
+    store.write(second, CONTENT)
+    assert second.read_text(encoding="utf-8") == CONTENT
+    assert store.checkout_path(digest).read_text(encoding="utf-8") == CONTENT
+
+
+def test_unchanged_writes_and_gc(store, tmp_path):
+    path = tmp_path / "one" / "app.js"
+    store.write(path, "let a = 1;")
+    store.write(path, "let a = 1;")
+    assert store.counters["unchanged"] == 1
+
+    path.unlink()
+    result = store.gc(grace_seconds=0)
+    assert result["stale_refs"] == 1 and result["blobs_deleted"] == 1
+    assert store.stats()["blobs"] == 0
+
+
+def test_gc_keeps_a_blob_reused_while_it_runs(store, tmp_path):
+    data = b"shared boilerplate"
+    digest = store.put(data)
+    store._connect().execute("UPDATE blobs SET last_used = 0")
+
+    class ReuseBeforeDelete:
+        """Connection proxy: another thread writes the blob right after gc selected it"""
+
+        def __init__(self, conn):
+            self.conn, self.reused = conn, False
+
+        def __getattr__(self, name):
+            return getattr(self.conn, name)
+
+        def execute(self, sql, *args):
+            if sql == "BEGIN IMMEDIATE" and not self.reused:
+                self.reused = True
+                thread = threading.Thread(target=lambda: store.materialize(store.put(data), tmp_path / "a.txt"))
+                thread.start()
+                thread.join()
+            return self.conn.execute(sql, *args)
+
+    conn = store._connect()
+    store._local.conn = ReuseBeforeDelete(conn)
+    try:
+        assert store.gc(grace_seconds=0)["blobs_deleted"] == 0
+    finally:
+        store._local.conn = conn
+    assert store.get(digest) == data and (tmp_path / "a.txt").read_bytes() == data
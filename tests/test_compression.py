@@ -0,0 +1,111 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+
+import server.compression as compression
+from server.compression import CompressionMiddleware, StaticAssets, accepts, choose_encoding, is_compressible
+
+
+@pytest.fixture(autouse=True)
+def gzip_only(monkeypatch):
+    # Same results whether or not the optional brotli package is installed
+    monkeypatch.setattr(compression, "brotli", None)
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("br") is None
+    assert choose_encoding("gzip;q=0, *;q=1") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("") is None
+    assert is_compressible("application/json; charset=utf-8") and is_compressible("text/html")
+    assert not is_compressible("image/png")
+
+
+def run(app, accept_encoding="gzip"):
+    """Calls the middleware-wrapped ASGI app and returns the messages it sent"""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=100)(scope, receive, send))
+    return sent
+
+
+def responder(*chunks, content_type=b"application/json"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", content_type)]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+def test_small_and_binary_bodies_are_sent_as_they_are():
+    start, body = run(responder(b'{"ok": true}'))
+    assert b"content-encoding" not in dict(start["headers"]) and body["body"] == b'{"ok": true}'
+    start, body = run(responder(b"x" * 500, content_type=b"image/png"))
+    assert b"content-encoding" not in dict(start["headers"])
+
+
+def test_complete_bodies_above_the_threshold_are_gzipped():
+    data = b'{"items": [' + b'"item", ' * 100 + b'"end"]}'
+    start, body = run(responder(data))
+    headers = dict(start["headers"])
+    assert headers[b"content-encoding"] == b"gzip" and headers[b"vary"] == b"Accept-Encoding"
+    assert int(headers[b"content-length"]) == len(body["body"])
+    assert gzip.decompress(body["body"]) == data
+
+
+def test_streamed_chunks_are_flushed_one_by_one():
+    chunks = [b'{"event": %d}\n' % i for i in range(3)]
+    start, *bodies = run(responder(*chunks, content_type=b"application/x-ndjson"))
+    assert dict(start["headers"])[b"content-encoding"] == b"gzip"
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # Each chunk can be decoded as soon as it arrives
+    for chunk, message in zip(chunks, bodies):
+        assert decompressor.decompress(message["body"]) == chunk
+    assert not bodies[-1]["more_body"] and decompressor.eof
+
+
+def test_static_assets_are_hashed_precompressed_and_cacheable(tmp_path):
+    (tmp_path / "app.js").write_text("console.log('hello');\n" * 50, encoding="utf-8")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG" + bytes(64))
+    assets = StaticAssets(tmp_path)
+
+    url = assets.url("app.js")
+    assert url.startswith("/assets/app.") and url.endswith(".js")
+    assert assets.url("missing.js") == "/static/missing.js"
+    assert assets.rewrite_html('<script src="/static/app.js"></script>') == f'<script src="{url}"></script>'
+
+    hashed = url.removeprefix("/assets/")
+    response = assets.response(hashed, "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"].endswith("immutable")
+    assert gzip.decompress(response.body).startswith(b"console.log")
+    assert "content-encoding" not in assets.response(hashed, "identity").headers
+    assert assets.response(hashed, "gzip", response.headers["etag"]).status_code == 304
+    assert assets.response("app.000000000000.js", "gzip").status_code == 404
+    # Not compressible: only the original is kept
+    assert list(assets.build()["logo.png"].variants) == ["identity"]
+
+
+def test_asset_without_a_br_variant_is_not_gzipped_for_a_br_only_client(tmp_path, monkeypatch):
+    (tmp_path / "app.js").write_text("console.log('hello');\n" * 50, encoding="utf-8")
+    assets = StaticAssets(tmp_path)
+    hashed = assets.url("app.js").removeprefix("/assets/")
+    # brotli installed, but this asset was built without a br variant
+    monkeypatch.setattr(compression, "brotli", object())
+    assert accepts("br", "br") and not accepts("br", "gzip") and accepts("br, *;q=0.5", "gzip")
+
+    response = assets.response(hashed, "br")
+    assert "content-encoding" not in response.headers
+    assert response.body.startswith(b"console.log")
+    assert assets.response(hashed, "br, gzip").headers["content-encoding"] == "gzip"
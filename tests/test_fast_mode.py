@@ -0,0 +1,44 @@
+import pytest
+
+import agent.graph as graph
+from conftest import FakeLLM
+
+
+@pytest.mark.parametrize("state, expected", [
+    ({"user_prompt": "Build a calculator app", "mode": "fast"}, "fast"),
+    ({"user_prompt": "Build a calculator app", "mode": "full"}, "full"),
+    ({"user_prompt": "Build a calculator app"}, "fast"),
+    ({"user_prompt": "Build a calculator app", "mode": "auto"}, "fast"),
+    ({"user_prompt": "Build a todo app with a FastAPI backend"}, "full"),
+    ({"user_prompt": "Build a blog with login and a database"}, "full"),
+    ({"user_prompt": " ".join(["word"] * (graph.FAST_MODE_MAX_WORDS + 1))}, "full"),
+])
+def test_select_mode(state, expected):
+    assert graph.select_mode(state) == expected
+
+
+def test_fast_planner_makes_one_call(monkeypatch, workspace, blueprint):
+    llm = FakeLLM({"ProjectBlueprint": blueprint})
+    monkeypatch.setattr(graph, "llm", llm)
+
+    update = graph.fast_planner_agent({"user_prompt": "Build a calculator app", "reuse_plans": False})
+
+    assert [schema for schema, _ in llm.calls] == ["ProjectBlueprint"]
+    assert update["plan"].name == "calculator"
+    assert [s.filepath for s in update["task_plan"].implementation_steps] == ["script.js", "index.html"]
+    assert update["task_plan"].plan == update["plan"]
+
+
+def test_full_mode_makes_two_calls(monkeypatch, workspace, blueprint):
+    llm = FakeLLM({"Plan": blueprint["plan"],
+                   "TaskPlan": {"implementation_steps": blueprint["implementation_steps"]}})
+    monkeypatch.setattr(graph, "llm", llm)
+    state = {"user_prompt": "Build a calculator app", "reuse_plans": False}
+
+    state.update(graph.planner_agent(state))
+    state.update(graph.architect_agent(state))
+
+    assert [schema for schema, _ in llm.calls] == ["Plan", "TaskPlan"]
+    assert state["task_plan"].plan.name == "calculator"
+    # The architect works from the planner's output
+    assert '"calculator"' in llm.calls[1][1]
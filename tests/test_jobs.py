@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+import server.jobs as jobs
+from agent.changes import file_changes
+from server.jobs import JobManager, describe_update
+from server.state import SQLiteBackend
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "EVENT_LOG_COMPACT_DELAY", 0)
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    yield JobManager(backend)
+    backend.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_run_publishes_progress_and_result(manager):
+    job_id = manager.create("Build a calculator", mode="fast")
+    updates = iter([
+        ("updates", {"plan_lookup": {"plan_source": "fresh"}}),
+        ("updates", {"validate": {"validation": {}, "status": "DONE"}}),
+        ("values", {"plan_source": "fresh"}),
+    ])
+    summary = manager.run(job_id, "w", updates)
+
+    assert summary["plan_source"] == "fresh"
+    assert manager.get(job_id)["status"] == "success"
+    # Compaction runs right away here and keeps the offsets of the last events
+    wait_for(lambda: manager.backend.read_events(job_id)[0][1]["type"] == "snapshot")
+    events = manager.backend.read_events(job_id)
+    assert events[0][1]["messages"][1:3] == ["Planning from scratch", "Validation passed"]
+    assert events[-1][1]["type"] == "complete" and events[-1][0] == 3
+
+
+def test_failed_run_emits_the_error_first(manager):
+    job_id = manager.create("x")
+
+    def updates():
+        yield "updates", {"planner": {}}
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        manager.run(job_id, "w", updates())
+    job = manager.get(job_id)
+    assert job["status"] == "error" and job["error"] == "provider down"
+
+
+def test_workspace_lock_serializes_jobs(manager):
+    first, second = manager.create("a"), manager.create("b")
+    acquired = threading.Event()
+
+    def run_second():
+        with manager.workspace_lock(second, "w"):
+            acquired.set()
+
+    with manager.workspace_lock(first, "w"):
+        thread = threading.Thread(target=run_second)
+        thread.start()
+        assert not acquired.wait(0.7)
+        messages = [e["message"] for _, e in manager.backend.read_events(second)]
+        assert messages == ["Waiting for the workspace to become free..."]
+    assert acquired.wait(2)
+    thread.join(2)
+    assert manager.backend.acquire_lock("workspace:w", "third", 1)
+
+
+def test_file_changes_become_events_and_first_preview_is_recorded(manager, tmp_path):
+    job_id = manager.create("x")
+    manager.backend.set_job(job_id, started=time.time())
+    with manager.forward_file_changes(job_id, tmp_path):
+        file_changes.publish(tmp_path, "script.js", "created")
+        file_changes.publish(tmp_path, "index.html", "created")
+        file_changes.publish(tmp_path / "other", "index.html", "created")
+
+    events = [e for _, e in manager.backend.read_events(job_id)]
+    assert [(e["type"], e["path"], e["kind"]) for e in events] == [
+        ("file", "script.js", "created"), ("file", "index.html", "created")]
+    assert manager.get(job_id)["time_to_first_preview"] >= 0
+
+
+def test_describe_update():
+    assert describe_update("template", {"template": "calculator"}) == "Seeded workspace from template 'calculator'"
+    assert describe_update("architect", {"budget_exceeded": "token budget of 10 exhausted"}) == \
+        "Stopped in architect: token budget of 10 exhausted"
+    assert describe_update("validate", {"validation": {"a.py": ["e"]}, "status": "REPAIR"}) == \
+        "Validation found problems in 1 files, repairing them"
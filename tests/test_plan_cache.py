@@ -0,0 +1,60 @@
+from agent.plan_cache import PlanIndex, jaccard, minhash, tokenize
+from agent.states import Plan, TaskPlan
+
+
+def make_plans(blueprint):
+    return Plan.model_validate(blueprint["plan"]), TaskPlan(implementation_steps=blueprint["implementation_steps"])
+
+
+def test_tokenize_drops_stopwords_and_plurals():
+    assert tokenize("Build a simple Calculator app with buttons") == {"calculator", "button"}
+
+
+def test_minhash_is_deterministic():
+    tokens = {"calculator", "button"}
+    assert minhash(tokens) == minhash(set(tokens))
+    assert jaccard({"a", "b"}, {"b", "c"}) == 1 / 3
+
+
+def test_lookup_finds_similar_prompt_and_persists(tmp_path, blueprint):
+    plan, task_plan = make_plans(blueprint)
+    index = PlanIndex(tmp_path / "index.json")
+    index.add("Build a calculator app with memory buttons", plan, task_plan)
+
+    match = index.lookup("Create a calculator with memory buttons")
+    assert match is not None and match.similarity == 1.0
+    assert match.task_plan.plan.name == "calculator"
+    assert PlanIndex(tmp_path / "index.json").lookup("calculator memory buttons") is not None
+    assert index.lookup("weather dashboard with charts") is None
+
+
+def test_same_prompt_replaces_entry_and_eviction_keeps_reused(tmp_path, blueprint):
+    plan, task_plan = make_plans(blueprint)
+    index = PlanIndex(tmp_path / "index.json", max_entries=2)
+    index.add("calculator app", plan, task_plan)
+    index.add("calculator app", plan, task_plan)
+    assert len(index) == 1
+
+    index.add("todo list", plan, task_plan)
+    index.lookup("todo list")
+    index.add("weather dashboard", plan, task_plan)
+    assert len(index) == 2
+    assert index.lookup("calculator app") is None
+    assert index.lookup("todo list").similarity == 1.0
+
+
+def test_workers_sharing_the_file_keep_each_others_entries_and_hits(tmp_path, blueprint):
+    plan, task_plan = make_plans(blueprint)
+    first = PlanIndex(tmp_path / "index.json", max_entries=2)
+    second = PlanIndex(tmp_path / "index.json", max_entries=2)
+    first.add("calculator app", plan, task_plan)
+    second.add("todo list", plan, task_plan)
+    assert len(PlanIndex(tmp_path / "index.json")) == 2
+
+    # Reuse seen by one worker protects the entry from eviction by another
+    first.lookup("todo list")
+    second.add("weather dashboard", plan, task_plan)
+    reloaded = PlanIndex(tmp_path / "index.json")
+    assert reloaded.lookup("calculator app") is None
+    assert reloaded.lookup("todo list") is not None
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,66 @@
+import asyncio
+
+from agent.changes import file_changes
+from server.jobs import JobManager, parse_version, tail_file_changes, workspace_record
+from server.state import SQLiteBackend
+
+
+async def collect(backend, version, count, timeout=5.0):
+    changes = []
+
+    async def read():
+        async for change in tail_file_changes(backend, "generated_project", version, poll_interval=0.01):
+            changes.append(change)
+            if len(changes) == count:
+                return
+
+    await asyncio.wait_for(read(), timeout)
+    return changes
+
+
+def write_files(manager, workspace, paths):
+    job_id = manager.create("x")
+    with manager.forward_file_changes(job_id, workspace):
+        for path in paths:
+            file_changes.publish(workspace, path, "created")
+    manager.backend.set_job(job_id, status="success")
+    return job_id
+
+
+def test_changes_reach_a_reader_in_another_worker(tmp_path):
+    # Two workers: separate backend connections to the same state file, no shared hub
+    writer = JobManager(SQLiteBackend(str(tmp_path / "state.db")))
+    reader = SQLiteBackend(str(tmp_path / "state.db"))
+    workspace = tmp_path / "generated_project"
+
+    first = write_files(writer, workspace, ["index.html", "style.css"])
+    version = reader.get_job(workspace_record("generated_project"))["version"]
+    assert parse_version(version) == (first, 2)
+
+    # A client that saw the first job only gets what the next job writes
+    second = write_files(writer, workspace, ["script.js"])
+    changes = asyncio.run(collect(reader, version, 1))
+    assert [(c["path"], c["version"].split(":")[0]) for c in changes] == [("script.js", second)]
+
+    # A client that has seen nothing replays the current job's files
+    changes = asyncio.run(collect(reader, None, 1))
+    assert changes[0]["path"] == "script.js" and changes[0]["version"] == f"{second}:0"
+
+
+def test_reader_follows_jobs_started_after_it_connected(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    manager = JobManager(backend)
+    workspace = tmp_path / "generated_project"
+
+    async def scenario():
+        changes = tail_file_changes(backend, "generated_project", None, poll_interval=0.01)
+        first = asyncio.ensure_future(anext(changes))
+        await asyncio.sleep(0.05)
+        await asyncio.to_thread(write_files, manager, workspace, ["index.html"])
+        paths = [(await asyncio.wait_for(first, 5))["path"]]
+        await asyncio.to_thread(write_files, manager, workspace, ["app.js"])
+        paths.append((await asyncio.wait_for(anext(changes), 5))["path"])
+        await changes.aclose()
+        return paths
+
+    assert asyncio.run(scenario()) == ["index.html", "app.js"]
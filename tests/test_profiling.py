@@ -0,0 +1,53 @@
+import threading
+import time
+
+import pytest
+
+from server.profiling import MemoryTracker, StackSampler, job_thread, job_threads
+
+
+def busy_wait_in_job(job_id: str, stop: threading.Event, ready: threading.Event):
+    with job_thread(job_id):
+        ready.set()
+        while not stop.is_set():
+            sum(range(1000))
+
+
+def test_sampler_only_samples_the_jobs_threads():
+    stop, ready = threading.Event(), threading.Event()
+    worker = threading.Thread(target=busy_wait_in_job, args=("job-1", stop, ready), name="job-worker")
+    worker.start()
+    ready.wait(2)
+    sampler = StackSampler(interval=0.002, threads=lambda: job_threads("job-1")).start()
+    time.sleep(0.2)
+    sampler.stop()
+    stop.set()
+    worker.join()
+
+    lines = sampler.collapsed().splitlines()
+    assert lines and all(line.startswith("job-worker;") for line in lines)
+    assert any("busy_wait_in_job (" in line for line in lines)
+    summary = sampler.summary()
+    assert summary["samples"] > 0 and summary["top_frames"][0]["share"] > 0
+    assert job_threads("job-1") == set()
+
+
+def test_memory_snapshots_and_diff():
+    tracker = MemoryTracker(max_snapshots=2)
+    with pytest.raises(RuntimeError):
+        tracker.snapshot()
+    tracker.start()
+    try:
+        base = tracker.snapshot()
+        grown = [bytearray(1024) for _ in range(200)]
+        target = tracker.snapshot()
+        diff = tracker.diff(base, target, limit=5)
+        assert diff and diff[0]["size_diff_bytes"] > 0
+        tracker.snapshot()
+        assert tracker.status()["snapshots"] == [target, "s3"]
+        with pytest.raises(KeyError):
+            tracker.top(base)
+        del grown
+    finally:
+        tracker.stop()
+    assert not tracker.status()["tracing"]
@@ -0,0 +1,41 @@
+import agent.graph as graph
+from agent.states import CoderState, ImplementationTask, Plan, TaskPlan
+
+
+class RecordingCoder:
+    def __init__(self):
+        self.messages = []
+
+    def invoke(self, inputs, *args, **kwargs):
+        self.messages.append(inputs["messages"])
+        return {"messages": []}
+
+
+def test_coder_prompt_prefix_is_identical_for_every_step(monkeypatch, workspace, blueprint):
+    coder = RecordingCoder()
+    monkeypatch.setattr(graph, "create_react_agent", lambda *a, **k: coder)
+    monkeypatch.setattr(graph, "CODER_SCHEDULER_ENABLED", False)
+    task_plan = TaskPlan(implementation_steps=blueprint["implementation_steps"])
+    task_plan.plan = Plan.model_validate(blueprint["plan"])
+    state = {"task_plan": task_plan}
+
+    for _ in task_plan.implementation_steps:
+        state.update(graph.coder_agent(state))
+    (workspace / "script.js").write_text("let x;", encoding="utf-8")
+    repair = TaskPlan(implementation_steps=[ImplementationTask(filepath="script.js", task_description="fix x")])
+    repair.plan = task_plan.plan
+    graph.coder_agent({**state, "task_plan": repair, "coder_state": CoderState(task_plan=repair)})
+
+    systems = [messages[0]["content"] for messages in coder.messages]
+    users = [messages[1]["content"] for messages in coder.messages]
+    assert len(systems) == 3 and len(set(systems)) == 1
+    # Everything that varies per step lives in the user message
+    assert "- index.html: markup" in systems[0] and "File: script.js" not in systems[0]
+    assert "File: script.js" in users[0] and "File: index.html" in users[1]
+    assert "let x;" in users[2]
+
+
+def test_coder_context_without_plan_lists_step_files(blueprint):
+    task_plan = TaskPlan(implementation_steps=blueprint["implementation_steps"])
+    context = graph.coder_context({"task_plan": task_plan})
+    assert "(not available)" in context and "- script.js\n- index.html" in context
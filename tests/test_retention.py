@@ -0,0 +1,126 @@
+import os
+import time
+
+import pytest
+
+import server.retention as retention_module
+from server.jobs import workspace_record
+from server.retention import RetentionManager
+from server.state import SQLiteBackend
+
+DAY = 86400
+
+
+def make_workspace(path, size=1000, age_days=0.0, cache=0):
+    path.mkdir(parents=True)
+    (path / "index.html").write_bytes(b"x" * size)
+    if cache:
+        (path / "node_modules" / "lib").mkdir(parents=True)
+        (path / "node_modules" / "lib" / "index.js").write_bytes(b"y" * cache)
+    stamp = time.time() - age_days * DAY
+    for root, _, files in os.walk(path):
+        for name in files:
+            os.utime(os.path.join(root, name), (stamp, stamp))
+    return path
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    return tmp_path / "generated_projects", tmp_path / "generated_project"
+
+
+def manager(tmp_path, dirs, **policies):
+    backend = SQLiteBackend(str(tmp_path / "state.db"))
+    options = {"max_age_days": 0, "max_project_mb": 0, "quota_mb": 0, **policies}
+    return RetentionManager(backend, *dirs, db_path=tmp_path / "retention.db", **options)
+
+
+def add_cache(workspace, name, size, age_days):
+    path = workspace / name / "data.bin"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"c" * size)
+    stamp = time.time() - age_days * DAY
+    os.utime(path, (stamp, stamp))
+
+
+def test_preview_only_loses_caches_its_current_project_does_not_use(tmp_path, dirs):
+    projects, preview = dirs
+    make_workspace(preview, cache=500)
+    add_cache(preview, ".cache", 300, age_days=3)
+    make_workspace(projects / "job1", cache=700)
+    retention = manager(tmp_path, dirs)
+    # The last generation in the preview started a day ago and has finished
+    retention.backend.set_job(workspace_record("generated_project"), job="gen1")
+    retention.backend.set_job("gen1", status="success", started=time.time() - DAY)
+
+    report = retention.sweep(force=True)
+    assert (preview / "node_modules" / "lib" / "index.js").exists()
+    assert not (preview / ".cache").exists()
+    assert not (projects / "job1" / "node_modules").exists()
+    assert report["compacted_bytes"] == 1000 and report["removed"] == []
+    assert {w["name"]: w["size_bytes"] for w in report["workspaces"]} == {"generated_project": 1500, "job1": 1000}
+
+    # Nothing is compacted while a generation runs in the preview
+    add_cache(preview, ".mypy_cache", 200, age_days=3)
+    retention.backend.set_job(workspace_record("generated_project"), job="gen2")
+    retention.backend.set_job("gen2", status="running", started=time.time())
+    assert retention.sweep(force=True)["compacted_bytes"] == 0
+    assert (preview / ".mypy_cache").exists()
+
+
+def test_claim_is_renewed_during_long_compactions(tmp_path, dirs, monkeypatch):
+    projects, _ = dirs
+    make_workspace(projects / "job1", cache=100)
+    monkeypatch.setattr(retention_module, "CLAIM_TTL", 0.3)
+    retention = manager(tmp_path, dirs)
+    taken_over = []
+
+    def slow_compact(path, older_than=None):
+        time.sleep(0.8)
+        taken_over.append(retention.backend.acquire_lock("workspace:job1", "job-worker", 1))
+        return 0
+
+    monkeypatch.setattr(retention, "compact", slow_compact)
+    retention.sweep(force=True)
+    assert taken_over == [False]
+    assert retention.backend.acquire_lock("workspace:job1", "job-worker", 1)
+
+
+def test_age_policy_and_dry_run(tmp_path, dirs):
+    projects, preview = dirs
+    make_workspace(preview, age_days=30)
+    make_workspace(projects / "old", age_days=30)
+    make_workspace(projects / "new")
+    retention = manager(tmp_path, dirs, max_age_days=14)
+
+    report = retention.sweep(dry_run=True, force=True)
+    assert [r["name"] for r in report["removed"]] == ["old"] and (projects / "old").exists()
+    # A view counts as use
+    retention.touch("old")
+    assert retention.sweep(force=True)["removed"] == []
+    retention._connect().execute("UPDATE views SET viewed = ?", (time.time() - 30 * DAY,))
+    assert [r["reason"] for r in retention.sweep(force=True)["removed"]] == ["age"]
+    assert not (projects / "old").exists() and preview.exists()
+
+
+def test_quota_removes_least_recently_used_and_skips_running_jobs(tmp_path, dirs):
+    projects, preview = dirs
+    make_workspace(preview, size=2 * 2**20)
+    make_workspace(projects / "oldest", size=2**20, age_days=3)
+    make_workspace(projects / "running", size=2**20, age_days=2)
+    make_workspace(projects / "newest", size=2**20, age_days=1)
+    retention = manager(tmp_path, dirs, quota_mb=4)
+    retention.backend.set_job("running", status="running")
+
+    report = retention.sweep(force=True)
+    assert [(r["name"], r["reason"]) for r in report["removed"]] == [("oldest", "quota")]
+    assert report["total_bytes"] == 4 * 2**20
+    assert (projects / "running").exists() and preview.exists()
+
+
+def test_one_sweep_per_interval_across_workers(tmp_path, dirs):
+    first, second = manager(tmp_path, dirs), manager(tmp_path, dirs)
+    second.owner = "retention:other-worker"
+    assert first.sweep() is not None
+    assert second.sweep() is None
+    assert second.sweep(force=True) is not None
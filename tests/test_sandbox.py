@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+import agent.sandbox as sandbox
+from agent.sandbox import SandboxPool, job_cpu_budget
+
+
+class FakeWorker:
+    started = 0
+
+    def __init__(self, ctx, limits):
+        FakeWorker.started += 1
+        self.dead = False
+        self.killed = False
+
+    def alive(self):
+        return not self.dead
+
+    def kill(self):
+        self.killed = True
+
+
+@pytest.fixture
+def fake_workers(monkeypatch):
+    FakeWorker.started = 0
+    monkeypatch.setattr(sandbox, "_Worker", FakeWorker)
+
+
+def acquire_in_thread(pool, timeout):
+    result = {}
+
+    def target():
+        try:
+            result["worker"] = pool._acquire(timeout)
+        except TimeoutError as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread, result
+
+
+def test_discard_wakes_a_waiting_acquire(fake_workers):
+    pool = SandboxPool(1)
+    busy = pool._acquire()
+    thread, result = acquire_in_thread(pool, timeout=10)
+    time.sleep(0.1)
+    assert thread.is_alive()
+
+    # A killed worker frees its slot; the waiter must start a replacement instead of hanging
+    started = time.monotonic()
+    pool._discard(busy)
+    thread.join(5)
+    assert not thread.is_alive() and time.monotonic() - started < 2
+    assert isinstance(result["worker"], FakeWorker) and result["worker"] is not busy
+    assert FakeWorker.started == 2
+
+
+def test_release_wakes_a_waiting_acquire(fake_workers):
+    pool = SandboxPool(1)
+    busy = pool._acquire()
+    thread, result = acquire_in_thread(pool, timeout=10)
+    pool._release(busy)
+    thread.join(5)
+    assert result["worker"] is busy
+
+
+def test_acquire_times_out_when_pool_is_busy(fake_workers):
+    pool = SandboxPool(1, acquire_timeout=0.1)
+    pool._acquire()
+    with pytest.raises(TimeoutError):
+        pool._acquire()
+    code, _, stderr = pool.run("true", cwd=".")
+    assert code == 137 and "No sandbox worker became free" in stderr
+
+
+def test_dead_idle_worker_is_replaced(fake_workers):
+    pool = SandboxPool(1)
+    worker = pool._acquire()
+    pool._release(worker)
+    worker.dead = True
+    replacement = pool._acquire()
+    assert worker.killed and replacement is not worker
+    assert pool._started == 1
+
+
+def test_failed_start_frees_the_slot(monkeypatch):
+    def broken(ctx, limits):
+        raise RuntimeError("Sandbox worker did not start")
+
+    monkeypatch.setattr(sandbox, "_Worker", broken)
+    pool = SandboxPool(1, acquire_timeout=0.1)
+    with pytest.raises(RuntimeError):
+        pool._acquire()
+    assert pool._started == 0
+
+
+def test_runs_commands_in_real_workers(tmp_path):
+    pool = SandboxPool(1)
+    try:
+        assert pool.run("echo hi", cwd=str(tmp_path)) == (0, "hi\n", "")
+        with job_cpu_budget(0.0):
+            code, _, stderr = pool.run("echo hi", cwd=str(tmp_path))
+        assert code == 137 and "budget" in stderr
+    finally:
+        pool.shutdown()
+
+
+def test_command_that_closes_its_output_still_times_out(tmp_path):
+    pool = SandboxPool(1)
+    try:
+        started = time.monotonic()
+        code, _, stderr = pool.run("exec >&- 2>&-; sleep 30", cwd=str(tmp_path), timeout=1)
+        assert code != 0 and "timed out after 1s" in stderr
+        assert time.monotonic() - started < 10
+        # The worker survived and serves the next command
+        assert pool.run("echo hi", cwd=str(tmp_path)) == (0, "hi\n", "")
+    finally:
+        pool.shutdown()
+
+
+def test_worker_must_announce_ready():
+    class Conn:
+        def poll(self, timeout):
+            return True
+
+        def recv(self):
+            return ("exit", 126, 0.0, "error: boom")
+
+    worker = object.__new__(sandbox._Worker)
+    worker.conn = Conn()
+    with pytest.raises(RuntimeError, match="instead of 'ready'"):
+        worker._expect_ready()
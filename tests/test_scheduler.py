@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+from agent.scheduler import (
+    DEFAULT_STEP_SECONDS, TIER_ENTRY, TIER_OTHER, TIER_PREVIEW, StepTimings, build_graph, schedule,
+)
+from agent.states import ImplementationTask
+
+
+def steps(*pairs):
+    return [ImplementationTask(filepath=path, task_description=description) for path, description in pairs]
+
+
+@pytest.fixture
+def timings(tmp_path):
+    return StepTimings(tmp_path / "step_timings.json")
+
+
+def order(tasks, timings, expected_bytes=None):
+    return [(s.filepath, s.task_description) for s in schedule(tasks, expected_bytes, timings)]
+
+
+def test_preview_entry_comes_first_and_its_links_are_not_dependencies(timings):
+    tasks = steps(
+        ("utils.js", "Helpers"),
+        ("style.css", "Styles"),
+        ("index.html", "Markup loading style.css and app.js"),
+        ("app.js", "Wire the buttons using utils.js"),
+    )
+    nodes = build_graph(tasks, timings=timings)
+    assert nodes[2].depends_on == set() and nodes[2].tier == TIER_PREVIEW
+    assert nodes[1].tier == TIER_ENTRY and nodes[3].tier == TIER_ENTRY and nodes[0].tier == TIER_OTHER
+    assert nodes[3].depends_on == {0}
+
+    # app.js is an entry point but waits for utils.js
+    assert [path for path, _ in order(tasks, timings)] == ["index.html", "style.css", "utils.js", "app.js"]
+
+
+def test_critical_path_breaks_ties(timings):
+    tasks = steps(
+        ("b.py", "Standalone"),
+        ("a.py", "Base models"),
+        ("c.py", "Services on a.py"),
+        ("d.py", "Routes on c.py"),
+    )
+    nodes = build_graph(tasks, timings=timings)
+    assert nodes[1].critical_path == pytest.approx(nodes[1].cost + nodes[2].cost + nodes[3].cost)
+    # a.py starts the longest chain; b.py and d.py then tie and keep the architect's order
+    assert [path for path, _ in order(tasks, timings)] == ["a.py", "c.py", "b.py", "d.py"]
+
+
+def test_steps_on_one_file_keep_their_order_through_a_cycle(timings):
+    tasks = steps(
+        ("a.js", "First pass, calls b.js"),
+        ("b.js", "Uses a.js"),
+        ("a.js", "Second pass"),
+    )
+    # The cycle is broken at the first a.js step; b.js waited on it, the second pass did not
+    assert order(tasks, timings) == [
+        ("a.js", "First pass, calls b.js"), ("b.js", "Uses a.js"), ("a.js", "Second pass")]
+    tasks = steps(("a.js", "Rewrite that needs b.js"), ("b.js", "Uses a.js"), ("a.js", "Polish"))
+    a_steps = [description for path, description in order(tasks, timings) if path == "a.js"]
+    assert a_steps == ["Rewrite that needs b.js", "Polish"]
+
+
+def test_mentions_need_a_whole_name(timings):
+    nodes = build_graph(steps(("app.js", "Import from myapp.js and app.json"), ("myapp.js", "x"),
+                              ("app.json", "y")), timings=timings)
+    assert nodes[0].depends_on == {1, 2}
+    nodes = build_graph(steps(("main.py", "Import from xapp.py"), ("app.py", "z")), timings=timings)
+    assert nodes[0].depends_on == set()
+
+
+def test_timings_are_learned_and_persisted(tmp_path, timings):
+    [step] = steps(("a.py", " ".join(["word"] * 60)))
+    assert timings.estimate(step) == pytest.approx(DEFAULT_STEP_SECONDS)
+
+    timings.record("x.py", 10.0, 1000, 60)
+    timings.record("y.py", 20.0, 1000, 60)
+    assert timings.get(".py") == {"seconds": 12.0, "bytes": 1000, "words": 60, "count": 2}
+    # Larger expected files cost more, within bounds
+    assert timings.estimate(step) == pytest.approx(12.0)
+    assert timings.estimate(step, expected_bytes=2000) == pytest.approx(12.0 * 1.3)
+    assert timings.estimate(step, expected_bytes=10**6) == pytest.approx(12.0 * 1.6)
+
+    reloaded = StepTimings(tmp_path / "step_timings.json")
+    assert reloaded.get(".py")["count"] == 2
+
+
+def test_unreadable_timings_are_ignored(tmp_path):
+    path = tmp_path / "step_timings.json"
+    path.write_text("{not json", encoding="utf-8")
+    assert StepTimings(path).get(".py") is None
+    path.write_text(json.dumps({".js": {"seconds": 5, "bytes": 100, "words": 10, "count": 1}}), encoding="utf-8")
+    assert StepTimings(path).get(".js")["seconds"] == 5
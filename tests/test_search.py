@@ -0,0 +1,63 @@
+import pytest
+
+import agent.search as search
+from agent.search import SearchIndex, required_literals
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(tmp_path / "search.db")
+    workspace = tmp_path / "one"
+    index.update(workspace, "app.js", "function calcTotal(items) {\n  return items.length;\n}\n")
+    index.update(workspace, "notes.txt", "Abc is the first line\n" + "a" * 28 + "b\n")
+    index.update(tmp_path / "two", "style.css", "body { margin: 0; }\n")
+    return index
+
+
+def test_required_literals():
+    assert required_literals(r"function\s+calc\w*") == ["function", "calc"]
+    assert required_literals(r"items\.length") == ["items.length"]
+    assert required_literals(r"colou?r: red") == ["colo", "r: red"]
+    assert required_literals("foo|barbaz") == []
+    assert required_literals(r"(?:abc)def") == ["def"]
+
+
+def test_escapes_are_not_taken_literally():
+    # \x41 is "A": the pattern requires "Abc", not "41bc"
+    assert required_literals(r"\x41bc") == []
+    assert required_literals(r"\tindent") == []
+    assert required_literals(r"(ab)\1abcd") == []
+
+
+def test_regex_with_escapes_finds_the_file(index):
+    results = index.search(r"\x41bc is", regex=True, case_sensitive=True)
+    assert [r["path"] for r in results] == ["notes.txt"]
+    assert results[0]["matches"][0]["line"] == 1
+
+
+def test_literal_and_narrowed_regex_search(index):
+    assert [r["path"] for r in index.search("calcTotal")] == ["app.js"]
+    results = index.search(r"function\s+calc\w*", regex=True)
+    assert results[0]["path"] == "app.js" and results[0]["matches"][0]["span"] == [0, 18]
+    assert [r["path"] for r in index.search("margin", project="two")] == []
+
+
+def test_invalid_and_overlong_regexes_are_rejected(index, monkeypatch):
+    with pytest.raises(ValueError, match="Invalid regex"):
+        index.search("(unclosed", regex=True)
+    monkeypatch.setattr(search, "SEARCH_MAX_PATTERN_LENGTH", 10)
+    with pytest.raises(ValueError, match="longer than 10 characters"):
+        index.search("a" * 11, regex=True)
+    # Literal queries are escaped and never backtrack: no cap
+    assert [r["path"] for r in index.search("a" * 28 + "b")] == ["notes.txt"]
+
+
+def test_catastrophic_regex_is_stopped(index, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_REGEX_TIMEOUT", 1.0)
+    try:
+        with pytest.raises(ValueError, match="took longer than 1s"):
+            index.search(r"(a+)+$", regex=True)
+        # The worker is replaced and later searches work
+        assert [r["path"] for r in index.search(r"calc\w+", regex=True)] == ["app.js"]
+    finally:
+        search.regex_runner.shutdown()
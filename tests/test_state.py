@@ -0,0 +1,140 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from server.resp_server import RespServer
+from server.state import RedisBackend, SQLiteBackend, create_backend, tail_events
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        backend = SQLiteBackend(str(tmp_path / "state.db"))
+        yield backend
+        backend.close()
+        return
+    server = RespServer(("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    backend = RedisBackend("127.0.0.1", server.server_address[1], prefix=f"test{time.time_ns()}")
+    yield backend
+    backend.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_job_records_merge(backend):
+    assert backend.get_job("j") is None
+    backend.set_job("j", status="queued", prompt="p")
+    backend.set_job("j", status="running", steps=3)
+    assert backend.get_job("j") == {"job_id": "j", "status": "running", "prompt": "p", "steps": 3}
+
+
+def test_events_keep_offsets_through_compaction(backend):
+    offsets = [backend.append_event("j", {"type": "progress", "message": f"m{i}", "step": "s"}) for i in range(5)]
+    assert offsets == [0, 1, 2, 3, 4]
+    assert [o for o, _ in backend.read_events("j", 3)] == [3, 4]
+
+    assert backend.compact_events("j") == 3
+    assert backend.compact_events("j") == 0
+    events = backend.read_events("j", 0)
+    assert [o for o, _ in events] == [3, 4]
+    snapshot = events[0][1]
+    assert snapshot["type"] == "snapshot" and snapshot["messages"] == ["m0", "m1", "m2", "m3"]
+    assert backend.read_events("j", 4) == [(4, {"type": "progress", "message": "m4", "step": "s"})]
+
+
+def test_locks(backend):
+    assert backend.acquire_lock("workspace:w", "a", 60)
+    assert not backend.acquire_lock("workspace:w", "b", 60)
+    assert backend.acquire_lock("workspace:w", "a", 60)
+    backend.release_lock("workspace:w", "b")
+    assert not backend.acquire_lock("workspace:w", "b", 60)
+    backend.release_lock("workspace:w", "a")
+    assert backend.acquire_lock("workspace:w", "b", 0.05)
+    time.sleep(0.1)
+    assert backend.acquire_lock("workspace:w", "a", 60)
+
+
+def test_tail_events_stops_at_terminal_status(backend):
+    backend.set_job("j", status="running")
+    backend.append_event("j", {"message": "first"})
+
+    async def follow():
+        seen = []
+        async for offset, event in tail_events(backend, "j", 0, poll_interval=0.01):
+            seen.append(event["message"])
+            if offset == 0:
+                await asyncio.to_thread(backend.append_event, "j", {"message": "last"})
+                await asyncio.to_thread(backend.set_job, "j", status="success")
+        return seen
+
+    assert asyncio.run(asyncio.wait_for(follow(), 5)) == ["first", "last"]
+
+
+@pytest.fixture
+def redis():
+    server = RespServer(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    backend = RedisBackend("127.0.0.1", server.server_address[1])
+    yield backend, server
+    backend.close()
+    server.shutdown()
+    server.server_close()
+
+
+class LostReply:
+    """Connection whose commands reach the server but whose replies never come back"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def stale(self):
+        return False
+
+    def execute(self, *args):
+        self.conn.execute(*args)
+        raise ConnectionError("connection reset")
+
+
+def test_redis_resends_only_idempotent_commands(redis):
+    backend, _ = redis
+    backend.append_event("j", {"message": "a"})
+    backend._local.conn = LostReply(backend._conn())
+    with pytest.raises(ConnectionError):
+        backend.append_event("j", {"message": "b"})
+    assert [event["message"] for _, event in backend.read_events("j")] == ["a", "b"]
+
+    backend._local.conn = LostReply(backend._conn())
+    backend.set_job("j", status="success")
+    assert backend.get_job("j")["status"] == "success"
+
+
+def test_redis_reconnects_an_idle_dropped_connection_before_appending(redis):
+    backend, _ = redis
+    backend.append_event("j", {"message": "a"})
+    backend._conn().sock.shutdown(socket.SHUT_RDWR)
+    assert backend.append_event("j", {"message": "b"}) == 1
+    assert [event["message"] for _, event in backend.read_events("j")] == ["a", "b"]
+
+
+def test_redis_compaction_is_one_transaction(redis, monkeypatch):
+    backend, server = redis
+    for i in range(4):
+        backend.append_event("j", {"message": f"m{i}"})
+    transactions = []
+    execute_all = server.execute_all
+    monkeypatch.setattr(server, "execute_all", lambda commands: transactions.append(commands) or execute_all(commands))
+    assert backend.compact_events("j") == 2
+    assert [[args[0] for args in commands] for commands in transactions] == [[b"LTRIM", b"LSET", b"SET"]]
+    assert [offset for offset, _ in backend.read_events("j")] == [2, 3]
+
+
+def test_create_backend(tmp_path):
+    assert isinstance(create_backend(f"sqlite:///{tmp_path}/s.db"), SQLiteBackend)
+    assert isinstance(create_backend("redis://localhost:6390/2"), RedisBackend)
+    with pytest.raises(ValueError):
+        create_backend("memcached://x")
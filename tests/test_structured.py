@@ -0,0 +1,79 @@
+import json
+
+import pytest
+from langchain_core.utils.json import parse_partial_json
+
+from agent.states import ProjectBlueprint, TaskPlan
+from agent.structured import (
+    StructuredOutputError, check_blueprint, check_plan, invoke_structured, task_checker,
+)
+from agent.usage import UsageTracker
+from conftest import FakeLLM
+
+
+def prefixes(text: str, step: int = 7):
+    for end in range(step, len(text), step):
+        partial = parse_partial_json(text[:end])
+        if isinstance(partial, dict):
+            yield partial
+
+
+def test_steps_before_plan_are_not_rejected_while_streaming(blueprint):
+    text = json.dumps({"implementation_steps": blueprint["implementation_steps"], "plan": blueprint["plan"]})
+    for partial in prefixes(text):
+        assert check_blueprint(partial, False) == [], partial
+    assert check_blueprint(json.loads(text), True) == []
+
+
+def test_plan_is_checked_once_closed(blueprint):
+    plan = dict(blueprint["plan"], files=blueprint["plan"]["files"][:1])
+    text = json.dumps({"plan": plan, "implementation_steps": blueprint["implementation_steps"]})
+    problems = []
+    for partial in prefixes(text):
+        problems = check_blueprint(partial, False)
+        if problems:
+            break
+    # Rejected mid-stream: script.js is not a file of the (closed) plan
+    assert problems == ["task for 'script.js', which is not a file of the plan"]
+
+
+def test_missing_plan_is_reported_at_the_end(blueprint):
+    problems = check_blueprint({"implementation_steps": blueprint["implementation_steps"]}, True)
+    assert "plan: the plan lists no files" in problems
+    assert check_blueprint({"plan": blueprint["plan"], "implementation_steps": []}, True) == [
+        "there are no implementation steps"]
+
+
+def test_plan_and_task_invariants(workspace, blueprint):
+    files = [{"path": "/etc/passwd", "purpose": "x"}, {"path": "../up.js", "purpose": "x"},
+             {"path": "a.js", "purpose": "x"}, {"path": "./a.js", "purpose": "x"}, {"path": "b.js"}]
+    problems = check_plan({"files": files}, False)
+    assert problems[0].startswith("'/etc/passwd' is an absolute path")
+    assert problems[1] == "'../up.js' points outside the project root"
+    assert problems[2] == "'./a.js' is listed twice"
+    assert len(problems) == 3  # b.js is the last element and may still be streaming
+
+    check = task_checker({"index.html", "script.js"})
+    assert check({"implementation_steps": [{"filepath": "index.html", "task_description": "x"}]}, True) == [
+        "no task creates the planned files: script.js"]
+
+
+def test_invoke_structured_retries_after_an_early_abort(monkeypatch, workspace, blueprint):
+    bad = json.loads(json.dumps(blueprint))
+    bad["implementation_steps"].insert(0, {"filepath": "../../outside.js", "task_description": "x" * 400})
+    llm = FakeLLM({"ProjectBlueprint": [bad, blueprint]})
+    tracker = UsageTracker()
+    with tracker.activate():
+        result = invoke_structured(llm, ProjectBlueprint, "prompt", check_blueprint, "fast_planner")
+
+    assert isinstance(result, ProjectBlueprint) and result.plan.name == "calculator"
+    assert len(llm.calls) == 2
+    assert "outside.js" in llm.calls[1][1] and "rejected" in llm.calls[1][1]
+    assert tracker.report()["retries"] == {"fast_planner": 1}
+
+
+def test_invoke_structured_gives_up(workspace):
+    llm = FakeLLM({"TaskPlan": '{"implementation_steps": []}'})
+    with pytest.raises(StructuredOutputError, match="there are no implementation steps"):
+        invoke_structured(llm, TaskPlan, "prompt", task_checker(None), "architect", max_retries=1)
+    assert len(llm.calls) == 2
@@ -0,0 +1,37 @@
+from server.metrics import metrics
+from server.supervisor import WorkerMonitor, rss_bytes
+
+
+def test_rss_is_sampled():
+    assert rss_bytes() > 0
+
+
+def test_recycles_once_past_the_rss_limit():
+    reasons = []
+    monitor = WorkerMonitor(history=2)
+    monitor.configure(max_rss_mb=1, on_recycle=reasons.append)
+    for _ in range(3):
+        monitor.sample()
+
+    assert len(reasons) == 1 and reasons[0].startswith("RSS ")
+    assert monitor.recycling == reasons[0]
+    report = monitor.report()
+    assert len(report["history"]) == 2 and report["peak_rss_bytes"] >= report["history"][-1]["rss_bytes"]
+    assert ("devorch_worker_recycling", {}, 1) in monitor.metric_samples()
+
+
+def test_recycles_after_max_jobs():
+    monitor = WorkerMonitor()
+    handled = sum(metrics.snapshot("devorch_jobs_total").values())
+    monitor.configure(max_jobs=int(handled) + 1)
+    assert monitor.recycle_reason(0) is None
+    metrics.inc("devorch_jobs_total", kind="generate", status="success")
+    assert monitor.recycle_reason(0).startswith(f"handled {int(handled) + 1} jobs")
+
+
+def test_no_limits_never_recycle():
+    reasons = []
+    monitor = WorkerMonitor()
+    monitor.configure(on_recycle=reasons.append)
+    monitor.sample()
+    assert monitor.recycling is None and reasons == []
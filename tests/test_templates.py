@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+
+from agent.templates import TemplateRegistry, load_template, summarize_file
+
+
+def make_template(root: Path, files: dict, meta: dict = None) -> Path:
+    root.mkdir(parents=True)
+    for name, content in files.items():
+        (root / name).write_text(content, encoding="utf-8")
+    if meta:
+        (root / "template.json").write_text(json.dumps(meta), encoding="utf-8")
+    return root
+
+
+def test_summarize_file():
+    html = '<title>Calc</title><script src="script.js"></script><div id="display">'
+    assert summarize_file(Path("index.html"), html) == "page 'Calc'; loads script.js; element ids display"
+    assert summarize_file(Path("a.js"), "function add() {}\nconst sub = (a) => a") == "defines add, sub"
+
+
+def test_match_requires_keywords_and_stack(tmp_path):
+    calc = make_template(tmp_path / "pre_generated_project_calculator",
+                         {"index.html": "<html></html>", "script.js": "function add() {}"})
+    registry = TemplateRegistry([calc])
+
+    template = registry.match("Build a calculator in vanilla javascript")
+    assert template is not None and template.name == "calculator"
+    assert template.stack == {"html", "javascript"}
+    assert registry.match("Build a calculator in python") is None
+    assert registry.match("Build a todo list") is None
+
+
+def test_template_json_overrides_metadata(tmp_path):
+    root = make_template(tmp_path / "pre_generated_project_x", {"app.py": "def main(): pass"},
+                         {"name": "api", "keywords": ["rest"], "stack": ["python", "fastapi"]})
+    template = load_template(root)
+    assert template.name == "api"
+    assert template.keywords == {"rest"}
+    assert load_template(make_template(tmp_path / "pre_generated_project_y", {"app.py": ""},
+                                       {"keywords": ["REST", "Endpoints"]})).keywords == {"rest", "endpoint"}
+    assert load_template(make_template(tmp_path / "pre_generated_project_todo_list", {"app.py": ""},
+                                       {"stack": ["python"]})).keywords == {"todo", "list"}
+    assert [f.path for f in template.files] == ["app.py"]
+
+
+def test_seed_writes_files_into_workspace(tmp_path, workspace):
+    calc = make_template(tmp_path / "pre_generated_project_calculator", {"index.html": "<p>hi</p>"})
+    registry = TemplateRegistry([calc])
+    assert registry.seed(registry.templates[0]) == ["index.html"]
+    assert (workspace / "index.html").read_text(encoding="utf-8") == "<p>hi</p>"
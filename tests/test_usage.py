@@ -0,0 +1,57 @@
+import uuid
+
+import pytest
+
+import agent.graph as graph
+from agent.usage import BudgetExceeded, UsageTracker, budget_exceeded, usage_step
+from conftest import FakeLLM
+
+
+def exhausted_tracker() -> UsageTracker:
+    tracker = UsageTracker(max_tokens=100)
+    tracker.totals.add(80, 40, 0, 0.0)
+    return tracker
+
+
+def test_tracker_accounts_per_node_and_step():
+    tracker = UsageTracker(max_tokens=1000, max_seconds=0)
+    run = uuid.uuid4()
+    tracker.start_call(run, "coder", "1:index.html")
+    tracker.record(run, 100, 50, 40)
+    tracker.record_retry("planner", 30, 10, aborted=True)
+
+    report = tracker.report()
+    assert (report["prompt_tokens"], report["completion_tokens"], report["cached_tokens"]) == (130, 60, 40)
+    assert report["by_step"]["1:index.html"]["total_tokens"] == 150
+    assert report["retries"] == {"planner": 1} and report["wasted_tokens"] == {"planner": 40}
+    assert report["budget_exceeded"] is None
+
+
+def test_budgets():
+    tracker = exhausted_tracker()
+    assert "token budget of 100 exhausted" in tracker.exceeded()
+    with pytest.raises(BudgetExceeded):
+        tracker.check()
+    assert budget_exceeded() is None
+    with tracker.activate(), usage_step("x"):
+        assert budget_exceeded() == tracker.exceeded()
+
+
+@pytest.mark.parametrize("node", ["planner", "fast_planner", "architect"])
+def test_planning_nodes_stop_on_budget(monkeypatch, workspace, blueprint, node):
+    monkeypatch.setattr(graph, "llm", FakeLLM({"Plan": blueprint["plan"]}))
+    state = {"plan": graph.Plan.model_validate(blueprint["plan"])} if node == "architect" else {}
+    with exhausted_tracker().activate():
+        update = getattr(graph, f"{node}_agent")({"user_prompt": "Build a calculator", **state})
+    assert update["status"] == "DONE" and "token budget" in update["budget_exceeded"]
+    assert update["skipped_steps"] == (["index.html", "script.js"] if node == "architect" else [])
+
+
+@pytest.mark.parametrize("mode", ["fast", "full"])
+def test_graph_ends_cleanly_when_planning_runs_out_of_budget(monkeypatch, workspace, blueprint, mode):
+    monkeypatch.setattr(graph, "llm", FakeLLM({"Plan": blueprint["plan"], "ProjectBlueprint": blueprint}))
+    with exhausted_tracker().activate():
+        final = graph.agent.invoke({"user_prompt": "Build a calculator", "mode": mode,
+                                    "reuse_plans": False, "use_templates": False})
+    assert final["status"] == "DONE" and final["budget_exceeded"]
+    assert "task_plan" not in final and not any(workspace.iterdir())
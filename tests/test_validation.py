@@ -0,0 +1,61 @@
+from agent.validation import Validator, check_html, check_json, check_python, declared_dependencies
+
+APP = "import os\nimport flask\nfrom bs4 import BeautifulSoup\nfrom models import User\nimport requests\n"
+
+
+def test_check_python_reports_syntax_errors():
+    assert check_python("def f(:\n", []) == ["line 1: SyntaxError: invalid syntax"]
+
+
+def test_third_party_imports_are_not_resolved_against_the_server():
+    # No manifest: nothing to check third-party imports against
+    assert check_python(APP, ["models"]) == []
+    # Declared dependencies satisfy imports even if the server does not have them installed
+    errors = check_python(APP, ["models"], ["flask", "beautifulsoup4", "bs4"])
+    assert errors == ["line 5: ImportError: No module named 'requests' in the project "
+                      "and it is not listed in requirements.txt or pyproject.toml"]
+
+
+def test_declared_dependencies(tmp_path):
+    assert declared_dependencies(tmp_path) is None
+    (tmp_path / "requirements.txt").write_text(
+        "Flask==3.0  # web\n-r base.txt\nbeautifulsoup4>=4\npython-dotenv\n", encoding="utf-8")
+    (tmp_path / "pyproject.toml").write_text(
+        '[project]\ndependencies = ["SQLAlchemy>=2"]\n[project.optional-dependencies]\ndev = ["pytest"]\n',
+        encoding="utf-8")
+    assert declared_dependencies(tmp_path) == [
+        "beautifulsoup4", "bs4", "dotenv", "flask", "pytest", "python_dotenv", "sqlalchemy",
+    ]
+
+
+def test_check_json_and_html():
+    assert check_json('{"a": 1,}') == ["line 1: Expecting property name enclosed in double quotes"]
+    assert check_html("<div><p>text</div><img>") == []
+    assert check_html("<div><span></div>") == ["line 1: <span> is not closed before </div>"]
+
+
+def test_validator_uses_workspace_requirements_and_caches(workspace):
+    (workspace / "app.py").write_text("import flask\n", encoding="utf-8")
+    (workspace / "requirements.txt").write_text("requests\n", encoding="utf-8")
+    validator = Validator(max_workers=1)
+
+    [check] = validator.validate(["app.py"])
+    assert not check.ok and "'flask'" in check.errors[0]
+
+    (workspace / "requirements.txt").write_text("flask\n", encoding="utf-8")
+    [check] = validator.validate(["app.py"])
+    assert check.ok and not check.cached
+    assert validator.validate(["app.py"])[0].cached
+
+
+def test_validator_cache_evicts_least_recently_used(workspace):
+    for name in ("a", "b", "c"):
+        (workspace / f"{name}.json").write_text(f'{{"{name}": 1}}', encoding="utf-8")
+    validator = Validator(max_workers=1, max_entries=2)
+    validator.validate(["a.json"])
+    validator.validate(["b.json"])
+    assert validator.validate(["a.json"])[0].cached
+    validator.validate(["c.json"])
+    assert len(validator._cache) == 2
+    assert validator.validate(["a.json"])[0].cached
+    assert not validator.validate(["b.json"])[0].cached